@@ -0,0 +1,77 @@
+
+/*------------------------------------------------------------------------------
+ * FILE: array_kernels.c
+ *
+ * DESCRIPTION:
+ *
+ * Loops which apply the point-wise reconstruction and c2p kernels to whole
+ * arrays in place, so that they may be driven on existing memory by a foreign
+ * caller (see test/libmara.py) without copying and with one call per array.
+ *
+ *------------------------------------------------------------------------------
+ */
+
+#include "array_kernels.h"
+#include "rmhd-c2p.h"
+
+
+void reconstruct_pencils(const double *v, double *out, int N,
+			 long stride, long out_stride, int npencils,
+			 const long *offsets, const long *out_offsets,
+			 enum ReconstructOperation type)
+/* -----------------------------------------------------------------------------
+ * Apply the reconstruction operator to the zones 2 ... N-3 of npencils lines of
+ * N zones each. Line n starts at v + offsets[n] and its zones are stride
+ * doubles apart. The N-4 results go to out + out_offsets[n], out_stride
+ * doubles apart.
+ * -----------------------------------------------------------------------------
+ */
+{
+  int n, i, k;
+  double s[5];
+  for (n=0; n<npencils; ++n) {
+    const double *vn = v + offsets[n];
+    double *on = out + out_offsets[n];
+    for (i=2; i<N-2; ++i) {
+      for (k=0; k<5; ++k) {
+	s[k] = vn[(i+k-2)*stride];
+      }
+      on[(i-2)*out_stride] = reconstruct(s+2, type);
+    }
+  }
+}
+
+
+int rmhd_c2p_solve_array(const double *U, double *P, int *error,
+			 int *iterations, int N,
+			 enum RmhdConsToPrimSolver solver)
+/* -----------------------------------------------------------------------------
+ * Solve for the N primitive states P (8 doubles each) given the conserved
+ * states U, starting from rmhd_c2p_estimate_from_cons. P is left unchanged
+ * where the solver fails. An unknown solver fails everywhere with the error
+ * code RMHD_C2P_UNKNOWN_SOLVER. Returns the number of failures.
+ * -----------------------------------------------------------------------------
+ */
+{
+  int n, failures = 0;
+  for (n=0; n<N; ++n) {
+    rmhd_c2p_new_state(U + 8*n);
+    rmhd_c2p_estimate_from_cons();
+    switch (solver) {
+    case RMHD_C2P_ANTON2DZW:
+      error[n] = rmhd_c2p_solve_anton2dzw(P + 8*n);
+      iterations[n] = rmhd_c2p_get_iterations();
+      break;
+    case RMHD_C2P_NOBLE1DW:
+      error[n] = rmhd_c2p_solve_noble1dw(P + 8*n);
+      iterations[n] = rmhd_c2p_get_iterations();
+      break;
+    default:
+      error[n] = RMHD_C2P_UNKNOWN_SOLVER;
+      iterations[n] = 0;
+      break;
+    }
+    failures += error[n] != RMHD_C2P_SUCCESS;
+  }
+  return failures;
+}
@@ -0,0 +1,28 @@
+#ifdef __cplusplus
+extern "C" {
+#endif
+
+#ifndef __MaraArrayKernels_HEADER__
+#define __MaraArrayKernels_HEADER__
+
+#include "weno.h"
+
+  enum RmhdConsToPrimSolver { RMHD_C2P_ANTON2DZW, RMHD_C2P_NOBLE1DW };
+
+  // Error code of rmhd_c2p_solve_array for a solver not in the enum above,
+  // distinct from those of enum RmhdConsToPrimError
+#define RMHD_C2P_UNKNOWN_SOLVER (-1)
+
+  void reconstruct_pencils(const double *v, double *out, int N,
+			   long stride, long out_stride, int npencils,
+			   const long *offsets, const long *out_offsets,
+			   enum ReconstructOperation type);
+  int rmhd_c2p_solve_array(const double *U, double *P, int *error,
+			   int *iterations, int N,
+			   enum RmhdConsToPrimSolver solver);
+
+#endif // __MaraArrayKernels_HEADER__
+
+#ifdef __cplusplus
+}
+#endif
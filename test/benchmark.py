@@ -0,0 +1,303 @@
+#!/usr/bin/env python
+
+# ------------------------------------------------------------------------------
+#
+# Throughput benchmarks of the reference kernels in this directory, reported
+# as zone updates (kernel evaluations per zone) per second over a range of
+# problem sizes. Results may be saved as a baseline and later compared against
+# it, e.g.
+#
+#   python benchmark.py --save            # on the reference revision
+#   python benchmark.py                   # after a change to a hot path
+#
+# Any benchmark whose throughput dropped by more than the threshold fraction
+# relative to the baseline is flagged, and the exit status is then non-zero.
+# Each timing is the best of --repeat batches of calls lasting at least
+# --min-time seconds; many short batches are more likely than a few long ones
+# to catch a quiet machine. Even so the smallest sizes vary by up to about 30%
+# between runs of unchanged code on a shared host, hence the default threshold.
+# A warning is printed if the baseline was saved on a different machine or
+# software stack.
+#
+# ------------------------------------------------------------------------------
+
+import os
+import sys
+import json
+import timeit
+import platform
+import numpy as np
+
+import weno
+import sreigen
+import rmhd_c2p
+import srhd
+import riemann
+import reconstruct as rec
+
+
+# Every setup function takes the number of zones N, and returns a callable with
+# no arguments which updates N zones.
+
+def setup_c2p_euler(N):
+    P = weno.shocktube1(np.linspace(0.0, 1.0, N), 0.0)
+    U = weno.prim_to_cons(P)
+    return lambda: weno.cons_to_prim(U, out=P)
+
+
+def setup_c2p_rmhd(N):
+    np.random.seed(12345)
+    G = np.random.uniform(1.0, 10.0, N)
+    B = 10**np.random.uniform(-1.0, 1.0, N)
+    P0 = rmhd_c2p.random_states(np.sqrt(1 - 1/G**2), B, (N,))
+    U = rmhd_c2p.prim_to_cons(P0)
+    P = P0.copy()
+    def run():
+        P[...] = P0
+        rmhd_c2p.cons_to_prim(U, P)
+    return run
+
+
+def setup_flux(N):
+    P = weno.shocktube1(np.linspace(0.0, 1.0, N), 0.0)
+    U = weno.prim_to_cons(P)
+    F = np.empty_like(U)
+    return lambda: weno.flux(P, U, out=F)
+
+
+def setup_eigen_euler(N):
+    P = weno.shocktube1(np.linspace(0.0, 1.0, N), 0.0)
+    return lambda: weno.left_right_eigenvectors(P)
+
+
+def setup_eigen_srhd(N):
+    np.random.seed(12345)
+    P = np.empty((N, 5))
+    P[:,sreigen.rho] = np.random.uniform(0.1, 10.0, N)
+    P[:,sreigen.pre] = np.random.uniform(0.1, 10.0, N)
+    P[:,sreigen.vx:] = np.random.uniform(-0.5, 0.5, (N, 3))
+    return lambda: sreigen.eigensystem(P, dim=1)
+
+
+def setup_weno5(N):
+    A = np.random.rand(N, 5)
+    return lambda: rec.reconstruct(A, [rec.WENO5_FD_C2R, rec.WENO5_FD_C2L])
+
+
+def setup_weno5_libmara(N):
+    import libmara
+    libmara.load()
+    A = np.random.rand(N, 5)
+    return lambda: libmara.reconstruct(A, rec.WENO5_FD_C2R)
+
+
+def setup_riemann(get_flux):
+    def setup(N):
+        P = weno.shocktube1(np.linspace(0.0, 1.0, N), 0.0)
+        U = weno.prim_to_cons(P)
+        F = weno.flux(P, U)
+        A = weno.max_wavespeed(P)
+        return lambda: get_flux(U, P, F, A)
+    return setup
+
+
+def setup_riemann_solver(solver):
+    def setup(N):
+        P = weno.shocktube1(np.linspace(0.0, 1.0, N + 1), 0.0)
+        return lambda: solver(P[:-1], P[1:])
+    return setup
+
+
+def setup_dUdt(N):
+    Ng = 3
+    x, dx = np.linspace(0.0, 1.0, N, retstep=True)
+    P = np.zeros((N + 2*Ng, 5))
+    P[Ng:-Ng] = weno.shocktube1(x, 0.0)
+    U = weno.prim_to_cons(P)
+    L = np.empty_like(U)
+    work = { }
+    return lambda: weno.dUdt(U, Ng, dx, L, work)
+
+
+def setup_dUdt_srhd(N):
+    Ng = 3
+    x, dx = np.linspace(0.0, 1.0, N, retstep=True)
+    P = np.zeros((N + 2*Ng, 5))
+    P[Ng:-Ng] = srhd.problems['srhd_case1'][0](x, 0.0)
+    weno.set_outflow_bc(P, Ng)
+    U = srhd.prim_to_cons(P)
+    L = np.empty_like(U)
+    work = { 'Prim': P }
+    return lambda: srhd.dUdt(U, Ng, dx, L, work, weno.set_outflow_bc)
+
+
+benchmarks = {
+    'c2p_euler': setup_c2p_euler,
+    'c2p_rmhd': setup_c2p_rmhd,
+    'flux': setup_flux,
+    'eigen_euler': setup_eigen_euler,
+    'eigen_srhd': setup_eigen_srhd,
+    'weno5': setup_weno5,
+    'weno5_libmara': setup_weno5_libmara,
+    'riemann_hll': setup_riemann(weno.get_hll_flux),
+    'riemann_exact': setup_riemann_solver(riemann.exact_flux),
+    'riemann_hllc': setup_riemann_solver(riemann.hllc_flux),
+    'weno_flux': setup_riemann(weno.get_weno_flux),
+    'hybrid_flux': setup_riemann(weno.get_hybrid_flux),
+    'dUdt': setup_dUdt,
+    'dUdt_srhd': setup_dUdt_srhd }
+
+
+def measure(fn, min_time=0.1, repeat=20):
+    """
+    Return the best time per call of fn, over repeat batches of calls each
+    lasting at least about min_time.
+    """
+    timer = timeit.default_timer
+    fn()
+    number = 1
+    while True:
+        start = timer()
+        for i in range(number):
+            fn()
+        elapsed = timer() - start
+        if elapsed >= min_time:
+            break
+        number *= 2 if elapsed == 0.0 else max(2, int(min_time / elapsed) + 1)
+
+    best = elapsed / number
+    for r in range(repeat - 1):
+        start = timer()
+        for i in range(number):
+            fn()
+        best = min(best, (timer() - start) / number)
+    return best
+
+
+def run_benchmarks(names=None, Ns=(1000, 10000, 100000), min_time=0.1,
+                   repeat=20, quiet=False):
+    """
+    Run the named benchmarks (by default all of them) at each size in Ns and
+    return a dict mapping "name/N" to the zone updates per second. Benchmarks
+    whose dependencies are not available (such as an unbuilt libmara) are
+    skipped.
+    """
+    if names is None:
+        names = sorted(benchmarks)
+    results = { }
+    for name in names:
+        for N in Ns:
+            try:
+                fn = benchmarks[name](N)
+            except (OSError, ImportError) as e:
+                if not quiet:
+                    print("%-24s skipped (%s)" % (name, e))
+                break
+            rate = N / measure(fn, min_time, repeat)
+            results["%s/%d" % (name, N)] = rate
+            if not quiet:
+                print("%-24s %12.4e zones/s" % ("%s/%d" % (name, N), rate))
+    return results
+
+
+def machine_info():
+    return { 'python': platform.python_version(),
+             'numpy': np.__version__,
+             'machine': platform.machine(),
+             'node': platform.node() }
+
+
+def save_baseline(fname, results):
+    with open(fname, "w") as f:
+        json.dump({ 'machine': machine_info(),
+                    'zone_updates_per_sec': results }, f, indent=2,
+                  sort_keys=True)
+
+
+def load_baseline(fname):
+    """
+    Return the results saved in the baseline file fname, and the machine_info
+    of the machine they were measured on.
+    """
+    with open(fname, "r") as f:
+        baseline = json.load(f)
+    return baseline['zone_updates_per_sec'], baseline.get('machine', { })
+
+
+def machine_differences(machine):
+    """
+    Return a list of the entries of machine_info which differ between machine
+    (as saved with a baseline) and the current machine.
+    """
+    current = machine_info()
+    return ["%s: %s != %s" % (key, machine.get(key), current[key])
+            for key in sorted(current) if machine.get(key) != current[key]]
+
+
+def compare(results, baseline, threshold=0.3):
+    """
+    Return a dict mapping each benchmark found in both results and baseline to
+    (speedup, regressed), where speedup is the ratio of the throughputs and
+    regressed is true if it fell below 1 - threshold.
+    """
+    comparison = { }
+    for key in sorted(results):
+        if key in baseline:
+            speedup = results[key] / baseline[key]
+            comparison[key] = (speedup, speedup < 1.0 - threshold)
+    return comparison
+
+
+def print_comparison(comparison):
+    print("%-24s %10s %10s" % ("benchmark", "speedup", "status"))
+    for key in sorted(comparison):
+        speedup, regressed = comparison[key]
+        print("%-24s %10.3f %10s" % (key, speedup,
+                                     "REGRESSED" if regressed else "ok"))
+
+
+if __name__ == "__main__":
+    from optparse import OptionParser
+
+    parser = OptionParser()
+    parser.add_option("-k", "--benchmarks", default=None,
+                      help="comma separated subset of %s" % sorted(benchmarks))
+    parser.add_option("-N", "--sizes", default="1000,10000,100000",
+                      help="comma separated problem sizes [%default]")
+    parser.add_option("-b", "--baseline", default="benchmark_baseline.json",
+                      help="baseline file [%default]")
+    parser.add_option("--save", action="store_true", default=False,
+                      help="write the results as the new baseline")
+    parser.add_option("--threshold", type="float", default=0.3,
+                      help="fractional slowdown flagged as a regression "
+                      "[%default]")
+    parser.add_option("--min-time", type="float", default=0.1,
+                      help="minimum duration of each timed batch [%default]")
+    parser.add_option("--repeat", type="int", default=20,
+                      help="number of timed batches, the best is kept "
+                      "[%default]")
+    parser.add_option("-o", "--output", default=None,
+                      help="also write the results to this JSON file")
+    opts, args = parser.parse_args()
+
+    names = opts.benchmarks.split(",") if opts.benchmarks else None
+    Ns = [int(N) for N in opts.sizes.split(",")]
+    results = run_benchmarks(names, Ns, opts.min_time, opts.repeat)
+
+    if opts.output:
+        save_baseline(opts.output, results)
+
+    if opts.save:
+        save_baseline(opts.baseline, results)
+        print("wrote baseline %s" % opts.baseline)
+    elif os.path.isfile(opts.baseline):
+        baseline, machine = load_baseline(opts.baseline)
+        for difference in machine_differences(machine):
+            print("warning: baseline %s is from another machine (%s)" % (
+                opts.baseline, difference))
+        comparison = compare(results, baseline, opts.threshold)
+        print_comparison(comparison)
+        if any(regressed for speedup, regressed in comparison.values()):
+            sys.exit(1)
+    else:
+        print("no baseline %s, run with --save to create one" % opts.baseline)
@@ -1,31 +1,134 @@
 #!/usr/bin/env python
 
+# ------------------------------------------------------------------------------
+#
+# Analysis of the conserved to primitive benchmark grids written by c2p.lua.
+# Each grid has shape (N_gamma, N_B, 6), with the columns named in `columns`
+# below: the Lorentz factor, log10 of the magnetic field, and then one value
+# (pass fraction or mean time) per solver.
+#
+# Grids may be read from the JSON files written by c2p.lua, or from a compact
+# binary container (.c2p) which is memory-mapped and so read lazily. A .c2p
+# file is laid out as:
+#
+#   8 bytes   magic string "MARAC2P\n"
+#   8 bytes   little-endian uint64 header length n
+#   n bytes   JSON header: {"shape": [...], "dtype": "<f8", "columns": [...]}
+#   ...       the array data in C order, starting at a 64 byte aligned offset
+#
+# ------------------------------------------------------------------------------
 
-if __name__ == "__main__":
+import json
+import struct
+import numpy as np
+
+
+solvers = ['noble2dzt', 'duffell3d', 'noble1dw', 'anton2dzw']
+columns = ['gamma', 'log10B'] + solvers
+
+magic = b"MARAC2P\n"
+alignment = 64
+
+
+def write_grid(fname, data, columns=columns):
+    """
+    Write the array data, whose last axis is labeled by columns, to the binary
+    container fname.
+    """
+    data = np.ascontiguousarray(data, dtype='<f8')
+    header = json.dumps({ 'shape': list(data.shape),
+                          'dtype': data.dtype.str,
+                          'columns': list(columns) }).encode('ascii')
+    offset = len(magic) + 8 + len(header)
+    header += b" " * (-offset % alignment)
+
+    with open(fname, "wb") as f:
+        f.write(magic)
+        f.write(struct.pack("<Q", len(header)))
+        f.write(header)
+        data.tofile(f)
+
+
+def read_header(fname):
+    """
+    Return the header dict of the binary container fname, along with the byte
+    offset of its data.
+    """
+    with open(fname, "rb") as f:
+        if f.read(len(magic)) != magic:
+            raise IOError("%s is not a c2p grid file" % fname)
+        n, = struct.unpack("<Q", f.read(8))
+        header = json.loads(f.read(n).decode('ascii'))
+    return header, len(magic) + 8 + n
+
+
+def load_grid(fname):
+    """
+    Return the grid in fname, and the list of its column names. Binary
+    containers are memory-mapped read-only, so only the parts of the grid which
+    are used get read from disk. JSON files are loaded entirely.
+    """
+    if fname.endswith(".json"):
+        with open(fname, "r") as f:
+            return np.array(json.load(f)), columns
+    header, offset = read_header(fname)
+    data = np.memmap(fname, dtype=header['dtype'], mode='r', offset=offset,
+                     shape=tuple(header['shape']))
+    return data, header['columns']
+
+
+def convert(json_name, grid_name):
+    """
+    Convert a JSON grid written by c2p.lua into the binary container format.
+    """
+    data, cols = load_grid(json_name)
+    write_grid(grid_name, data, cols)
+
+
+def summarize(dpass, dtime, cols, percentiles=(50, 90, 99)):
+    """
+    Return a dict, keyed by solver, of the failure rate averaged over the grid
+    and the requested percentiles of the mean time per solve. Solver columns
+    which hold no measurements (all NaN) are left out.
+    """
+    summary = { }
+    for n, s in enumerate(cols):
+        if s not in solvers or np.isnan(dpass[...,n]).all():
+            continue
+        fail = 1.0 - np.mean(dpass[...,n])
+        times = np.percentile(np.asarray(dtime[...,n]).ravel(), percentiles)
+        summary[s] = { 'failure_rate': float(fail) }
+        for p, t in zip(percentiles, times):
+            summary[s]['time_p%d' % p] = float(t)
+    return summary
+
+
+def print_summary(summary):
+    present = [s for s in solvers if s in summary]
+    if not present:
+        print("no solver columns")
+        return
+    keys = sorted(summary[present[0]].keys())
+    print("%12s " % "solver" + " ".join(["%14s" % k for k in keys]))
+    for s in present:
+        print("%12s " % s + " ".join(["%14.4e" % summary[s][k]
+                                      for k in keys]))
+
+
+def plot_grids(dtime, cols):
     from matplotlib import pyplot as plt
-    import numpy as np
-    import json
-    
-    fpass = open("c2p_pass.json", "r")
-    dpass = np.array(json.load(fpass))
-
-    ftime = open("c2p_time.json", "r")
-    dtime = np.array(json.load(ftime))
-
-    G = dtime[:,:,0]
-    B = dtime[:,:,1]
-    D = {
-         'noble2dzt' : dtime[:,:,2],
-         'duffell3d' : dtime[:,:,3],
-         'noble1dw'  : dtime[:,:,4],
-         'anton2dzw' : dtime[:,:,5] }
+
+    G = dtime[:,:,cols.index('gamma')]
+    B = dtime[:,:,cols.index('log10B')]
+    D = dict([(s, dtime[:,:,cols.index(s)]) for s in solvers if s in cols and
+              not np.isnan(dtime[:,:,cols.index(s)]).all()])
 
     kwargs = { 'interpolation': 'bilinear',
-               'origin': 'bottom',
+               'origin': 'lower',
                }
 
     for k,v in D.items():
-        N = v.shape[0]/5
+        N = v.shape[0]//5
         plt.figure()
         plt.imshow(v.T, **kwargs)
         plt.colorbar()
@@ -37,3 +140,29 @@ if __name__ == "__main__":
 
     plt.show()
 
+
+if __name__ == "__main__":
+    from optparse import OptionParser
+
+    parser = OptionParser()
+    parser.add_option("--pass-file", default="c2p_pass.json",
+                      help="pass fraction grid, .json or .c2p [%default]")
+    parser.add_option("--time-file", default="c2p_time.json",
+                      help="timing grid, .json or .c2p [%default]")
+    parser.add_option("--convert", action="store_true", default=False,
+                      help="convert the JSON grids to .c2p files and exit")
+    parser.add_option("--summary", action="store_true", default=False,
+                      help="print failure rates and timing percentiles "
+                      "rather than plotting")
+    opts, args = parser.parse_args()
+
+    if opts.convert:
+        for fname in [opts.pass_file, opts.time_file]:
+            convert(fname, fname.replace(".json", ".c2p"))
+    elif opts.summary:
+        dpass, cols = load_grid(opts.pass_file)
+        dtime, cols = load_grid(opts.time_file)
+        print_summary(summarize(dpass, dtime, cols))
+    else:
+        dtime, cols = load_grid(opts.time_file)
+        plot_grids(dtime, cols)
@@ -0,0 +1,201 @@
+#!/usr/bin/env python
+
+# ------------------------------------------------------------------------------
+#
+# Lazy reader for the HDF5 checkpoints written by util.write_checkpoint. A
+# checkpoint holds, at its root,
+#
+#   status ...... group of scalar datasets (CurrentTime, Checkpoint, ...)
+#   runargs ..... JSON string of the run arguments
+#   version ..... string
+#   prim ........ group with one double precision dataset per primitive (rho,
+#                 pre, vx, vy, vz[, Bx, By, Bz]) spanning the global domain,
+#                 without guard zones, as written by _io_write_prim_h5ser or
+#                 _io_write_prim_h5mpi in src/h5ser.c and src/h5mpi.c
+#
+# The primitive datasets are chunked when the run used enable_chunking, in
+# which case the chunk shape is that of the subdomains. Nothing is read until a
+# field is indexed, and then only the requested hyperslab is read. The slab
+# iterators cut a field into slabs along one axis whose thickness is a whole
+# number of chunks, so that each chunk is read from disk once, and whose size is
+# bounded, so that fields larger than memory can be processed in pieces:
+#
+#   with Checkpoint("chkpt.0001.h5") as chkpt:
+#       for start, stop, slab in chkpt['rho'].slabs(max_bytes=2**28):
+#           ...
+#
+# ------------------------------------------------------------------------------
+
+import json
+from collections import OrderedDict
+import numpy as np
+import h5py
+
+
+# Order of the primitives in the C code (Rmhd::GetPrimNames)
+prim_names = ['rho', 'pre', 'vx', 'vy', 'vz', 'Bx', 'By', 'Bz']
+
+default_slab_bytes = 2**28
+
+
+class LazyField(object):
+    """
+    One primitive field of a checkpoint, which is read from disk only when it
+    is indexed: field[10:20, :, 5] reads only that hyperslab.
+    """
+
+    def __init__(self, dset):
+        self.dset = dset
+        self.name = dset.name.split("/")[-1]
+        self.shape = dset.shape
+        self.dtype = dset.dtype
+        self.ndim = len(dset.shape)
+        self.chunks = dset.chunks # None if the dataset is contiguous
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, index):
+        return self.dset[index]
+
+    def __array__(self, dtype=None, copy=None):
+        return np.asarray(self.dset[...], dtype=dtype)
+
+    @property
+    def nbytes(self):
+        return int(np.prod(self.shape)) * self.dtype.itemsize
+
+    def slab_thickness(self, axis=0, max_bytes=default_slab_bytes):
+        """
+        The largest slab thickness along axis which is a whole number of chunks
+        and does not exceed max_bytes, but is at least one chunk. Contiguous
+        datasets are treated as having chunks one zone thick.
+        """
+        plane = self.nbytes // self.shape[axis]
+        chunk = self.chunks[axis] if self.chunks is not None else 1
+        return max(1, max_bytes // (plane * chunk)) * chunk
+
+    def slab_bounds(self, axis=0, thickness=None, max_bytes=default_slab_bytes):
+        """
+        List of the (start, stop) index ranges of the slabs along axis.
+        """
+        if thickness is None:
+            thickness = self.slab_thickness(axis, max_bytes)
+        N = self.shape[axis]
+        return [(i, min(i + thickness, N)) for i in range(0, N, thickness)]
+
+    def read_slab(self, start, stop, axis=0):
+        index = [slice(None)] * self.ndim
+        index[axis] = slice(start, stop)
+        return self.dset[tuple(index)]
+
+    def slabs(self, axis=0, thickness=None, max_bytes=default_slab_bytes):
+        """
+        Iterate over (start, stop, data) for consecutive slabs along axis,
+        where data holds the field in the index range start:stop along axis.
+        """
+        for start, stop in self.slab_bounds(axis, thickness, max_bytes):
+            yield start, stop, self.read_slab(start, stop, axis)
+
+
+class Checkpoint(object):
+    """
+    A Mara checkpoint opened for lazy reading. Primitive fields are accessed
+    by name, e.g. chkpt['rho'], and are LazyField instances.
+    """
+
+    def __init__(self, fname, cache_bytes=None):
+        kwargs = { }
+        if cache_bytes is not None:
+            kwargs['rdcc_nbytes'] = cache_bytes
+        self.fname = fname
+        self.file = h5py.File(fname, 'r', **kwargs)
+
+        group = self.file['prim']
+        names = ([n for n in prim_names if n in group] +
+                 sorted(n for n in group if n not in prim_names))
+        self.prim = OrderedDict((n, LazyField(group[n])) for n in names)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.file.close()
+
+    def __getitem__(self, name):
+        return self.prim[name]
+
+    def __contains__(self, name):
+        return name in self.prim
+
+    def keys(self):
+        return list(self.prim.keys())
+
+    @property
+    def shape(self):
+        return self.prim[self.keys()[0]].shape
+
+    @property
+    def status(self):
+        if 'status' not in self.file:
+            return { }
+        return dict((k, float(v[()])) for k, v in self.file['status'].items())
+
+    @property
+    def runargs(self):
+        if 'runargs' not in self.file:
+            return { }
+        return json.loads(read_string(self.file['runargs']))
+
+    @property
+    def version(self):
+        if 'version' not in self.file:
+            return None
+        return read_string(self.file['version'])
+
+    def slabs(self, names=None, axis=0, thickness=None,
+              max_bytes=default_slab_bytes):
+        """
+        Iterate over (start, stop, data) for consecutive slabs along axis, where
+        data is a dict of the named fields (all of them by default) in the index
+        range start:stop. max_bytes bounds the size of all fields together.
+        """
+        if names is None:
+            names = self.keys()
+        fields = [self.prim[n] for n in names]
+        if thickness is None:
+            thickness = min(f.slab_thickness(axis, max_bytes // len(fields))
+                            for f in fields)
+        for start, stop in fields[0].slab_bounds(axis, thickness):
+            yield start, stop, dict((f.name, f.read_slab(start, stop, axis))
+                                    for f in fields)
+
+
+def read_string(dset):
+    s = dset[()]
+    return s.decode('utf-8') if isinstance(s, bytes) else str(s)
+
+
+if __name__ == "__main__":
+    from optparse import OptionParser
+
+    parser = OptionParser(usage="%prog [options] chkpt.h5")
+    parser.add_option("--max-bytes", type="int", default=default_slab_bytes,
+                      help="largest slab read at once [%default]")
+    opts, args = parser.parse_args()
+
+    for fname in args:
+        with Checkpoint(fname) as chkpt:
+            print("%s: shape %s" % (fname, chkpt.shape))
+            for k, v in sorted(chkpt.status.items()):
+                print("  %-24s %s" % (k, v))
+            for name in chkpt.keys():
+                f = chkpt[name]
+                lo, hi = np.inf, -np.inf
+                for start, stop, slab in f.slabs(max_bytes=opts.max_bytes):
+                    lo, hi = min(lo, slab.min()), max(hi, slab.max())
+                print("  %-4s chunks %-16s min %+12.6e max %+12.6e" % (
+                    name, f.chunks, lo, hi))
@@ -0,0 +1,266 @@
+#!/usr/bin/env python
+
+# ------------------------------------------------------------------------------
+#
+# Out-of-core statistics of checkpoints: histograms (PDFs), moments and min/max
+# of primitive or derived quantities, such as the density and Lorentz factor,
+# over any number of snapshots, e.g.
+#
+#   python checkpoint_stats.py -q rho:200:1e-3:1e3:log -q gamma:100:1:100:log \
+#       data/run/chkpt.*.h5 -o stats.json
+#
+# Each checkpoint is cut into slabs (see checkpoint.py), and every slab is an
+# independent task on a process pool which returns one partial result per
+# quantity. Partial results are mergeable: histogram counts add, and the
+# moments are combined with the pairwise update formulas of Chan et al. and
+# Pebay, so that the result does not depend on the order of the slabs. Binning
+# follows Histogram1d in src/histogram.cpp, with linearly or logarithmically
+# spaced bin edges.
+#
+# ------------------------------------------------------------------------------
+
+import json
+import multiprocessing
+import numpy as np
+from checkpoint import Checkpoint, default_slab_bytes
+
+
+# Derived quantities: name -> (primitives needed, function of the dict of them)
+derived = {
+    'gamma': (['vx', 'vy', 'vz'],
+              lambda P: 1.0 / np.sqrt(1.0 - (P['vx']**2 + P['vy']**2 +
+                                             P['vz']**2))),
+    'B2': (['Bx', 'By', 'Bz'],
+           lambda P: P['Bx']**2 + P['By']**2 + P['Bz']**2),
+    'temp': (['rho', 'pre'], lambda P: P['pre'] / P['rho']) }
+
+
+def required_fields(name):
+    return derived[name][0] if name in derived else [name]
+
+
+def evaluate(name, fields):
+    return derived[name][1](fields) if name in derived else fields[name]
+
+
+class HistogramSpec(object):
+    """
+    A quantity name with the bin edges of its histogram, spaced linearly or
+    logarithmically between x0 and x1 as in Histogram1d.
+    """
+
+    def __init__(self, name, nbins=100, x0=0.0, x1=1.0, spacing='lin'):
+        self.name = name
+        self.nbins = nbins
+        self.x0, self.x1 = x0, x1
+        self.spacing = spacing
+        n = np.arange(nbins + 1) / float(nbins)
+        if spacing == 'log':
+            self.edges = x0 * (x1 / x0)**n
+        else:
+            self.edges = x0 + (x1 - x0) * n
+
+    @classmethod
+    def parse(cls, s):
+        """
+        Build from a string name[:nbins:x0:x1[:lin|log]].
+        """
+        parts = s.split(":")
+        if len(parts) == 1:
+            return cls(parts[0])
+        return cls(parts[0], int(parts[1]), float(parts[2]), float(parts[3]),
+                   parts[4] if len(parts) > 4 else 'lin')
+
+
+class PartialStats(object):
+    """
+    Mergeable summary of a set of samples: histogram counts, the number of
+    samples outside the bins, min, max and the central moments up to fourth
+    order.
+    """
+
+    def __init__(self, spec):
+        self.spec = spec
+        self.counts = np.zeros(spec.nbins, dtype=np.int64)
+        self.below = 0
+        self.above = 0
+        self.nonfinite = 0
+        self.n = 0
+        self.mean = 0.0
+        self.M2 = 0.0
+        self.M3 = 0.0
+        self.M4 = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+
+    def add(self, x):
+        """
+        Add an array of samples. Non-finite values are counted but otherwise
+        ignored.
+        """
+        x = np.asarray(x).ravel()
+        finite = np.isfinite(x)
+        self.nonfinite += int(x.size - finite.sum())
+        x = x[finite]
+        if x.size == 0:
+            return self
+
+        i = np.searchsorted(self.spec.edges, x, side='right') - 1
+        self.below += int((i < 0).sum())
+        self.above += int((i >= self.spec.nbins).sum())
+        inside = (i >= 0) & (i < self.spec.nbins)
+        self.counts += np.bincount(i[inside], minlength=self.spec.nbins)
+
+        other = PartialStats.__new__(PartialStats)
+        other.n = x.size
+        other.mean = x.mean()
+        d = x - other.mean
+        other.M2 = (d**2).sum()
+        other.M3 = (d**3).sum()
+        other.M4 = (d**4).sum()
+        self._merge_moments(other)
+        self.min = min(self.min, x.min())
+        self.max = max(self.max, x.max())
+        return self
+
+    def merge(self, other):
+        """
+        Absorb another partial result for the same spec.
+        """
+        self.counts += other.counts
+        self.below += other.below
+        self.above += other.above
+        self.nonfinite += other.nonfinite
+        self._merge_moments(other)
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    def _merge_moments(self, other):
+        na, nb = self.n, other.n
+        n = na + nb
+        if nb == 0:
+            return
+        if na == 0:
+            self.n, self.mean = other.n, other.mean
+            self.M2, self.M3, self.M4 = other.M2, other.M3, other.M4
+            return
+        d = other.mean - self.mean
+        M2 = self.M2 + other.M2 + d**2 * na * nb / n
+        M3 = (self.M3 + other.M3 + d**3 * na * nb * (na - nb) / n**2 +
+              3 * d * (na * other.M2 - nb * self.M2) / n)
+        M4 = (self.M4 + other.M4 +
+              d**4 * na * nb * (na**2 - na * nb + nb**2) / n**3 +
+              6 * d**2 * (na**2 * other.M2 + nb**2 * self.M2) / n**2 +
+              4 * d * (na * other.M3 - nb * self.M3) / n)
+        self.n = n
+        self.mean += d * nb / n
+        self.M2, self.M3, self.M4 = M2, M3, M4
+
+    def result(self):
+        """
+        Return a JSON-friendly dict of the statistics, with the histogram as a
+        normalized PDF (BinDensity mode) over the samples inside the bins.
+        """
+        n = self.n
+        var = self.M2 / n if n else np.nan
+        inside = self.counts.sum()
+        widths = np.diff(self.spec.edges)
+        pdf = self.counts / (widths * inside) if inside else 0.0 * widths
+        skewness = self.M3 / n / var**1.5 if n and var else np.nan
+        kurtosis = self.M4 / n / var**2 if n and var else np.nan
+        return { 'n': int(n),
+                 'mean': float(self.mean) if n else np.nan,
+                 'variance': float(var),
+                 'skewness': float(skewness),
+                 'kurtosis': float(kurtosis),
+                 'min': float(self.min),
+                 'max': float(self.max),
+                 'below': self.below,
+                 'above': self.above,
+                 'nonfinite': self.nonfinite,
+                 'bin_edges': self.spec.edges.tolist(),
+                 'bin_centers': (0.5 * (self.spec.edges[1:] +
+                                        self.spec.edges[:-1])).tolist(),
+                 'counts': self.counts.tolist(),
+                 'pdf': pdf.tolist() }
+
+
+def slab_task(args):
+    """
+    Worker: read one slab of a checkpoint and return the index of its file and
+    a partial result for each spec.
+    """
+    n, fname, start, stop, specs = args
+    names = sorted(set(f for s in specs for f in required_fields(s.name)))
+    with Checkpoint(fname) as chkpt:
+        fields = dict((k, chkpt[k].read_slab(start, stop)) for k in names)
+    return n, [PartialStats(s).add(evaluate(s.name, fields)) for s in specs]
+
+
+def checkpoint_stats(fnames, specs, max_bytes=default_slab_bytes, procs=None):
+    """
+    Compute the statistics of each spec over every checkpoint in fnames, using
+    a pool of procs processes (default: all cores). Returns a list with a dict
+    of the results keyed by quantity for each file, and the same dict for all
+    of the files combined.
+    """
+    tasks = [ ]
+    for n, fname in enumerate(fnames):
+        names = sorted(set(f for s in specs for f in required_fields(s.name)))
+        with Checkpoint(fname) as chkpt:
+            fields = [chkpt[k] for k in names]
+            thickness = min(f.slab_thickness(0, max_bytes // len(fields))
+                            for f in fields)
+            bounds = fields[0].slab_bounds(0, thickness)
+        tasks += [(n, fname, start, stop, specs) for start, stop in bounds]
+
+    per_file = [[PartialStats(s) for s in specs] for f in fnames]
+    pool = multiprocessing.Pool(procs)
+    try:
+        for n, partials in pool.imap_unordered(slab_task, tasks):
+            for total, p in zip(per_file[n], partials):
+                total.merge(p)
+    finally:
+        pool.close()
+        pool.join()
+
+    combined = [PartialStats(s) for s in specs]
+    for partials in per_file:
+        for total, p in zip(combined, partials):
+            total.merge(p)
+
+    def to_dict(partials):
+        return dict((p.spec.name, p.result()) for p in partials)
+
+    return [to_dict(p) for p in per_file], to_dict(combined)
+
+
+if __name__ == "__main__":
+    from optparse import OptionParser
+
+    parser = OptionParser(usage="%prog [options] chkpt.h5 [chkpt.h5 ...]")
+    parser.add_option("-q", "--quantity", action="append", default=[ ],
+                      help="name[:nbins:x0:x1[:lin|log]], may be repeated; "
+                      "name is a primitive or one of %s" % sorted(derived))
+    parser.add_option("-j", "--procs", type="int", default=None,
+                      help="number of worker processes [all cores]")
+    parser.add_option("--max-bytes", type="int", default=default_slab_bytes,
+                      help="largest slab read by a worker [%default]")
+    parser.add_option("-o", "--output", default=None,
+                      help="write the results as JSON to this file")
+    opts, args = parser.parse_args()
+
+    specs = [HistogramSpec.parse(q) for q in opts.quantity or ['rho']]
+    per_file, combined = checkpoint_stats(args, specs, opts.max_bytes,
+                                          opts.procs)
+
+    for name, r in sorted(combined.items()):
+        print("%-8s n=%d mean=%+12.6e var=%12.6e min=%+12.6e max=%+12.6e" % (
+            name, r['n'], r['mean'], r['variance'], r['min'], r['max']))
+
+    if opts.output:
+        with open(opts.output, "w") as f:
+            json.dump({ 'files': args,
+                        'per_file': per_file,
+                        'combined': combined }, f)
@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+
+# ------------------------------------------------------------------------------
+#
+# Headless convergence study for the 1d reference solver in weno.py. Every
+# (problem, resolution) pair is run as an independent task on a process pool,
+# and the results are written as JSON, e.g.
+#
+#   python convergence.py -p density_wave -N 32,64,128,256 -o order.json
+#
+# The output maps each problem name to the lists N, L1, wallclock and
+# zone_updates_per_sec (ordered by N), and the fitted order of accuracy.
+#
+# ------------------------------------------------------------------------------
+
+import json
+import time
+import multiprocessing
+import weno
+
+
+def run_case(args):
+    """
+    Run a single (problem, N, tmax, riemann, reconstruction, hybrid, dtype,
+    integrator) case in a worker process, returning a dict with the L1 error,
+    wallclock and zone-update rate.
+    """
+    (problem, N, tmax, riemann, reconstruction, hybrid, dtype,
+     integrator) = args
+    weno.use_problem(problem)
+    info = { }
+    start = time.time()
+    L1 = weno.run_1d_problem(N, tmax=tmax, plot=False, quiet=True, info=info,
+                             riemann=riemann, reconstruction=reconstruction,
+                             hybrid=hybrid, dtype=dtype,
+                             integrator=weno.integrators[integrator])
+    wallclock = time.time() - start
+    return { 'problem': problem,
+             'N': N,
+             'L1': L1,
+             'wallclock': wallclock,
+             'zone_updates_per_sec': N * info['steps'] / wallclock }
+
+
+def convergence_study(problems, Ns, tmax=0.1, procs=None, riemann=None,
+                      reconstruction='plm', hybrid=None, dtype=None,
+                      integrator='rk4'):
+    """
+    Run every problem at every resolution in Ns on a pool of procs processes
+    (default: all cores) and return the results keyed by problem name. The
+    riemann, reconstruction, hybrid and dtype arguments are passed on to
+    run_1d_problem, and integrator is one of weno.integrators.
+    """
+    # Largest runs go first so that they do not end up as stragglers
+    cases = [(p, N, tmax, riemann, reconstruction, hybrid, dtype, integrator)
+             for N in sorted(Ns, reverse=True) for p in problems]
+    pool = multiprocessing.Pool(procs)
+    try:
+        runs = pool.map(run_case, cases, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+
+    results = { }
+    for p in problems:
+        rs = sorted([r for r in runs if r['problem'] == p],
+                    key=lambda r: r['N'])
+        res = { 'N': [r['N'] for r in rs],
+                'L1': [r['L1'] for r in rs],
+                'wallclock': [r['wallclock'] for r in rs],
+                'zone_updates_per_sec': [r['zone_updates_per_sec']
+                                         for r in rs] }
+        if len(rs) > 1:
+            res['order'] = float(weno.get_log_slope(res['N'], res['L1']))
+        else:
+            res['order'] = None
+        results[p] = res
+    return results
+
+
+if __name__ == "__main__":
+    from optparse import OptionParser
+
+    parser = OptionParser()
+    parser.add_option("-p", "--problems",
+                      default=",".join(sorted(weno.problems)),
+                      help="comma separated list of problems [%default]")
+    parser.add_option("-N", "--resolutions", default="16,32,64,128",
+                      help="comma separated list of resolutions [%default]")
+    parser.add_option("-t", "--tmax", type="float", default=0.1,
+                      help="final time of each run [%default]")
+    parser.add_option("-j", "--procs", type="int", default=None,
+                      help="number of worker processes [all cores]")
+    parser.add_option("-r", "--riemann", default=None,
+                      help="exact, hll or hllc, rather than the "
+                      "characteristic WENO flux")
+    parser.add_option("--reconstruction", default="plm",
+                      help="pcm, plm or weno5, used with --riemann [%default]")
+    parser.add_option("--hybrid", type="float", default=None,
+                      help="use the hybrid WENO flux with this shock sensor "
+                      "threshold")
+    parser.add_option("--precision", default="float64",
+                      help="float32 or float64 [%default]")
+    parser.add_option("--integrator", default="rk4",
+                      help="one of %s [%%default]" % sorted(weno.integrators))
+    parser.add_option("-o", "--output", default=None,
+                      help="write results to this JSON file [stdout]")
+    opts, args = parser.parse_args()
+    if opts.hybrid is not None and opts.riemann is not None:
+        parser.error("--hybrid and --riemann are mutually exclusive")
+
+    problems = opts.problems.split(",")
+    Ns = [int(N) for N in opts.resolutions.split(",")]
+    results = convergence_study(problems, Ns, tmax=opts.tmax, procs=opts.procs,
+                                riemann=opts.riemann,
+                                reconstruction=opts.reconstruction,
+                                hybrid=opts.hybrid, dtype=opts.precision,
+                                integrator=opts.integrator)
+
+    if opts.output:
+        with open(opts.output, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    else:
+        print(json.dumps(results, indent=2, sort_keys=True))
@@ -0,0 +1,231 @@
+#!/usr/bin/env python
+
+# ------------------------------------------------------------------------------
+#
+# Domain decomposition of the 1d reference solver in weno.py over worker
+# processes on one node, in the manner of src/mara_mpi.c but with shared memory
+# in place of MPI, e.g.
+#
+#   python decomposition.py -p shocktube1 -N 100000 -j 8 --check
+#
+# Each worker owns a contiguous range of zones, which it evolves in a private
+# array with Ng guard zones on either side. The source of every guard zone is
+# found by applying the problem's boundary condition (any function which
+# copies zones, such as set_periodic_bc or set_outflow_bc) to the array of zone
+# indices, so that physical and inter-process boundaries are handled the same
+# way. At every Runge-Kutta stage each worker publishes to one shared array
+# only those of its zones which are the source of some guard zone, and then
+# copies its 2*Ng guard zones from it, so that the exchange costs O(Ng) per
+# worker. The time
+# step is reduced over the workers through a shared array of their maximum
+# wavespeeds, so all of them take identical steps.
+#
+# ------------------------------------------------------------------------------
+
+import time
+import multiprocessing
+import numpy as np
+import weno
+from rungekutta import ShuOsherRk3, ClassicRk4
+
+
+Ng = 3
+
+
+def guard_sources(Nx, set_bc):
+    """
+    Return the index of the zone which supplies each zone of an array of Nx
+    interior zones with Ng guard zones on either side, given its boundary
+    condition. Interior zones are their own source.
+    """
+    index = np.arange(Nx + 2*Ng, dtype=float)[:,None]
+    set_bc(index, Ng)
+    return index[:,0].astype(int)
+
+
+def subdomains(Nx, procs):
+    """
+    Return the [start, stop) ranges of interior zones owned by each of procs
+    workers, as even as possible.
+    """
+    edges = np.linspace(0, Nx, procs + 1).round().astype(int)
+    return list(zip(edges[:-1], edges[1:]))
+
+
+def published_zones(Nx, procs, sources):
+    """
+    Return a boolean mask over the zones of the shared array, which is true for
+    the zones read by the guard zones of some worker, given the guard_sources
+    of the whole domain. These are published by their owner at every stage.
+    """
+    mask = np.zeros(Nx + 2*Ng, dtype=bool)
+    for start, stop in subdomains(Nx, procs):
+        mask[sources[start:start + Ng]] = True
+        mask[sources[Ng + stop:2*Ng + stop]] = True
+    return mask
+
+
+def shared_array(shape, dtype):
+    raw = multiprocessing.RawArray(np.dtype(dtype).char, int(np.prod(shape)))
+    return np.frombuffer(raw, dtype=dtype).reshape(shape)
+
+
+class Exchange(object):
+    """
+    Guard zone exchange and timestep reduction for one worker. Calling it in
+    place of the boundary condition publishes the worker's zones which are read
+    by some guard zone (those of published_zones) to the shared array, waits
+    for all of the others, and copies its guard zones.
+    """
+
+    def __init__(self, rank, start, stop, shared, amax, sources, published,
+                 barrier):
+        self.rank = rank
+        self.a = Ng + start # owned range of the shared array
+        self.b = Ng + stop
+        self.publish = self.a + np.flatnonzero(published[self.a:self.b])
+        self.shared = shared
+        self.amax = amax
+        self.barrier = barrier
+        self.src_lower = sources[self.a - Ng:self.a]
+        self.src_upper = sources[self.b:self.b + Ng]
+
+    def __call__(self, A, Ng):
+        self.shared[self.publish] = A[self.publish - self.a + Ng]
+        self.barrier.wait()
+        A[:Ng] = self.shared[self.src_lower]
+        A[-Ng:] = self.shared[self.src_upper]
+        self.barrier.wait()
+
+    def global_max(self, a):
+        self.amax[self.rank] = a
+        self.barrier.wait()
+        return self.amax.max()
+
+
+def worker(rank, start, stop, shared, amax, sources, published, barrier, tmax,
+           CFL, dx, integrator, steps):
+    try:
+        exchange = Exchange(rank, start, stop, shared, amax, sources,
+                            published, barrier)
+        weno.set_bc = exchange
+        Cons = shared[start:stop + 2*Ng].copy()
+
+        work = { }
+        def rhs(U, L):
+            weno.dUdt(U, Ng, dx, L, work)
+            return exchange.global_max(work['Mlam'][Ng:-Ng].max())
+
+        rk = integrator(rhs, Cons.shape, Cons.dtype)
+        t = 0.0
+        n = 0
+        while t < tmax:
+            t += rk.advance(Cons, CFL, dx, tmax - t)
+            n += 1
+
+        barrier.wait()
+        shared[Ng + start:Ng + stop] = Cons[Ng:-Ng]
+        if rank == 0:
+            steps.value = n
+    except Exception:
+        barrier.abort()
+        raise
+
+
+def run_decomposed(Nx, procs=None, tmax=0.1, info=None, integrator=ClassicRk4,
+                   dtype=None):
+    """
+    Evolve the current problem of weno.py on Nx zones until tmax, decomposed
+    over procs worker processes (default: all cores), and return the L1 error
+    as run_1d_problem does. If info is a dict, the number of time steps taken,
+    the final time and the final primitive states are stored in it. Raises
+    ValueError if there are fewer zones than workers, or if the boundary
+    condition copies guard zones from outside of the interior.
+    """
+    CFL = 0.6
+    procs = procs or multiprocessing.cpu_count()
+    if Nx < procs:
+        raise ValueError("cannot decompose %d zones over %d workers" % (
+            Nx, procs))
+    ctx = multiprocessing.get_context('fork')
+
+    if dtype is None:
+        dtype = weno.precision
+    dtype = weno.precisions.get(dtype, dtype)
+    x, dx = np.linspace(0.0, 1.0, Nx, retstep=True)
+    dx = float(dx)
+
+    shared = shared_array((Nx + 2*Ng, 5), dtype)
+    amax = shared_array((procs,), np.float64)
+    steps = ctx.RawValue('i', 0)
+    sources = guard_sources(Nx, weno.set_bc)
+    guards = np.r_[:Ng, Nx + Ng:Nx + 2*Ng]
+    if ((sources[guards] < Ng) | (sources[guards] >= Nx + Ng)).any():
+        raise ValueError("the boundary condition copies guard zones from "
+                         "outside of the interior")
+    published = published_zones(Nx, procs, sources)
+
+    Prim = np.zeros((Nx + 2*Ng, 5), dtype=dtype)
+    Prim[Ng:-Ng] = weno.initial(x, 0.0)
+    weno.set_bc(Prim, Ng)
+    weno.prim_to_cons(Prim, out=shared)
+
+    barrier = ctx.Barrier(procs)
+    workers = [ctx.Process(target=worker,
+                           args=(rank, start, stop, shared, amax, sources,
+                                 published, barrier, tmax, CFL, dx,
+                                 integrator, steps))
+               for rank, (start, stop) in enumerate(subdomains(Nx, procs))]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    if any(w.exitcode != 0 for w in workers):
+        raise RuntimeError("a worker process failed")
+
+    Prim = weno.cons_to_prim(shared[Ng:-Ng])
+    L1 = abs(Prim - weno.initial(x, tmax)).sum() * dx
+
+    if info is not None:
+        info['steps'] = steps.value
+        info['t'] = tmax
+        info['prim'] = Prim
+    return L1
+
+
+if __name__ == "__main__":
+    from optparse import OptionParser
+
+    parser = OptionParser()
+    parser.add_option("-p", "--problem", default="shocktube1",
+                      help="one of %s [%%default]" % sorted(weno.problems))
+    parser.add_option("-N", "--resolution", type="int", default=10000,
+                      help="number of zones [%default]")
+    parser.add_option("-t", "--tmax", type="float", default=0.1,
+                      help="final time [%default]")
+    parser.add_option("-j", "--procs", type="int", default=None,
+                      help="number of worker processes [all cores]")
+    parser.add_option("--rk3", action="store_true", default=False,
+                      help="use Shu-Osher RK3 rather than RK4")
+    parser.add_option("--check", action="store_true", default=False,
+                      help="also run serially and compare the final states")
+    opts, args = parser.parse_args()
+
+    weno.use_problem(opts.problem)
+    integrator = ShuOsherRk3 if opts.rk3 else ClassicRk4
+    info = { }
+    start = time.time()
+    L1 = run_decomposed(opts.resolution, opts.procs, opts.tmax, info,
+                        integrator)
+    wallclock = time.time() - start
+    print("L1 = %e, %d steps in %3.2f s (%e zone updates per second)" % (
+        L1, info['steps'], wallclock,
+        opts.resolution * info['steps'] / wallclock))
+
+    if opts.check:
+        serial = { }
+        start = time.time()
+        weno.run_1d_problem(opts.resolution, tmax=opts.tmax, plot=False,
+                            quiet=True, info=serial, integrator=integrator)
+        print("serial run in %3.2f s, max |P - P_serial| = %e" % (
+            time.time() - start, abs(info['prim'] - serial['prim']).max()))
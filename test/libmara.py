@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+
+# ------------------------------------------------------------------------------
+#
+# ctypes bindings to the compiled reconstruction and c2p kernels, so that the
+# production code can be benchmarked and cross-validated against the NumPy
+# prototypes in this directory. Build the shared library first with
+#
+#   make kernels
+#
+# which writes lib/libmara_kernels.so. NumPy arrays are handed to the C loops
+# in src/array_kernels.c by pointer: inputs are not copied so long as they hold
+# doubles (the c2p states must also be C-contiguous), and the loops over the
+# whole array run in C.
+#
+# ------------------------------------------------------------------------------
+
+import os
+import ctypes
+import numpy as np
+from numpy.ctypeslib import ndpointer
+
+import reconstruct as _rec
+import rmhd_c2p as _c2p
+
+
+# Same ordering as enum RmhdConsToPrimSolver in src/array_kernels.h
+RMHD_C2P_ANTON2DZW, RMHD_C2P_NOBLE1DW = range(2)
+RMHD_C2P_UNKNOWN_SOLVER = -1
+
+libdir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lib")
+_lib = None
+
+
+def load():
+    """
+    Load lib/libmara_kernels.so on first use and declare its argument types.
+    """
+    global _lib
+    if _lib is not None:
+        return _lib
+
+    lib = np.ctypeslib.load_library("libmara_kernels", libdir)
+    c_double_p = ctypes.POINTER(ctypes.c_double)
+    c_long_p = ndpointer(np.int64, flags='C')
+    c_int_p = ndpointer(np.int32, flags='C')
+
+    lib.reconstruct_pencils.restype = None
+    lib.reconstruct_pencils.argtypes = [c_double_p, c_double_p, ctypes.c_int,
+                                        ctypes.c_long, ctypes.c_long,
+                                        ctypes.c_int, c_long_p, c_long_p,
+                                        ctypes.c_int]
+    lib.rmhd_c2p_solve_array.restype = ctypes.c_int
+    lib.rmhd_c2p_solve_array.argtypes = [ndpointer(np.float64, flags='C'),
+                                         ndpointer(np.float64, flags='C'),
+                                         c_int_p, c_int_p, ctypes.c_int,
+                                         ctypes.c_int]
+    lib.reconstruct_set_smoothness_indicator.argtypes = [ctypes.c_int]
+    lib.reconstruct_set_plm_theta.argtypes = [ctypes.c_double]
+    lib.reconstruct_set_shenzha10_A.argtypes = [ctypes.c_double]
+    lib.rmhd_c2p_set_gamma.argtypes = [ctypes.c_double]
+    _lib = lib
+    return lib
+
+
+def set_smoothness_indicator(IS):
+    load().reconstruct_set_smoothness_indicator(IS)
+
+def set_plm_theta(theta):
+    load().reconstruct_set_plm_theta(theta)
+
+def set_shenzha10_A(A):
+    load().reconstruct_set_shenzha10_A(A)
+
+
+def pencil_offsets(A, axis):
+    """
+    Offsets, in units of elements, of the first zone of every line of A along
+    axis, flattened in C order over the remaining axes.
+    """
+    rest = [(n, s) for d, (n, s) in enumerate(zip(A.shape, A.strides))
+            if d != axis]
+    offsets = np.zeros(1, dtype=np.int64)
+    for n, s in rest:
+        offsets = (offsets[:,None] + np.arange(n) * (s // A.itemsize)).ravel()
+    return offsets
+
+
+def reconstruct(A, op, axis=0):
+    """
+    Same as reconstruct.reconstruct for a single operator (one of the constants
+    in reconstruct.py), evaluated by reconstruct() in src/weno.c. A is used in
+    place if it holds doubles, whatever its strides.
+    """
+    lib = load()
+    if A.dtype != np.float64:
+        A = A.astype(np.float64)
+    axis = axis % A.ndim
+    N = A.shape[axis]
+
+    shape = list(A.shape)
+    shape[axis] = N - 4
+    out = np.empty(shape)
+
+    base = A.__array_interface__['data'][0]
+    lib.reconstruct_pencils(ctypes.cast(base, ctypes.POINTER(ctypes.c_double)),
+                            out.ctypes.data_as(ctypes.POINTER(ctypes.c_double)),
+                            N, A.strides[axis] // A.itemsize,
+                            out.strides[axis] // out.itemsize,
+                            A.size // N,
+                            pencil_offsets(A, axis), pencil_offsets(out, axis),
+                            op)
+    return out
+
+
+def solve(U, solver=RMHD_C2P_ANTON2DZW, P=None, gamma=None):
+    """
+    Solve for the primitive states of the (..., 8) conserved states U with one
+    of the gamma-law solvers in src/rmhd-c2p.c, starting from
+    rmhd_c2p_estimate_from_cons. Returns P, the error codes and the iteration
+    counts. P, if given, must be a C-contiguous array of doubles, and is only
+    modified where the solver succeeds; otherwise it is filled with nan where
+    the solver fails. Raises ValueError if U does not hold states of 8
+    components, if P does not match U, or if the library does not know the
+    solver.
+    """
+    lib = load()
+    U = np.require(U, np.float64, 'C')
+    if U.ndim == 0 or U.shape[-1] != 8:
+        raise ValueError("conserved states must have shape (..., 8), got %s"
+                         % (U.shape,))
+    if P is None:
+        P = np.full_like(U, np.nan)
+    elif P.shape != U.shape:
+        raise ValueError("primitive states must have the shape %s of the "
+                         "conserved states, got %s" % (U.shape, P.shape))
+    elif P.dtype != np.float64 or not P.flags['C_CONTIGUOUS']:
+        raise ValueError("primitive states must be a C-contiguous array of "
+                         "doubles")
+
+    lib.rmhd_c2p_set_gamma(_c2p.AdiabaticGamma if gamma is None else gamma)
+    error = np.empty(U.shape[:-1], dtype=np.int32)
+    iterations = np.empty(U.shape[:-1], dtype=np.int32)
+    lib.rmhd_c2p_solve_array(U, P, error, iterations, U.size // 8, solver)
+    if (error == RMHD_C2P_UNKNOWN_SOLVER).any():
+        raise ValueError("unknown c2p solver %d" % solver)
+    return P, error, iterations
+
+
+def compare(N=100000):
+    """
+    Cross-validate the compiled kernels against the NumPy versions on random
+    data, printing the largest differences.
+    """
+    A = np.random.rand(N, 5)
+    for op in [_rec.PLM_C2L, _rec.WENO5_FD_C2R, _rec.WENO5_FV_C2L]:
+        for axis in [0, 1]:
+            if A.shape[axis] < 5:
+                continue
+            diff = abs(reconstruct(A, op, axis) - _rec.reconstruct(A, op, axis))
+            print("reconstruct op=%d axis=%d: %e" % (op, axis, diff.max()))
+
+    G = np.random.uniform(1.0, 100.0, N)
+    B = 10**np.random.uniform(0.0, 2.0, N)
+    U = _c2p.prim_to_cons(_c2p.random_states(np.sqrt(1 - 1/G**2), B, (N,)))
+    Z, W = _c2p.estimate_from_cons(U)
+    for solver, py_solve in [(RMHD_C2P_ANTON2DZW,
+                              lambda: _c2p.solve_anton2dzw(U, Z, W)),
+                             (RMHD_C2P_NOBLE1DW,
+                              lambda: _c2p.solve_noble1dw(U, Z))]:
+        P, error, iterations = solve(U, solver)
+        Q, py_error, py_iterations = py_solve()
+        print("c2p solver=%d: %d/%d codes and %d/%d iteration counts agree" % (
+            solver, (error == py_error).sum(), N,
+            (iterations == py_iterations).sum(), N))
+
+
+if __name__ == "__main__":
+    compare()
@@ -0,0 +1,215 @@
+#!/usr/bin/env python
+
+# ------------------------------------------------------------------------------
+#
+# Out-of-core shell-averaged power spectra of checkpoints, the offline
+# counterpart of fft_power_vector_field and fft_power_scalar_field in
+# src/lua_fft.cpp, e.g.
+#
+#   python power_spectrum.py data/run/chkpt.0010.h5 -s velocity,magnetic \
+#       -o pspec.h5
+#
+# Each component of the field is transformed in two passes, so that only a
+# bounded part of the grid is ever in memory:
+#
+#   1. slabs along x are read from the checkpoint and transformed along z (real
+#      to complex, keeping kz >= 0) and y, and written to a memory-mapped
+#      scratch file of shape (Nz/2+1, Nx, Ny), i.e. transposed to kz-major
+#   2. blocks of kz planes, each a contiguous part of the scratch file, are
+#      read back, transformed along x, and their power is binned into |k|
+#      shells
+#
+# Both passes are spread over a process pool. As in the C code, the transform
+# is normalized by 1/(Nx Ny Nz), the power of a mode is |f_k|^2 summed over
+# the components, the wavenumbers are integers, and the shells are the 128
+# logarithmically spaced bins between 1 and |N|/2, reported as power per unit
+# k (Histogram::BinDensity). Modes with kz > 0 stand in for their complex
+# conjugates too, so they are counted twice.
+#
+# ------------------------------------------------------------------------------
+
+import os
+import json
+import tempfile
+import multiprocessing
+import numpy as np
+from checkpoint import Checkpoint, default_slab_bytes
+from checkpoint_stats import HistogramSpec
+
+
+# Spectrum name: (component fields, field whose square root weights them)
+spectra = {
+    'velocity': (['vx', 'vy', 'vz'], None),
+    'magnetic': (['Bx', 'By', 'Bz'], None),
+    'kinetic':  (['vx', 'vy', 'vz'], 'rho'),
+    'density':  (['rho'], None) }
+
+NBINS = 128
+
+
+def grid_shape(shape):
+    """
+    The checkpoint shape padded to three axes.
+    """
+    return tuple(shape) + (1,) * (3 - len(shape))
+
+
+def scratch_shape(shape):
+    Nx, Ny, Nz = grid_shape(shape)
+    return (Nz//2 + 1, Nx, Ny)
+
+
+def shells(shape, nbins=NBINS):
+    N = np.array(grid_shape(shape))
+    return HistogramSpec('k', nbins, 1.0, 0.5 * np.sqrt((N**2).sum()), 'log')
+
+
+def forward_slab(args):
+    """
+    Worker for pass 1: transform the slab start:stop of one component along z
+    and y, writing it to the scratch file.
+    """
+    fname, field, weight, start, stop, scratch = args
+    with Checkpoint(fname) as chkpt:
+        shape = chkpt.shape
+        f = chkpt[field].read_slab(start, stop)
+        if weight is not None:
+            f = f * np.sqrt(chkpt[weight].read_slab(start, stop))
+    f = f.reshape((stop - start,) + grid_shape(shape)[1:])
+
+    g = np.fft.fft(np.fft.rfft(f, axis=2), axis=1)
+    out = np.memmap(scratch, dtype=complex, mode='r+',
+                    shape=scratch_shape(shape))
+    out[:,start:stop] = g.transpose(2, 0, 1)
+    out.flush()
+    del out
+    return stop - start
+
+
+def bin_planes(args):
+    """
+    Worker for pass 2: transform the kz planes k0:k1 of the scratch file along
+    x, and return the power and number of modes in each |k| shell.
+    """
+    scratch, shape, k0, k1, spec = args
+    Nx, Ny, Nz = grid_shape(shape)
+    A = np.memmap(scratch, dtype=complex, mode='r', shape=scratch_shape(shape))
+    g = np.fft.fft(A[k0:k1], axis=1)
+    del A
+
+    kx = np.fft.fftfreq(Nx, 1.0 / Nx)
+    ky = np.fft.fftfreq(Ny, 1.0 / Ny)
+    kz = np.arange(k0, k1)
+    K = np.sqrt(kz[:,None,None]**2 + kx[None,:,None]**2 + ky[None,None,:]**2)
+
+    # Modes with 0 < kz < Nz/2 also represent their conjugates at -kz
+    mult = np.where((kz > 0) & (2*kz != Nz), 2.0, 1.0)[:,None,None]
+    P = (g.real**2 + g.imag**2) * (mult / float(Nx * Ny * Nz)**2)
+
+    i = np.searchsorted(spec.edges, K, side='right') - 1
+    inside = (i >= 0) & (i < spec.nbins)
+    power = np.bincount(i[inside], weights=P[inside], minlength=spec.nbins)
+    modes = np.bincount(i[inside],
+                        weights=np.broadcast_to(mult, K.shape)[inside],
+                        minlength=spec.nbins)
+    return power, modes
+
+
+def power_spectrum(fname, name, max_bytes=default_slab_bytes, procs=None,
+                   scratch_dir=None, nbins=NBINS):
+    """
+    Compute the named spectrum (a key of `spectra`) of the checkpoint fname.
+    Returns a dict with the shell centers binloc, the power per unit k binval
+    (as written by Histogram1d::dump_hdf5), and the total power and number of
+    modes in each shell.
+    """
+    fields, weight = spectra[name]
+    with Checkpoint(fname) as chkpt:
+        shape = chkpt.shape
+        bounds = chkpt[fields[0]].slab_bounds(0, max_bytes=max_bytes // 4)
+
+    Nx, Ny, Nz = grid_shape(shape)
+    spec = shells(shape, nbins)
+    nplanes = scratch_shape(shape)[0]
+    planes_per_task = max(1, max_bytes // (4 * 16 * Nx * Ny))
+    planes = [(k, min(k + planes_per_task, nplanes))
+              for k in range(0, nplanes, planes_per_task)]
+
+    fd, scratch = tempfile.mkstemp(suffix=".pspec", dir=scratch_dir)
+    os.close(fd)
+    power = np.zeros(nbins)
+    modes = np.zeros(nbins)
+
+    pool = multiprocessing.Pool(procs)
+    try:
+        for field in fields:
+            np.memmap(scratch, dtype=complex, mode='w+',
+                      shape=scratch_shape(shape)).flush()
+            list(pool.imap_unordered(forward_slab,
+                                     [(fname, field, weight, a, b, scratch)
+                                      for a, b in bounds]))
+            for p, m in pool.imap_unordered(bin_planes,
+                                            [(scratch, shape, k0, k1, spec)
+                                             for k0, k1 in planes]):
+                power += p
+                modes += m / len(fields)
+    finally:
+        pool.close()
+        pool.join()
+        os.remove(scratch)
+
+    return { 'binloc': 0.5 * (spec.edges[1:] + spec.edges[:-1]),
+             'binval': power / np.diff(spec.edges),
+             'power': power,
+             'modes': modes,
+             'bin_edges': spec.edges }
+
+
+def write_hdf5(fname, results, group="pspec"):
+    """
+    Write the spectra in the layout used by Histogram1d::dump_hdf5: one group
+    per spectrum holding the datasets binloc and binval.
+    """
+    import h5py
+    with h5py.File(fname, "a") as f:
+        base = f.require_group(group)
+        for name, r in results.items():
+            if name in base:
+                del base[name]
+            g = base.create_group(name)
+            for k in ['binloc', 'binval', 'power', 'modes']:
+                g[k] = r[k]
+
+
+if __name__ == "__main__":
+    from optparse import OptionParser
+
+    parser = OptionParser(usage="%prog [options] chkpt.h5")
+    parser.add_option("-s", "--spectra", default="velocity",
+                      help="comma separated subset of %s [%%default]" %
+                      sorted(spectra))
+    parser.add_option("-j", "--procs", type="int", default=None,
+                      help="number of worker processes [all cores]")
+    parser.add_option("--max-bytes", type="int", default=default_slab_bytes,
+                      help="approximate memory used by each worker [%default]")
+    parser.add_option("--scratch-dir", default=None,
+                      help="directory for the scratch file [system temp]")
+    parser.add_option("-o", "--output", default=None,
+                      help="write the spectra to this file, .h5 or .json")
+    opts, args = parser.parse_args()
+
+    for fname in args:
+        results = { }
+        for name in opts.spectra.split(","):
+            results[name] = power_spectrum(fname, name, opts.max_bytes,
+                                           opts.procs, opts.scratch_dir)
+            print("%s %s: total power %e" % (fname, name,
+                                             results[name]['power'].sum()))
+        if opts.output is None:
+            continue
+        if opts.output.endswith(".json"):
+            with open(opts.output, "w") as f:
+                json.dump(dict((n, dict((k, v.tolist()) for k, v in r.items()))
+                               for n, r in results.items()), f)
+        else:
+            write_hdf5(opts.output, results)
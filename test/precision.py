@@ -0,0 +1,200 @@
+#!/usr/bin/env python
+
+# ------------------------------------------------------------------------------
+#
+# Report of the error introduced by running the reference kernels and the 1d
+# solver in float32 rather than float64, e.g.
+#
+#   python precision.py -N 64,256,1024 -o precision.json
+#
+# Every kernel is evaluated on the same inputs, generated in float64 and then
+# rounded to each precision, and the float32 result is compared with the
+# float64 one. Errors are reported relative to the largest magnitude of the
+# float64 result, and also in units of the float32 machine epsilon. The 1d
+# problems are evolved in both precisions, and their L1 errors against the
+# exact solution are reported along with the L1 difference between the two
+# solutions, the wallclock of each run and the memory occupied by the state.
+#
+# ------------------------------------------------------------------------------
+
+import json
+import time
+import numpy as np
+
+import weno
+import sreigen
+import rmhd_c2p
+import riemann
+import reconstruct as rec
+
+
+eps32 = float(np.finfo(np.float32).eps)
+
+
+# Every kernel takes the number of samples N and a dtype, and returns an array
+# (or a list of arrays) computed in that precision from inputs which do not
+# depend on it.
+
+def euler_states(N, dtype):
+    np.random.seed(12345)
+    P = np.empty((N, 5))
+    P[:,weno.rho] = np.random.uniform(0.1, 10.0, N)
+    P[:,weno.pre] = np.random.uniform(0.1, 10.0, N)
+    P[:,weno.vx:] = np.random.uniform(-0.5, 0.5, (N, 3))
+    return P.astype(dtype)
+
+
+def kernel_c2p_euler(N, dtype):
+    return weno.cons_to_prim(weno.prim_to_cons(euler_states(N, dtype)))
+
+
+def kernel_eigen_euler(N, dtype):
+    return list(weno.left_right_eigenvectors(euler_states(N, dtype)))
+
+
+def kernel_eigen_srhd(N, dtype):
+    return list(sreigen.eigensystem(euler_states(N, dtype), dim=1))
+
+
+def kernel_c2p_rmhd(N, dtype):
+    np.random.seed(12345)
+    G = np.random.uniform(1.0, 10.0, N)
+    B = 10**np.random.uniform(-1.0, 1.0, N)
+    P = rmhd_c2p.random_states(np.sqrt(1 - 1/G**2), B, (N,)).astype(dtype)
+    U = rmhd_c2p.prim_to_cons(P)
+    Q, error, iterations = rmhd_c2p.solve_anton2dzw(
+        U, *rmhd_c2p.estimate_from_cons(U))
+    return Q
+
+
+def kernel_weno5(N, dtype):
+    x = np.linspace(0.0, 1.0, N + 4)
+    A = np.sin(2*np.pi*x)[:,None] + np.arange(5)
+    return rec.reconstruct(A.astype(dtype), [rec.WENO5_FD_C2R,
+                                             rec.WENO5_FD_C2L])
+
+
+def kernel_hllc(N, dtype):
+    P = euler_states(N + 1, dtype)
+    return riemann.hllc_flux(P[:-1], P[1:])
+
+
+kernels = {
+    'c2p_euler': kernel_c2p_euler,
+    'eigen_euler': kernel_eigen_euler,
+    'eigen_srhd': kernel_eigen_srhd,
+    'c2p_rmhd': kernel_c2p_rmhd,
+    'weno5': kernel_weno5,
+    'riemann_hllc': kernel_hllc }
+
+
+def compare_kernel(kernel, N=10000):
+    """
+    Return a dict with the largest absolute and relative differences between
+    the float32 and float64 results of kernel, the relative difference in units
+    of the float32 epsilon, and whether the float32 result kept its precision.
+    Samples which are not finite in either precision (such as failed c2p
+    solves) are counted and excluded.
+    """
+    r64 = kernel(N, np.float64)
+    r32 = kernel(N, np.float32)
+    if not isinstance(r64, list):
+        r64, r32 = [r64], [r32]
+
+    abs_err = 0.0
+    rel_err = 0.0
+    nonfinite = 0
+    for a, b in zip(r64, r32):
+        good = np.isfinite(a) & np.isfinite(b)
+        nonfinite += int(good.size - good.sum())
+        d = abs(a[good] - b[good].astype(np.float64))
+        scale = abs(a[good]).max()
+        abs_err = max(abs_err, float(d.max()))
+        rel_err = max(rel_err, float(d.max() / scale))
+    return { 'abs_err': abs_err,
+             'rel_err': rel_err,
+             'rel_err_eps32': rel_err / eps32,
+             'nonfinite': nonfinite,
+             'dtype_kept': all(b.dtype == np.float32 for b in r32) }
+
+
+def compare_solver(problem, N, tmax=0.1):
+    """
+    Evolve problem on N zones in each precision, returning the L1 errors
+    against the exact solution, the L1 difference between the two solutions,
+    and the wallclock and state size of each run.
+    """
+    weno.use_problem(problem)
+    res = { 'problem': problem, 'N': N }
+    prim = { }
+    for name in ['float64', 'float32']:
+        info = { }
+        start = time.time()
+        res['L1_' + name] = float(weno.run_1d_problem(N, tmax=tmax, plot=False,
+                                                      quiet=True, info=info,
+                                                      dtype=name))
+        res['wallclock_' + name] = time.time() - start
+        res['state_bytes_' + name] = info['prim'].nbytes
+        prim[name] = info['prim']
+    dx = 1.0 / (N - 1)
+    res['L1_difference'] = float(abs(prim['float32'].astype(np.float64) -
+                                     prim['float64']).sum() * dx)
+    return res
+
+
+def precision_report(kernel_names=None, problems=None, Ns=(64, 256, 1024),
+                     tmax=0.1, N_kernel=10000):
+    if kernel_names is None:
+        kernel_names = sorted(kernels)
+    if problems is None:
+        problems = sorted(weno.problems)
+    return { 'kernels': dict((k, compare_kernel(kernels[k], N_kernel))
+                             for k in kernel_names),
+             'solver': [compare_solver(p, N, tmax)
+                        for p in problems for N in Ns] }
+
+
+def print_report(report):
+    print("%-16s %12s %12s %12s %10s %6s" % ("kernel", "abs err", "rel err",
+                                             "rel/eps32", "nonfinite",
+                                             "kept"))
+    for k, r in sorted(report['kernels'].items()):
+        print("%-16s %12.4e %12.4e %12.2f %10d %6s" % (
+            k, r['abs_err'], r['rel_err'], r['rel_err_eps32'], r['nonfinite'],
+            r['dtype_kept']))
+    print()
+    print("%-16s %6s %12s %12s %12s %10s %10s" % (
+        "problem", "N", "L1 float64", "L1 float32", "L1 diff",
+        "t64 [s]", "t32 [s]"))
+    for r in report['solver']:
+        print("%-16s %6d %12.4e %12.4e %12.4e %10.3f %10.3f" % (
+            r['problem'], r['N'], r['L1_float64'], r['L1_float32'],
+            r['L1_difference'], r['wallclock_float64'],
+            r['wallclock_float32']))
+
+
+if __name__ == "__main__":
+    from optparse import OptionParser
+
+    parser = OptionParser()
+    parser.add_option("-k", "--kernels", default=None,
+                      help="comma separated subset of %s" % sorted(kernels))
+    parser.add_option("-p", "--problems", default=",".join(sorted(weno.problems)),
+                      help="comma separated list of problems [%default]")
+    parser.add_option("-N", "--resolutions", default="64,256,1024",
+                      help="comma separated list of resolutions [%default]")
+    parser.add_option("-t", "--tmax", type="float", default=0.1,
+                      help="final time of each run [%default]")
+    parser.add_option("-o", "--output", default=None,
+                      help="also write the report to this JSON file")
+    opts, args = parser.parse_args()
+
+    report = precision_report(
+        opts.kernels.split(",") if opts.kernels else None,
+        opts.problems.split(","),
+        [int(N) for N in opts.resolutions.split(",")], opts.tmax)
+    print_report(report)
+
+    if opts.output:
+        with open(opts.output, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+
+# ------------------------------------------------------------------------------
+#
+# Opt-in wallclock profiler for the stages of the reference solvers. The
+# solvers hold a module-level `profiler`, which is None unless profiling was
+# requested, so that the only cost when disabled is a truth test per stage.
+# Stages are marked with enter(name), which also closes the stage that was
+# running, and the last stage of a call is closed with exit(). Stage names are
+# those of the corresponding functions in the C solver (src/weno-split.cpp,
+# src/hydro.cpp), so profiles of the two can be compared side by side:
+#
+#   ApplyBoundaries ....... guard zones
+#   ConsToPrim ............ primitive recovery
+#   FluxAndEigenvalues .... zone fluxes and maximum wavespeeds
+#   Eigensystem ........... characteristic eigenvectors at the interfaces
+#   intercell_flux_sweep .. flux splitting and characteristic projection
+#   reconstruct ........... WENO reconstruction
+#   drive_sweeps_1d ....... divergence of the intercell fluxes
+#
+# Times are also recorded per Runge-Kutta substep, which the caller sets
+# through the substep attribute.
+#
+# ------------------------------------------------------------------------------
+
+import json
+from timeit import default_timer
+
+
+class StageProfiler(object):
+
+    def __init__(self):
+        self.wallclock = { } # (substep, stage) -> accumulated seconds
+        self.calls = { }     # (substep, stage) -> number of calls
+        self.substep = 0
+        self._stage = None
+        self._start = None
+
+    def enter(self, stage):
+        """
+        Close the running stage, if any, and start timing the given one.
+        """
+        now = default_timer()
+        if self._stage is not None:
+            self._record(now)
+        self._stage = stage
+        self._start = now
+
+    def exit(self):
+        """
+        Close the running stage.
+        """
+        self._record(default_timer())
+        self._stage = None
+
+    def _record(self, now):
+        key = (self.substep, self._stage)
+        self.wallclock[key] = self.wallclock.get(key, 0.0) + now - self._start
+        self.calls[key] = self.calls.get(key, 0) + 1
+
+    def report(self):
+        """
+        Return a dict with the total time, the time, number of calls and
+        fraction of the total for each stage, and the same broken down by
+        substep.
+        """
+        total = sum(self.wallclock.values())
+        stages = { }
+        substeps = { }
+
+        for (n, stage), t in self.wallclock.items():
+            c = self.calls[(n, stage)]
+            s = stages.setdefault(stage, { 'wallclock': 0.0, 'calls': 0 })
+            s['wallclock'] += t
+            s['calls'] += c
+            substeps.setdefault(str(n), { })[stage] = {
+                'wallclock': t, 'calls': c }
+
+        for s in stages.values():
+            s['fraction'] = s['wallclock'] / total if total > 0 else 0.0
+
+        return { 'total': total, 'stages': stages, 'substeps': substeps }
+
+    def dump(self, fname):
+        with open(fname, "w") as f:
+            json.dump(self.report(), f, indent=2, sort_keys=True)
+
+    def print_report(self):
+        report = self.report()
+        stages = sorted(report['stages'].items(),
+                        key=lambda item: -item[1]['wallclock'])
+        print("%22s %12s %8s %8s" % ("stage", "wallclock", "calls", "percent"))
+        for stage, s in stages:
+            print("%22s %12.4e %8d %8.2f" % (stage, s['wallclock'], s['calls'],
+                                             100 * s['fraction']))
+        print("%22s %12.4e" % ("total", report['total']))
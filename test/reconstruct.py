@@ -0,0 +1,196 @@
+#!/usr/bin/env python
+
+# ------------------------------------------------------------------------------
+#
+# Whole-array version of the reconstruction library in src/weno.c. Every
+# function here operates on all zones of an array at once: the 5-point stencil
+# around each zone is exposed as a zero-copy strided view, and the smoothness
+# indicators are computed once per call, then shared by all of the requested
+# WENO5 operators. The coefficients, epsilons and smoothness indicator variants
+# are exactly those of src/weno.c, so results can be compared with the C code
+# zone for zone.
+#
+# ------------------------------------------------------------------------------
+
+import numpy as np
+
+
+# Same ordering as the enums in src/weno.h
+PLM_C2L, PLM_C2R, \
+    WENO5_FD_C2R, WENO5_FD_C2L, \
+    WENO5_FV_C2R, WENO5_FV_C2L, \
+    WENO5_FV_C2A, WENO5_FV_A2C = range(8)
+
+OriginalJiangShu96, ImprovedBorges08, ImprovedShenZha10 = range(3)
+
+
+plm_theta = 2.0     # [1 -> 2 (most aggressive)]
+shenzha10_A = 50.0  # [0 -> ~100 (most aggressive)]
+IS_mode = OriginalJiangShu96
+
+
+CeesA2C_FV = [ [23./24.,  1./12.,  -1./24.],
+               [-1./24., 13./12.,  -1./24.],
+               [-1./24.,  1./12.,  23./24.] ]
+CeesC2A_FV = [ [25./24., -1./12.,   1./24.],
+               [ 1./24., 11./12.,   1./24.],
+               [ 1./24., -1./12.,  25./24.] ]
+CeesC2L_FV = [ [15./8., -5./4.,  3./8.],
+               [ 3./8.,  3./4., -1./8.],
+               [-1./8.,  3./4.,  3./8.] ]
+CeesC2R_FV = [ [ 3./8., 3./4.,  -1./8.],
+               [-1./8., 3./4.,   3./8.],
+               [ 3./8.,-5./4.,  15./8.] ]
+DeesC2L_FV = [   1./ 16.,   5./  8.,   5./ 16. ]
+DeesC2R_FV = [   5./ 16.,   5./  8.,   1./ 16. ]
+DeesA2C_FV = [  -9./ 80.,  49./ 40.,  -9./ 80. ]
+DeesC2A_FV = [ -17./240., 137./120., -17./240. ]
+
+CeesC2R_FD = [ [ 1./3.,  5./6., -1./6. ],
+               [-1./6.,  5./6.,  1./3. ],
+               [ 1./3., -7./6., 11./6. ] ]
+CeesC2L_FD = [ [11./6., -7./6.,  1./3. ],
+               [ 1./3.,  5./6., -1./6. ],
+               [-1./6.,  5./6.,  1./3. ] ]
+DeesC2L_FD = [ 0.1, 0.6, 0.3 ]
+DeesC2R_FD = [ 0.3, 0.6, 0.1 ]
+
+
+WenoCoefficients = {
+    WENO5_FD_C2L: (CeesC2L_FD, DeesC2L_FD),
+    WENO5_FD_C2R: (CeesC2R_FD, DeesC2R_FD),
+    WENO5_FV_C2L: (CeesC2L_FV, DeesC2L_FV),
+    WENO5_FV_C2R: (CeesC2R_FV, DeesC2R_FV),
+    WENO5_FV_A2C: (CeesA2C_FV, DeesA2C_FV),
+    WENO5_FV_C2A: (CeesC2A_FV, DeesC2A_FV) }
+
+
+def set_plm_theta(theta):
+    global plm_theta
+    plm_theta = theta
+
+def set_smoothness_indicator(IS):
+    global IS_mode
+    IS_mode = IS
+
+def set_shenzha10_A(A):
+    global shenzha10_A
+    shenzha10_A = A
+
+
+def windows(A, n=5, axis=0):
+    """
+    Return a zero-copy view W of A, where W[k] is the array A shifted by k zones
+    along axis, i.e. W[k].take(i, axis) == A.take(i + k, axis). The length of
+    axis is reduced by n-1. The view shares memory with A and must not be
+    written to.
+    """
+    A = np.asarray(A)
+    axis = axis % A.ndim
+    shape = list(A.shape)
+    shape[axis] -= n - 1
+    return np.lib.stride_tricks.as_strided(A, shape=[n] + shape,
+                                           strides=(A.strides[axis],) +
+                                           A.strides)
+
+
+def smoothness_indicators(v):
+    """
+    Jiang & Shu (1996) smoothness indicators of the three candidate stencils,
+    given the 5-point stencil v[0] ... v[4] centered on v[2].
+    """
+    return [(13./12.)*(  v[2] - 2*v[3] +   v[4])**2 +
+            ( 1./ 4.)*(3*v[2] - 4*v[3] +   v[4])**2,
+            (13./12.)*(  v[1] - 2*v[2] +   v[3])**2 +
+            ( 1./ 4.)*(  v[1]          -   v[3])**2,
+            (13./12.)*(  v[0] - 2*v[1] +   v[2])**2 +
+            ( 1./ 4.)*(  v[0] - 4*v[1] + 3*v[2])**2]
+
+
+def nonlinear_weights(B, d):
+    """
+    Un-normalized WENO weights from the smoothness indicators B and the linear
+    weights d, according to the current smoothness indicator mode.
+    """
+    if IS_mode == ImprovedBorges08:
+        eps = 1e-14 # Borges uses 1e-40, but has Matlab
+        tau5 = abs(B[0] - B[2])
+        return [d[0] * (1.0 + tau5 / (B[0] + eps)),
+                d[1] * (1.0 + tau5 / (B[1] + eps)),
+                d[2] * (1.0 + tau5 / (B[2] + eps))]
+    elif IS_mode == ImprovedShenZha10:
+        eps_prime = 1e-10
+        minB = np.minimum(np.minimum(B[0], B[1]), B[2])
+        maxB = np.maximum(np.maximum(B[0], B[1]), B[2])
+        R0 = minB / (maxB + eps_prime)
+        dB = R0*shenzha10_A*minB
+        return [d[0] / (eps_prime + B[0] + dB)**2,
+                d[1] / (eps_prime + B[1] + dB)**2,
+                d[2] / (eps_prime + B[2] + dB)**2]
+    else: # Use OriginalJiangShu96
+        eps_prime = 1e-6 # recommended value by Jiang and Shu
+        return [d[0] / (eps_prime + B[0])**2,
+                d[1] / (eps_prime + B[1])**2,
+                d[2] / (eps_prime + B[2])**2]
+
+
+def weno5(v, c, d, B=None):
+    """
+    WENO5 reconstruction from the 5-point stencil v[0] ... v[4] centered on
+    v[2], where each v[k] may be an array. The smoothness indicators B may be
+    passed in if they have already been computed for this stencil.
+    """
+    if B is None:
+        B = smoothness_indicators(v)
+    vs = [c[0][0]*v[2] + c[0][1]*v[3] + c[0][2]*v[4],
+          c[1][0]*v[1] + c[1][1]*v[2] + c[1][2]*v[3],
+          c[2][0]*v[0] + c[2][1]*v[1] + c[2][2]*v[2]]
+    w = nonlinear_weights(B, d)
+    wtot = w[0] + w[1] + w[2]
+    return (w[0]*vs[0] + w[1]*vs[1] + w[2]*vs[2])/wtot
+
+
+def plm(v, sgn):
+    """
+    Piecewise linear reconstruction with the generalized minmod limiter, given
+    the 3-point stencil v[0] ... v[2] centered on v[1].
+    """
+    a = plm_theta * (v[1] - v[0])
+    b =     0.5   * (v[2] - v[0])
+    c = plm_theta * (v[2] - v[1])
+    m = np.minimum(np.minimum(abs(a), abs(b)), abs(c))
+    minmod = 0.25*abs(np.sign(a) + np.sign(b))*(np.sign(a) + np.sign(c))*m
+    return v[1] + sgn*0.5*minmod
+
+
+def reconstruct(A, ops, axis=0):
+    """
+    Apply the reconstruction operators ops (one of the constants above, or a
+    sequence of them) to every zone of A along axis. The zones 2 ... N-3 have
+    full stencils, so each result has N-4 entries along axis, the first one
+    belonging to zone 2. The smoothness indicators are evaluated once and shared
+    by all of the WENO5 operators. Returns one array per operator, or a single
+    array if ops was a single operator.
+    """
+    single = np.ndim(ops) == 0
+    if single:
+        ops = [ops]
+
+    v = windows(A, 5, axis)
+    B = None
+    res = [ ]
+
+    for op in ops:
+        if op == PLM_C2L:
+            res.append(plm(v[1:4], -1.0))
+        elif op == PLM_C2R:
+            res.append(plm(v[1:4], +1.0))
+        elif op in WenoCoefficients:
+            if B is None:
+                B = smoothness_indicators(v)
+            c, d = WenoCoefficients[op]
+            res.append(weno5(v, c, d, B))
+        else:
+            raise ValueError("unknown reconstruction operator %s" % op)
+
+    return res[0] if single else res
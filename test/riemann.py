@@ -0,0 +1,275 @@
+#!/usr/bin/env python
+
+# ------------------------------------------------------------------------------
+#
+# Approximate Riemann solvers for the Euler equations, evaluated for all
+# interfaces at once. These mirror HllRiemannSolver (src/riemann_hll.cpp) and
+# HllcEulersRiemannSolver (src/riemann_hllc-eulers.cpp): given the primitive
+# states Pl and Pr on either side of each interface, arrays of shape (..., 5)
+# with the normal velocity in the vx slot, they return the flux of the solution
+# sampled along the ray x/t = s, and optionally the state there.
+#
+# EulersWavePattern is the exact solution of ExactEulersRiemannSolver
+# (src/riemann_exact-eulers.cpp). The star pressure of every pair of states is
+# found once, by Newton iterations run on all of them at once, after which the
+# self-similar solution may be sampled at any number of points x/t. The
+# patterns of single pairs of states are cached by wave_pattern, so that exact
+# solutions (such as that of shocktube1 in weno.py) cost one solve per problem.
+#
+# ------------------------------------------------------------------------------
+
+import numpy as np
+import weno
+from weno import rho, pre, vx, vy, vz, nrg, px, py, pz
+
+
+def _sides(Pl, Pr):
+    Ul = weno.prim_to_cons(Pl)
+    Ur = weno.prim_to_cons(Pr)
+    Fl = weno.flux(Pl, Ul)
+    Fr = weno.flux(Pr, Ur)
+    epl, eml = weno.max_wavespeed(Pl, take_abs=False)
+    epr, emr = weno.max_wavespeed(Pr, take_abs=False)
+    ap = np.maximum(epl, epr)[...,None]
+    am = np.minimum(eml, emr)[...,None]
+    return Ul, Ur, Fl, Fr, ap, am
+
+
+def hll_flux(Pl, Pr, s=0.0, state=False):
+    """
+    Two-wave HLL flux between the states Pl and Pr, sampled at x/t = s. If state
+    is true, the sampled conserved state is returned as well.
+    """
+    Ul, Ur, Fl, Fr, ap, am = _sides(Pl, Pr)
+
+    F_hll = (ap*Fl - am*Fr + ap*am*(Ur - Ul)) / (ap - am)
+    F = np.where(s <= am, Fl, np.where(s <= ap, F_hll, Fr))
+    if not state:
+        return F
+
+    U_hll = (ap*Ur - am*Ul + (Fl - Fr)) / (ap - am)
+    U = np.where(s <= am, Ul, np.where(s <= ap, U_hll, Ur))
+    return F, U
+
+
+def hllc_star_state(P, U, a, lc):
+    """
+    Toro eqn 10.33: the conserved state between the wave of speed a and the
+    contact of speed lc, on the side of the state P, U.
+    """
+    d, p, u = P[...,rho:rho+1], P[...,pre:pre+1], P[...,vx:vx+1]
+    fact = d * (a - u) / (a - lc)
+    S = np.empty_like(U)
+    S[...,rho] = fact[...,0]
+    S[...,nrg] = (fact * (U[...,nrg:nrg+1]/d + (lc - u)*(lc + p/(d*(a - u)))))[...,0]
+    S[...,px] = (fact * lc)[...,0]
+    S[...,py] = fact[...,0] * P[...,vy]
+    S[...,pz] = fact[...,0] * P[...,vz]
+    return S
+
+
+def hllc_flux(Pl, Pr, s=0.0, state=False):
+    """
+    Three-wave HLLC flux between the states Pl and Pr, sampled at x/t = s. If
+    state is true, the sampled conserved state is returned as well.
+    """
+    Ul, Ur, Fl, Fr, ap, am = _sides(Pl, Pr)
+
+    dl, pl, ul = Pl[...,rho:rho+1], Pl[...,pre:pre+1], Pl[...,vx:vx+1]
+    dr, pr, ur = Pr[...,rho:rho+1], Pr[...,pre:pre+1], Pr[...,vx:vx+1]
+    lc = (((pr - dr*ur*(ap - ur)) - (pl - dl*ul*(am - ul))) /
+          (dl*(am - ul) - dr*(ap - ur))) # eqn 10.58
+
+    Ul_ = hllc_star_state(Pl, Ul, am, lc)
+    Ur_ = hllc_star_state(Pr, Ur, ap, lc)
+
+    F = np.select([s <= am, s <= lc, s <= ap],
+                  [Fl, Fl + am*(Ul_ - Ul), Fr + ap*(Ur_ - Ur)], Fr)
+    if not state:
+        return F
+
+    U = np.select([s <= am, s <= lc, s <= ap], [Ul, Ul_, Ur_], Ur)
+    return F, U
+
+
+class NoPressureSolution(ValueError):
+    pass
+
+
+class EulersWavePattern(object):
+    """
+    Exact solution of the Riemann problems between the primitive states Pl and
+    Pr, which may be single states or (..., 5) arrays of them, for an adiabatic
+    index gamma (by default weno.Gamma). References are to Toro (1999).
+    """
+
+    MaxIterations = 500
+    Tolerance = 1e-12
+
+    def __init__(self, Pl, Pr, gamma=None):
+        self.Pl = Pl = weno.as_real(Pl)
+        self.Pr = Pr = weno.as_real(Pr)
+        self.gm0 = gm0 = weno.Gamma if gamma is None else gamma
+        self.gm1 = (gm0 + 1) / (2*gm0)
+        self.gm2 = (gm0 - 1) / (2*gm0)
+        self.gm3 = (gm0 - 1) / (gm0 + 1)
+        self.gm4 = 2.0 / (gm0 + 1)
+        self.gm5 = 2.0 / (gm0 - 1)
+
+        self.pL, self.pR = Pl[...,pre], Pr[...,pre]
+        self.uL, self.uR = Pl[...,vx], Pr[...,vx]
+        self.aL = np.sqrt(gm0 * Pl[...,pre] / Pl[...,rho]) # sound speed
+        self.aR = np.sqrt(gm0 * Pr[...,pre] / Pr[...,rho])
+
+        p_ = self.star_pressure()
+        fL, dfL = self.pressure_function(p_, Pl, self.aL)
+        fR, dfR = self.pressure_function(p_, Pr, self.aR)
+        self.p_ = p_
+        self.u_ = 0.5*(self.uL + self.uR) - 0.5*(fL - fR) # eqn 4.88
+
+    def pressure_function(self, p, P, a):
+        """
+        Eqns 4.6 and 4.7, and their derivative with respect to p (eqn 4.37), for
+        the wave between the state P with sound speed a and the star region.
+        """
+        d, pK = P[...,rho], P[...,pre]
+        A = 2.0 / ((self.gm0 + 1)*d) # eqn 4.8
+        B = self.gm3 * pK
+        shock = p > pK
+        with np.errstate(all='ignore'):
+            f = np.where(shock, (p - pK) * np.sqrt(A / (p + B)),
+                         2*a/(self.gm0 - 1) * ((p/pK)**self.gm2 - 1))
+            df = np.where(shock, np.sqrt(A / (B + p)) * (1 - 0.5*(p - pK)/(B + p)),
+                          1.0/(d*a) * (p/pK)**(-self.gm1))
+        return f, df
+
+    def estimate_solution(self, attempt):
+        pL, pR, uL, uR, aL, aR = (self.pL, self.pR, self.uL, self.uR,
+                                  self.aL, self.aR)
+        if attempt == 0: # eqn 4.46
+            g = self.gm2
+            return (((aL + aR) + 0.5*(self.gm0 - 1)*(uL - uR)) /
+                    (aL/pL**g + aR/pR**g))**(1.0/g)
+        elif attempt == 1: # eqn 4.47
+            dL, dR = self.Pl[...,rho], self.Pr[...,rho]
+            pPV = 0.5*(pL + pR) + 0.125*(uL - uR)*(dL + dR)*(aL + aR)
+            return np.maximum(pPV, 1e-6)
+        else: # eqn 4.49
+            return 0.5*(pL + pR)
+
+    def star_pressure(self):
+        """
+        Solve eqn 4.5 for the star pressure of every pair of states. As in the
+        C code, the three starting estimates are tried in turn on the pairs
+        which have not yet converged.
+        """
+        shape = np.broadcast(self.pL, self.pR).shape
+        p_ = np.full(shape, np.nan)
+        bad = np.ones(shape, dtype=bool)
+        du = self.uR - self.uL
+
+        for attempt in range(3):
+            p = np.broadcast_to(self.estimate_solution(attempt), shape).copy()
+            with np.errstate(all='ignore'):
+                for n in range(self.MaxIterations):
+                    fL, dfL = self.pressure_function(p, self.Pl, self.aL)
+                    fR, dfR = self.pressure_function(p, self.Pr, self.aR)
+                    y = fL + fR + du
+                    done = abs(y) <= self.Tolerance
+                    if done[bad].all():
+                        break
+                    p = np.where(done, p, p - y / (dfL + dfR))
+            good = bad & done & (p > 0.0)
+            p_[good] = p[good]
+            bad &= ~good
+            if not bad.any():
+                return p_
+        raise NoPressureSolution("failed to find p* in Riemann solution")
+
+    def sample(self, S):
+        """
+        Return the primitive state at x/t = S, following the sampling procedure
+        of Toro's figure 4.14. The result has shape S.shape + (5,) for single
+        pairs of states, and otherwise the broadcast shape of S and the states.
+        """
+        S = np.asarray(S, dtype=self.p_.dtype)
+        Pl, Pr = self.Pl, self.Pr
+        pL, pR, uL, uR, aL, aR = (self.pL, self.pR, self.uL, self.uR,
+                                  self.aL, self.aR)
+        p_, u_ = self.p_, self.u_
+        gm0, gm1, gm2, gm3, gm4, gm5 = (self.gm0, self.gm1, self.gm2, self.gm3,
+                                        self.gm4, self.gm5)
+
+        aL_ = aL*(p_/pL)**gm2 # eqn 4.54
+        aR_ = aR*(p_/pR)**gm2
+
+        SL  = uL - aL*np.sqrt(gm1 * p_/pL + gm2) # eqn 4.52
+        SHL = uL - aL
+        STL = u_ - aL_
+        STR = u_ + aR_
+        SHR = uR + aR
+        SR  = uR + aR*np.sqrt(gm1 * p_/pR + gm2) # eqn 4.59
+
+        shockL = p_ > pL
+        shockR = p_ > pR
+        dL_ = np.where(shockL, Pl[...,rho]*(p_/pL + gm3) / (gm3*p_/pL + 1), # eqn 4.50
+                       Pl[...,rho]*(p_/pL)**(1.0/gm0))                      # eqn 4.53
+        dR_ = np.where(shockR, Pr[...,rho]*(p_/pR + gm3) / (gm3*p_/pR + 1), # eqn 4.57
+                       Pr[...,rho]*(p_/pR)**(1.0/gm0))                      # eqn 4.60
+
+        with np.errstate(all='ignore'):
+            cL = gm4 + gm3*(uL - S)/aL # eqn 4.56
+            cR = gm4 - gm3*(uR - S)/aR # eqn 4.63
+            fanL = [Pl[...,rho]*cL**gm5, Pl[...,pre]*cL**(1.0/gm2),
+                    gm4*(aL + uL/gm5 + S)]
+            fanR = [Pr[...,rho]*cR**gm5, Pr[...,pre]*cR**(1.0/gm2),
+                    gm4*(-aR + uR/gm5 + S)]
+
+        left = S < u_
+        cond = [left & np.where(shockL, S < SL, S < SHL), # left region
+                left & ~shockL & (S < STL),               # left fan
+                left,                                     # left star region
+                np.where(shockR, S > SR, S > SHR),        # right region
+                ~shockR & (S > STR)]                      # right fan
+        star = [p_, u_]
+
+        P = np.empty(np.broadcast(S, p_).shape + (5,), dtype=S.dtype)
+        for n, q in enumerate([rho, pre, vx]):
+            P[...,q] = np.select(cond, [Pl[...,q], fanL[n], ([dL_] + star)[n],
+                                        Pr[...,q], fanR[n]],
+                                 ([dR_] + star)[n])
+        for q in [vy, vz]:
+            P[...,q] = np.where(left, Pl[...,q], Pr[...,q])
+        return P
+
+
+_patterns = { }
+
+
+def wave_pattern(Pl, Pr, gamma=None):
+    """
+    Return the EulersWavePattern of the single states Pl and Pr, which is
+    solved only once for each pair of states and adiabatic index.
+    """
+    gamma = weno.Gamma if gamma is None else gamma
+    key = (tuple(np.ravel(Pl)), tuple(np.ravel(Pr)), gamma)
+    if key not in _patterns:
+        _patterns[key] = EulersWavePattern(Pl, Pr, gamma)
+    return _patterns[key]
+
+
+def exact_flux(Pl, Pr, s=0.0, state=False):
+    """
+    Flux of the exact solution between the states Pl and Pr, sampled at x/t =
+    s. If state is true, the sampled conserved state is returned as well.
+    """
+    P = EulersWavePattern(Pl, Pr).sample(s)
+    U = weno.prim_to_cons(P)
+    F = weno.flux(P, U)
+    return (F, U) if state else F
+
+
+riemann_solvers = {
+    'exact': exact_flux,
+    'hll': hll_flux,
+    'hllc': hllc_flux }
@@ -0,0 +1,428 @@
+#!/usr/bin/env python
+
+# ------------------------------------------------------------------------------
+#
+# NumPy port of the gamma-law conserved to primitive solvers in
+# src/rmhd-c2p.c. Rather than one state at a time through file-static
+# variables, every function here takes arrays of states: conserved states U of
+# shape (..., 8) ordered (ddd, tau, Sx, Sy, Sz, Bx, By, Bz), and primitive
+# states P of shape (..., 8) ordered (rho, pre, vx, vy, vz, Bx, By, Bz). The
+# Newton iterations proceed on all states at once. Each state stops iterating
+# when it converges or fails, and the solvers return its error code (same
+# values as enum RmhdConsToPrimError) and iteration count.
+#
+# Running this file generates the pass/time grids read by c2p_test.py, as
+# c2p.lua does through Mara, for the two gamma-law solvers.
+#
+# ------------------------------------------------------------------------------
+
+import time
+import numpy as np
+
+
+ddd, tau, Sx, Sy, Sz, Bx, By, Bz = range(8) # Conserved
+rho, pre, vx, vy, vz = range(5)             # Primitive
+
+SUCCESS, \
+    CONS_CONTAINS_NAN, \
+    CONS_NEGATIVE_DENSITY, \
+    CONS_NEGATIVE_ENERGY, \
+    PRIM_CONTAINS_NAN, \
+    PRIM_NEGATIVE_PRESSURE, \
+    PRIM_NEGATIVE_RESTMASS, \
+    PRIM_SUPERLUMINAL, \
+    MAXITER = range(9)
+
+MaxIteration = 250
+Tolerance = 1e-12
+bigZ = 1e20
+bigW = 1e12
+smlZ = 0.0
+smlW = 1.0
+
+AdiabaticGamma = 1.4 # default of every function taking gamma=None
+
+
+def gamf(gamma=None):
+    gamma = AdiabaticGamma if gamma is None else gamma
+    return (gamma - 1.0) / gamma
+
+
+def dot3(A, i, B, j):
+    """
+    The dot product of the 3-vectors starting at components i of A and j of B,
+    written out since summing over a short trailing axis is much slower.
+    """
+    return (A[...,i  ]*B[...,j  ] +
+            A[...,i+1]*B[...,j+1] +
+            A[...,i+2]*B[...,j+2])
+
+
+def invariants(U):
+    """
+    Return the scalars D, Tau, S2, B2 and BS used by the solvers, as in
+    rmhd_c2p_new_state.
+    """
+    return (U[...,ddd], U[...,tau],
+            dot3(U, Sx, U, Sx), dot3(U, Bx, U, Bx), dot3(U, Bx, U, Sx))
+
+
+def prim_to_cons(P, gamma=None):
+    """
+    Conserved states for the primitive states P, as in Rmhd::PrimToCons with a
+    gamma-law equation of state.
+    """
+    v = P[...,vx:vz+1]
+    B = P[...,Bx:Bz+1]
+    V2 = dot3(P, vx, P, vx)
+    B2 = dot3(P, Bx, P, Bx)
+    Bv = dot3(P, Bx, P, vx)
+    W2 = 1.0 / (1.0 - V2)
+    W = np.sqrt(W2)
+    b0 = W*Bv
+    b2 = (B2 + b0*b0) / W2
+    b = (B + (b0*W)[...,None]*v) / W[...,None]
+    gamma = AdiabaticGamma if gamma is None else gamma
+    e = P[...,pre] / (P[...,rho] * (gamma - 1.0))
+    e_ = e + 0.5 * b2 / P[...,rho]
+    p_ = P[...,pre] + 0.5 * b2
+    h_ = 1 + e_ + p_ / P[...,rho]
+
+    U = np.empty_like(P)
+    U[...,ddd] = P[...,rho] * W
+    U[...,tau] = P[...,rho] * h_ * W2 - p_ - b0*b0 - U[...,ddd]
+    U[...,Sx:Sz+1] = (P[...,rho] * h_ * W2)[...,None] * v - b0[...,None]*b
+    U[...,Bx:Bz+1] = B
+    return U
+
+
+def estimate_from_cons(U):
+    """
+    Starting values of Z and W, exact for no magnetic field in the NR limit.
+    """
+    D, Tau, S2, B2, BS = invariants(U)
+    Z = np.sqrt(S2 + D*D)
+    return Z, Z / D
+
+
+def starting_values(P, gamma=None):
+    """
+    Starting values of Z and W from a guess for the primitive states.
+    """
+    V2 = dot3(P, vx, P, vx)
+    W2 = 1.0 / (1.0 - V2)
+    gamma = AdiabaticGamma if gamma is None else gamma
+    e = P[...,pre] / (P[...,rho] * (gamma - 1.0))
+    h = 1.0 + e + P[...,pre] / P[...,rho]
+    return P[...,rho] * h * W2, np.sqrt(W2)
+
+
+def check_cons(U):
+    error = np.zeros(U.shape[:-1], dtype=int)
+    error[np.isnan(U).any(axis=-1)] = CONS_CONTAINS_NAN
+    error[U[...,tau] < 0.0] = CONS_NEGATIVE_ENERGY
+    error[U[...,ddd] < 0.0] = CONS_NEGATIVE_DENSITY
+    return error
+
+
+def check_prim(P):
+    error = np.zeros(P.shape[:-1], dtype=int)
+    v2 = dot3(P, vx, P, vx)
+    error[np.isnan(P).any(axis=-1)] = PRIM_CONTAINS_NAN
+    error[P[...,rho] < 0.0] = PRIM_NEGATIVE_RESTMASS
+    error[P[...,pre] < 0.0] = PRIM_NEGATIVE_PRESSURE
+    error[v2 >= 1.0] = PRIM_SUPERLUMINAL
+    return error
+
+
+def reconstruct_prim(U, Z, W, gamma=None):
+    """
+    Using Z=rho*h*W^2, and W, get the primitive states and their error codes.
+    """
+    D, Tau, S2, B2, BS = invariants(U)
+    b0 = BS * W / Z
+    P = np.empty_like(U)
+    P[...,rho] = D/W
+    P[...,pre] = (D/W) * (Z/(D*W) - 1.0) * gamf(gamma)
+    P[...,vx:vz+1] = ((U[...,Sx:Sz+1] + (b0/W)[...,None]*U[...,Bx:Bz+1]) /
+                      (Z+B2)[...,None])
+    P[...,Bx:Bz+1] = U[...,Bx:Bz+1]
+    return P, check_prim(P)
+
+
+def iterate(U, X, step):
+    """
+    Drive Newton iterations on all states at once. X is a tuple of arrays with
+    the starting values of the unknowns, and step(invariants, X) returns their
+    updated values and the error of that iteration. Only the states still
+    iterating are passed to step. Returns the final unknowns, the error codes
+    and the iteration counts. The unknowns are iterated in the precision of U,
+    and the tolerance is relaxed to 64 machine epsilons of that precision if
+    needed.
+    """
+    shape = U.shape[:-1]
+    U = U.reshape(-1, U.shape[-1])
+    X = [np.array(np.broadcast_to(x, shape), dtype=U.dtype).ravel() for x in X]
+    tolerance = max(Tolerance, 64 * np.finfo(U.dtype).eps)
+    inv = invariants(U)
+
+    error = check_cons(U)
+    iterations = np.zeros(U.shape[0], dtype=int)
+    active = np.flatnonzero(error == SUCCESS)
+
+    while active.size:
+        Xa, err = step([q[active] for q in inv], [x[active] for x in X])
+        for x, xa in zip(X, Xa):
+            x[active] = xa
+        iterations[active] += 1
+
+        maxed = iterations[active] == MaxIteration
+        error[active[maxed]] = MAXITER
+        active = active[~maxed & (err > tolerance)]
+
+    return ([x.reshape(shape) for x in X],
+            error.reshape(shape), iterations.reshape(shape))
+
+
+def bracket_Z(Z, dZ):
+    Z_new = Z + dZ
+    Z_new = np.where(Z_new > smlZ, Z_new, -Z_new)
+    return np.where(Z_new < bigZ, Z_new, Z)
+
+
+def anton2dzw_step(inv, X, gamma=None):
+    D, Tau, S2, B2, BS = inv
+    Z, W = X
+    BS2 = BS*BS
+    gf = gamf(gamma)
+
+    Z2 = Z*Z
+    Z3 = Z*Z2
+    W2 = W*W
+    W3 = W*W2
+    Pre = (D/W) * (Z/(D*W) - 1.0) * gf
+
+    df0dZ = 2*(B2+Z)*(BS2*W2 + (W2-1)*Z3) / (W2*Z3)
+    df0dW = 2*(B2+Z)*(B2+Z) / W3
+    df1dZ = 1.0 + BS2/Z3 - gf/W2
+    df1dW = B2/W3 + (2*Z - D*W)/W3 * gf
+
+    f0 = -S2  + (Z+B2)*(Z+B2)*(W2-1)/W2 - (2*Z+B2)*BS2/Z2      # eqn (84)
+    f1 = -Tau +  Z+B2 - Pre - 0.5*B2/W2 -      0.5*BS2/Z2 - D  # eqn (85)
+
+    # G is the inverse Jacobian
+    det = df0dZ*df1dW - df0dW*df1dZ
+    G0 =  df1dW/det; G1 = -df0dW/det
+    G2 = -df1dZ/det; G3 =  df0dZ/det
+
+    dZ = -(G0*f0 + G1*f1) # Matrix multiply, dx = -G . f
+    dW = -(G2*f0 + G3*f1)
+
+    Z = bracket_Z(Z, dZ)
+    W_new = W + dW
+    W_new = np.where(W_new > smlW, W_new, smlW)
+    W = np.where(W_new < bigW, W_new, bigW)
+    return (Z, W), abs(dZ/Z) + abs(dW/W)
+
+
+def noble1dw_V2(inv, Z):
+    D, Tau, S2, B2, BS = inv
+    BS2 = BS*BS
+    Z2 = Z*Z
+    a = S2*Z2 + BS2*(B2 + 2*Z)
+    b = (B2 + Z)*(B2 + Z)*Z2
+    return a, b, a / b
+
+
+def noble1dw_step(inv, X, gamma=None):
+    D, Tau, S2, B2, BS = inv
+    Z, = X
+    BS2 = BS*BS
+    gf = gamf(gamma)
+
+    Z2  = Z*Z
+    Z3  = Z*Z2
+    a, b, V2 = noble1dw_V2(inv, Z)
+    ap  = 2*(S2*Z + BS2)          # da/dZ
+    bp  = 2*Z*(B2 + Z)*(B2 + 2*Z) # db/dZ
+    W2  = 1.0 / (1.0 - V2)
+    W   = np.sqrt(W2)
+    W3  = W*W2
+    Pre = (D/W) * (Z/(D*W) - 1.0) * gf
+
+    dv2dZ    = (ap*b - bp*a) / (b*b) # (a'b - b'a) / b^2
+    delPdelZ = gf/W2
+    delPdelW = gf*(D/W2 - 2*Z/W3)
+    dWdv2    = 0.5*W3
+    dPdZ     = delPdelW * dWdv2 * dv2dZ + delPdelZ
+
+    f = Tau + D - 0.5*B2*(1+V2) + 0.5*BS2/Z2 - Z + Pre # equation (29)
+    g = -0.5*B2*dv2dZ - BS2/Z3 - 1.0 + dPdZ
+
+    dZ = -f/g
+    Z = bracket_Z(Z, dZ)
+    return (Z,), abs(dZ/Z)
+
+
+def finish(U, Z, W, error, P, gamma=None):
+    """
+    Reconstruct the primitive states where the iterations succeeded, writing
+    them into P only where the reconstructed state is also good.
+    """
+    Q, prim_error = reconstruct_prim(U, Z, W, gamma)
+    error = np.where(error == SUCCESS, prim_error, error)
+    if P is None:
+        P = np.full_like(U, np.nan)
+    good = error == SUCCESS
+    P[good] = Q[good]
+    return P, error
+
+
+def solve_anton2dzw(U, Z, W, P=None, gamma=None):
+    """
+    Solution based on Anton & Zanotti (2006), equations 84 and 85, with starting
+    values Z and W. Returns the primitive states, error codes and iteration
+    counts. If P is given, it is modified only where the solve succeeds.
+    """
+    step = lambda inv, X: anton2dzw_step(inv, X, gamma)
+    with np.errstate(all='ignore'):
+        (Z, W), error, iterations = iterate(U, (Z, W), step)
+        P, error = finish(U, Z, W, error, P, gamma)
+    return P, error, iterations
+
+
+def solve_noble1dw(U, Z, P=None, gamma=None):
+    """
+    Solution based on Noble et. al. (2006), using Z = rho h W^2 as the single
+    unknown, with starting value Z. Returns the primitive states, error codes
+    and iteration counts. If P is given, it is modified only where the solve
+    succeeds.
+    """
+    step = lambda inv, X: noble1dw_step(inv, X, gamma)
+    with np.errstate(all='ignore'):
+        (Z,), error, iterations = iterate(U, (Z,), step)
+        a, b, V2 = noble1dw_V2(invariants(U), Z)
+        W = np.sqrt(1.0 / (1.0 - V2))
+        P, error = finish(U, Z, W, error, P, gamma)
+    return P, error, iterations
+
+
+def cons_to_prim(U, P, gamma=None):
+    """
+    Recover the primitive states P (updated in place, and also used as the
+    starting guess) from U, trying the solvers in the same order as
+    Srhd::ConsToPrim. Each fallback is only run on the states that are still
+    failing. Returns the error codes.
+    """
+    error = np.full(U.shape[:-1], MAXITER)
+    g = gamma
+    attempts = [
+        lambda U, P: solve_anton2dzw(U, *starting_values(P, g), P=P, gamma=g),
+        lambda U, P: solve_anton2dzw(U, *estimate_from_cons(U), P=P, gamma=g),
+        lambda U, P: solve_noble1dw(U, starting_values(P, g)[0], P=P, gamma=g),
+        lambda U, P: solve_noble1dw(U, estimate_from_cons(U)[0], P=P, gamma=g)]
+
+    for attempt in attempts:
+        bad = error != SUCCESS
+        if not bad.any():
+            break
+        if bad.all():
+            P[...], error[...], iterations = attempt(U, P)
+            continue
+        Pb = P[bad]
+        Pb, error[bad], iterations = attempt(U[bad], Pb)
+        P[bad] = Pb
+    return error
+
+
+def random_states(Vel, Mag, shape, dtype=float):
+    """
+    Primitive states with rho = pre = 1, and velocity and magnetic field of
+    magnitude Vel and Mag pointing in random directions, as in c2p.lua.
+    """
+    def random_vectors(mag):
+        tht = np.arccos(np.random.rand(*shape) * 2.0 - 1.0)
+        phi = np.random.rand(*shape) * 2*np.pi
+        return mag[...,None] * np.stack([np.sin(tht)*np.cos(phi),
+                                         np.sin(tht)*np.sin(phi),
+                                         np.cos(tht)], axis=-1)
+    P = np.empty(shape + (8,), dtype=dtype)
+    P[...,rho] = 1.0
+    P[...,pre] = 1.0
+    P[...,vx:vz+1] = random_vectors(np.broadcast_to(Vel, shape))
+    P[...,Bx:Bz+1] = random_vectors(np.broadcast_to(Mag, shape))
+    return P
+
+
+def run_grid(Nsamp_G=100, Nsamp_B=100, ntrials=100, seed=12345, dtype=float):
+    """
+    Generate the pass, time and iteration grids of c2p.lua, each of shape
+    (Nsamp_G, Nsamp_B, 6), with the full column set of c2p_test.columns. Only
+    the noble1dw and anton2dzw solvers are ported here, so the noble2dzt and
+    duffell3d columns are filled with NaN. All trials of all grid points are
+    solved in one batch per solver, so the time per solve at each grid point is
+    the batch wallclock apportioned by the number of iterations taken there.
+    The states are solved in the precision dtype.
+    """
+    from c2p_test import columns
+
+    np.random.seed(seed)
+    G = 1.0 + 1000.0 * np.arange(Nsamp_G) / Nsamp_G
+    B = 10.0**(3.0 * np.arange(Nsamp_B) / Nsamp_B)
+    G, B = np.meshgrid(G, B, indexing='ij')
+    V = np.sqrt(1.0 - 1.0/(G*G))
+
+    shape = G.shape + (ntrials,)
+    P = random_states(V[...,None], B[...,None], shape, dtype)
+    U = prim_to_cons(P)
+    Z, W = estimate_from_cons(U)
+
+    solvers = [('noble1dw', lambda: solve_noble1dw(U, Z)),
+               ('anton2dzw', lambda: solve_anton2dzw(U, Z, W))]
+
+    grids = [np.full(G.shape + (len(columns),), np.nan) for n in range(3)]
+    for grid in grids:
+        grid[...,0] = G
+        grid[...,1] = np.log10(B)
+    dpass, dtime, diter = grids
+
+    for name, solve in solvers:
+        n = columns.index(name)
+        start = time.time()
+        Q, error, iterations = solve()
+        wallclock = time.time() - start
+        dpass[...,n] = (error == SUCCESS).mean(axis=-1)
+        diter[...,n] = iterations.mean(axis=-1)
+        dtime[...,n] = wallclock * diter[...,n] / max(iterations.sum(), 1)
+
+    return dpass, dtime, diter, list(columns)
+
+
+if __name__ == "__main__":
+    from optparse import OptionParser
+    from c2p_test import write_grid
+
+    parser = OptionParser()
+    parser.add_option("-G", "--samples-gamma", type="int", default=100,
+                      help="number of Lorentz factor samples [%default]")
+    parser.add_option("-B", "--samples-B", type="int", default=100,
+                      help="number of magnetic field samples [%default]")
+    parser.add_option("-n", "--trials", type="int", default=100,
+                      help="random states per grid point [%default]")
+    parser.add_option("--tolerance", type="float", default=Tolerance,
+                      help="Newton iteration tolerance [%default]")
+    parser.add_option("--max-iteration", type="int", default=MaxIteration,
+                      help="Newton iteration limit [%default]")
+    parser.add_option("--precision", default="float64",
+                      help="float32 or float64 [%default]")
+    opts, args = parser.parse_args()
+
+    Tolerance = opts.tolerance
+    MaxIteration = opts.max_iteration
+
+    dpass, dtime, diter, columns = run_grid(opts.samples_gamma, opts.samples_B,
+                                            opts.trials,
+                                            dtype=np.dtype(opts.precision))
+    write_grid("c2p_pass.c2p", dpass, columns)
+    write_grid("c2p_time.c2p", dtime, columns)
+    write_grid("c2p_iter.c2p", diter, columns)
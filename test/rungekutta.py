@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+
+# ------------------------------------------------------------------------------
+#
+# Runge-Kutta integrators for the Python reference solvers, mirroring those in
+# src/runge-kutta.hpp. Each integrator owns all of the stage buffers it needs,
+# allocated once for a given state shape, and advances the state in place.
+#
+# The right hand side is a function rhs(U, L) which writes dU/dt into L and
+# returns the maximum signal speed for the state U. The time step is computed
+# from the signal speed of the first stage, which is evaluated at the start of
+# the step anyway, so the CFL condition costs no additional pass over the data.
+#
+# ------------------------------------------------------------------------------
+
+import numpy as np
+
+
+class RungeKuttaIntegration(object):
+
+    def __init__(self, rhs, shape, dtype=float):
+        self.rhs = rhs
+        self.U0 = np.empty(shape, dtype=dtype) # state at the start of the step
+        self.L = np.empty(shape, dtype=dtype)  # time derivative of each stage
+        self.S = np.empty(shape, dtype=dtype)  # scratch space
+
+    def advance(self, U, CFL, dx, dtmax=None):
+        """
+        Advance U in place by one time step dt = CFL * dx / amax, where amax is
+        the maximum signal speed of U, limited to dtmax if given. Returns dt.
+        If rhs returns an array of signal speeds (one per member of an
+        ensemble, shaped to broadcast against U), dt is an array of the same
+        shape, and so is dtmax if given.
+        """
+        amax = self.rhs(U, self.L)
+        self.U0[...] = U
+        if np.ndim(amax) == 0:
+            dt = CFL * dx / float(amax)
+            if dtmax is not None:
+                dt = min(dt, dtmax)
+        else:
+            dt = CFL * dx / np.asarray(amax, dtype=float)
+            if dtmax is not None:
+                dt = np.minimum(dt, dtmax)
+        self.advance_stages(U, dt)
+        return dt
+
+    def axpy(self, a, x, y):
+        """ y += a*x, without allocating a temporary """
+        np.multiply(x, a, out=self.S)
+        y += self.S
+
+    def advance_stages(self, U, dt):
+        """
+        Complete the step from U0 to U, given that self.L already holds the time
+        derivative of the first stage.
+        """
+        raise NotImplementedError
+
+
+class RungeKuttaSingleStep(RungeKuttaIntegration):
+
+    def advance_stages(self, U, dt):
+        self.axpy(dt, self.L, U)
+
+
+class ShuOsherRk3(RungeKuttaIntegration):
+
+    def advance_stages(self, U, dt):
+        U0, L = self.U0, self.L
+
+        self.axpy(dt, L, U)                       # U1 = U0 + dt L(U0)
+
+        self.rhs(U, L)                            # U2 = 3/4 U0 + 1/4 U1
+        U *= 1./4                                 #    + 1/4 dt L(U1)
+        self.axpy(1./4 * dt, L, U)
+        self.axpy(3./4, U0, U)
+
+        self.rhs(U, L)                            # U  = 1/3 U0 + 2/3 U2
+        U *= 2./3                                 #    + 2/3 dt L(U2)
+        self.axpy(2./3 * dt, L, U)
+        self.axpy(1./3, U0, U)
+
+
+class ClassicRk4(RungeKuttaIntegration):
+
+    def __init__(self, rhs, shape, dtype=float):
+        RungeKuttaIntegration.__init__(self, rhs, shape, dtype)
+        self.A = np.empty(shape, dtype=dtype) # accumulated increment
+
+    def advance_stages(self, U, dt):
+        U0, L, A = self.U0, self.L, self.A
+
+        np.multiply(L, dt/6.0, out=A)             # L1
+        U[...] = U0
+        self.axpy(0.5*dt, L, U)
+
+        self.rhs(U, L)                            # L2
+        self.axpy(dt/3.0, L, A)
+        U[...] = U0
+        self.axpy(0.5*dt, L, U)
+
+        self.rhs(U, L)                            # L3
+        self.axpy(dt/3.0, L, A)
+        U[...] = U0
+        self.axpy(1.0*dt, L, U)
+
+        self.rhs(U, L)                            # L4
+        self.axpy(dt/6.0, L, A)
+        U[...] = U0
+        U += A
@@ -0,0 +1,229 @@
+#!/usr/bin/env python
+
+# ------------------------------------------------------------------------------
+#
+# Streaming of snapshots from the reference solvers to a single growing file,
+# at a cadence of every n steps or every dt_out in time (like the checkpoints
+# written through Mara_io_write_prim), e.g.
+#
+#   writer = SnapshotWriter("run.snp", (Nx, 5), dt_out=0.01)
+#   weno.run_1d_problem(Nx, snapshots=writer)
+#
+# and, from another process while the run is going,
+#
+#   snaps = Snapshots("run.snp")
+#   snaps.times, snaps[-1]
+#
+# The file is laid out like the c2p grid containers (see c2p_test.py):
+#
+#   8 bytes   magic string "MARASNP\n"
+#   8 bytes   little-endian uint64 header length n
+#   n bytes   JSON header: {"shape": [...], "dtype": "<f8", "attrs": {...}}
+#   ...       records, starting at a 64 byte aligned offset
+#
+# where each record is the time (float64), the step number (int64), and one
+# state of the given shape and dtype. Records are only ever appended, and the
+# reader maps the complete records present when it is opened or refreshed, so
+# that nothing but the requested snapshots is read. Writes are done by a
+# background thread, which holds at most a few pending snapshots in memory.
+#
+# ------------------------------------------------------------------------------
+
+import json
+import struct
+import threading
+import numpy as np
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+
+magic = b"MARASNP\n"
+alignment = 64
+
+
+def record_dtype(shape, dtype):
+    return np.dtype([('t', '<f8'), ('step', '<i8'),
+                     ('state', np.dtype(dtype).newbyteorder('<'),
+                      tuple(shape))])
+
+
+class SnapshotWriter(object):
+    """
+    Append snapshots of arrays with the given shape and dtype to fname. A
+    snapshot is due at step 0, then every `every` steps if given, whenever the
+    time crosses a multiple of dt_out if given, and at the final step of a run
+    if it was not already written. attrs is a JSON-friendly dict stored in the
+    header. At most max_pending snapshots wait to be
+    written; beyond that, write blocks until the thread catches up.
+    """
+
+    def __init__(self, fname, shape, dtype=float, every=None, dt_out=None,
+                 attrs=None, max_pending=4):
+        self.fname = fname
+        self.shape = tuple(shape)
+        self.dtype = record_dtype(shape, dtype)
+        self.every = every
+        self.dt_out = dt_out
+        self.next_output = 0.0
+        self.count = 0
+        self.last_step = None
+        self.error = None
+
+        header = json.dumps({ 'shape': list(self.shape),
+                              'dtype': np.dtype(dtype).newbyteorder('<').str,
+                              'attrs': attrs or { } }).encode('ascii')
+        offset = len(magic) + 8 + len(header)
+        header += b" " * (-offset % alignment)
+
+        self.file = open(fname, "wb")
+        self.file.write(magic)
+        self.file.write(struct.pack("<Q", len(header)))
+        self.file.write(header)
+        self.file.flush()
+
+        self.queue = queue.Queue(max_pending)
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            record = self.queue.get()
+            if record is None:
+                break
+            try:
+                self.file.write(record.tobytes())
+                self.file.flush()
+            except Exception as e:
+                self.error = e
+
+    def due(self, t, step, final=False):
+        """
+        Whether a snapshot is due at time t and the given step, which is the
+        last one of the run if final is true.
+        """
+        if final:
+            return step != self.last_step
+        if step == 0:
+            return True
+        if self.every and step % self.every == 0:
+            return True
+        return bool(self.dt_out) and t >= self.next_output
+
+    def write(self, t, step, state):
+        """
+        Queue the snapshot state (which is copied) at time t and step.
+        """
+        if self.error is not None:
+            raise IOError("snapshot writer failed: %s" % self.error)
+        record = np.zeros(1, dtype=self.dtype)
+        record['t'] = t
+        record['step'] = step
+        record['state'] = state
+        self.queue.put(record)
+        self.count += 1
+        self.last_step = step
+        if self.dt_out:
+            while self.next_output <= t:
+                self.next_output += self.dt_out
+
+    def close(self):
+        """
+        Write any pending snapshots and close the file.
+        """
+        if self.file.closed:
+            return
+        self.queue.put(None)
+        self.thread.join()
+        self.file.close()
+        if self.error is not None:
+            raise IOError("snapshot writer failed: %s" % self.error)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class Snapshots(object):
+    """
+    Lazy reader of a snapshot file, which may still be growing. The records
+    complete at the time of opening, or of the last call to refresh, are
+    memory-mapped: times and steps are arrays over them, and indexing returns
+    the state of one snapshot (or a slice of them).
+    """
+
+    def __init__(self, fname):
+        self.fname = fname
+        with open(fname, "rb") as f:
+            if f.read(len(magic)) != magic:
+                raise IOError("%s is not a snapshot file" % fname)
+            n, = struct.unpack("<Q", f.read(8))
+            self.header = json.loads(f.read(n).decode('ascii'))
+        self.offset = len(magic) + 8 + n
+        self.shape = tuple(self.header['shape'])
+        self.attrs = self.header['attrs']
+        self.dtype = record_dtype(self.shape, self.header['dtype'])
+        self.refresh()
+
+    def refresh(self):
+        """
+        Map the records which have been completely written so far, and return
+        their number.
+        """
+        with open(self.fname, "rb") as f:
+            f.seek(0, 2)
+            size = f.tell()
+        n = max(0, (size - self.offset) // self.dtype.itemsize)
+        if n == 0:
+            self.records = np.zeros(0, dtype=self.dtype)
+        else:
+            self.records = np.memmap(self.fname, dtype=self.dtype, mode='r',
+                                     offset=self.offset, shape=(n,))
+        return n
+
+    def __len__(self):
+        return len(self.records)
+
+    def __getitem__(self, i):
+        return self.records['state'][i]
+
+    @property
+    def times(self):
+        return np.asarray(self.records['t'])
+
+    @property
+    def steps(self):
+        return np.asarray(self.records['step'])
+
+    def at(self, t):
+        """
+        Return the snapshot nearest to time t.
+        """
+        return self[int(np.argmin(abs(self.times - t)))]
+
+
+if __name__ == "__main__":
+    from optparse import OptionParser
+
+    parser = OptionParser(usage="%prog [options] run.snp")
+    parser.add_option("--plot", default=None,
+                      help="plot this component index of every snapshot")
+    opts, args = parser.parse_args()
+
+    for fname in args:
+        snaps = Snapshots(fname)
+        print("%s: %d snapshots of shape %s, t = %s ... %s" % (
+            fname, len(snaps), snaps.shape,
+            snaps.times[0] if len(snaps) else None,
+            snaps.times[-1] if len(snaps) else None))
+        if opts.plot is not None:
+            from matplotlib import pyplot as plt
+            for t, s in zip(snaps.times, snaps):
+                plt.plot(s[...,int(opts.plot)], label="t=%3.2f" % t)
+            plt.legend()
+            plt.show()
@@ -21,53 +21,81 @@
 #
 # ------------------------------------------------------------------------------
 
-from math import sqrt
 import numpy as np
+from weno import stack_matrix, as_real
 
 Gamma = 1.4 # adiabatic index
 
-def run_evec():
-
-    D = 1.0 # rest mass density
-    p = 1.0 # pressure
-    u = 0.2 # vx (three velocity)
-    v = 0.3 # vy
-    w = 0.4 # vz
-
-    sie = (p/D) / (Gamma - 1) # specific internal energy
+# Mara's ordering of the primitive and conserved variables, see src/srhd.hpp
+rho, pre, vx, vy, vz = range(5)
+ddd, tau, Sx, Sy, Sz = range(5)
+
+# The eigenvectors along y and z are those along x, evaluated for a state with
+# its velocity components cyclically permuted, and with the momentum components
+# of the result put back in order. Entry dim-1 lists the velocity components
+# in the order (normal, transverse 1, transverse 2), and the order of the
+# (normal, transverse 1, transverse 2) components which yields (Sx, Sy, Sz).
+normal_order = [[vx, vy, vz], [vy, vz, vx], [vz, vx, vy]]
+restore_order = [[0, 1, 2], [2, 0, 1], [1, 2, 0]]
+
+
+def eigensystem(P, dim=1, gamma=None):
+    """
+    Return the left and right eigenvectors L and R, and the eigenvalues lam, of
+    the SRHD equations along the axis dim (1, 2 or 3), for the primitive state
+    P, which may be an array of shape (..., 5). L and R have shape (..., 5, 5),
+    with the conserved quantities ordered as in src/srhd.cpp (ddd, tau, Sx, Sy,
+    Sz), and the eigenvalues ordered (lm, lp, u, u, u), where u is the normal
+    velocity. The adiabatic index is gamma, or the module's Gamma if None.
+    """
+    P = as_real(P)
+    gamma = Gamma if gamma is None else gamma
+    n0, n1, n2 = normal_order[dim-1]
+
+    D = P[...,rho] # rest mass density
+    p = P[...,pre] # pressure
+    u = P[...,n0]  # normal velocity
+    v = P[...,n1]  # first transverse velocity
+    w = P[...,n2]  # second transverse velocity
+
+    sie = (p/D) / (gamma - 1) # specific internal energy
     h = 1 + sie + p/D         # specific enthalpy
-    cs2 = Gamma * p / (D*h)   # sound speed squared
+    cs2 = gamma * p / (D*h)   # sound speed squared
     V2 = u*u + v*v + w*w
-    W = 1.0 / sqrt(1 - V2)    # Lorentz factor
+    W = 1.0 / np.sqrt(1 - V2) # Lorentz factor
     W2 = W*W
     K = h                     # for gamma-law only, K = h
     hW = h*W
 
     # equations (14) and (15)
-    lp = (u*(1-cs2) + sqrt(cs2*(1-V2)*(1-V2*cs2-u*u*(1-cs2))))/(1-V2*cs2)
-    lm = (u*(1-cs2) - sqrt(cs2*(1-V2)*(1-V2*cs2-u*u*(1-cs2))))/(1-V2*cs2)
+    lp = (u*(1-cs2) + np.sqrt(cs2*(1-V2)*(1-V2*cs2-u*u*(1-cs2))))/(1-V2*cs2)
+    lm = (u*(1-cs2) - np.sqrt(cs2*(1-V2)*(1-V2*cs2-u*u*(1-cs2))))/(1-V2*cs2)
 
     Ap = (1 - u*u) / (1 - u*lp)
     Am = (1 - u*u) / (1 - u*lm)
 
-    # Equations (17) through (20)
-    # --------------------------------------------------------------------------
-    RR = [[K/hW, u, v, w, 1-K/hW],
-          [W*v, 2*h*W2*u*v, h*(1+2*W2*v*v), 2*h*W2*v*w, 2*h*W2*v - W*v],
-          [W*w, 2*h*W2*u*w, 2*h*W2*v*w, h*(1+2*W2*w*w), 2*h*W2*w - W*w],
-          [1, hW*Ap*lp, hW*v, hW*w, hW*Ap - 1],
-          [1, hW*Am*lm, hW*v, hW*w, hW*Am - 1]]
-
     # NOTES
     # --------------------------------------------------------------------------
-    # (1) Font writes the columns of the left eigenvector matrix
+    # (1) Donat describes the columns of the right eigenvector matrix
     # horizontally, which is how they are written below. So we take the
     # transpose at the end of the day.
     #
-    # (2) Font's notation uses L_{-/+} for the last left eigenvectors, but that
-    # naming is weird, since L_{+} contains lm and Am and vice-versa.
+    # (2) The momentum components are written (normal, transverse 1,
+    # transverse 2), and put back into (Sx, Sy, Sz) order by restore_order.
     # --------------------------------------------------------------------------
 
+    # Right eigenvectors (transpose of), equations (17) through (20)
+    # --------------------------------------------------------------------------
+    RT = [[1, hW*Am - 1, [hW*Am*lm, hW*v, hW*w]],                         # R_{-}
+          [1, hW*Ap - 1, [hW*Ap*lp, hW*v, hW*w]],                         # R_{+}
+          [K/hW, 1-K/hW, [u, v, w]],                                      # R_{1}
+          [W*v, 2*h*W2*v - W*v,
+           [2*h*W2*u*v, h*(1+2*W2*v*v), 2*h*W2*v*w]],                     # R_{2}
+          [W*w, 2*h*W2*w - W*w,
+           [2*h*W2*u*w, 2*h*W2*v*w, h*(1+2*W2*w*w)]]]                     # R_{3}
+
+    # Left eigenvectors
+    # --------------------------------------------------------------------------
     Delta = h*h*h*W*(K-1)*(1-u*u)*(Ap*lp - Am*lm) # equation (21)
     a = W / (K-1)
     b = 1 / (h*(1 - u*u))
@@ -75,44 +103,47 @@ def run_evec():
     d = -h*h / Delta
     e = +h*h / Delta
 
-    LL = [[a*(h-W), a*W*u, a*W*v, a*W*w, -a*W],
-          [-b*v, b*u*v, b*(1-u*u), 0, -b*v],
-          [-c*w, c*u*w, 0, c*(1-u*u), -c*w],
+    LL = [[e*(hW*Ap*(u-lp) - u - W2*(V2 - u*u)*(2*K - 1)*(u - Ap*lp) + K*Ap*lp),
+           e*(-u - W2*(V2 - u*u)*(2*K - 1)*(u - Ap*lp) + K*Ap*lp),
+           [e*(1 + W2*(V2 - u*u)*(2*K - 1)*(1 - Ap) - K*Ap),
+            e*(W2*v*(2*K - 1)*Ap*(u - lp)),
+            e*(W2*w*(2*K - 1)*Ap*(u - lp))]],      # L_{-} (negative eigenvalue)
           [d*(hW*Am*(u-lm) - u - W2*(V2 - u*u)*(2*K - 1)*(u - Am*lm) + K*Am*lm),
-           d*(1 + W2*(V2 - u*u)*(2*K - 1)*(1 - Am) - K*Am),
-           d*(W2*v*(2*K - 1)*Am*(u - lm)),
-           d*(W2*w*(2*K - 1)*Am*(u - lm)),
-           d*(-u - W2*(V2 - u*u)*(2*K - 1)*(u - Am*lm) + K*Am*lm)],
-          [e*(hW*Ap*(u-lp) - u - W2*(V2 - u*u)*(2*K - 1)*(u - Ap*lp) + K*Ap*lp),
-           e*(1 + W2*(V2 - u*u)*(2*K - 1)*(1 - Ap) - K*Ap),
-           e*(W2*v*(2*K - 1)*Ap*(u - lp)),
-           e*(W2*w*(2*K - 1)*Ap*(u - lp)),
-           e*(-u - W2*(V2 - u*u)*(2*K - 1)*(u - Ap*lp) + K*Ap*lp)]]
-
-    R = np.matrix(RR).T
-    L = np.matrix(LL)
-
-    Ry = np.matrix(np.zeros((5,5)))
-    Ly = np.matrix(np.zeros((5,5)))
-
-    Rz = np.matrix(np.zeros((5,5)))
-    Lz = np.matrix(np.zeros((5,5)))
-
-    Ry[:,0] = R[:,1]
-    Ry[:,1] = R[:,2]
-    Ry[:,2] = R[:,0]
-    Ry[:,3] = R[:,3]
-    Ry[:,4] = R[:,4]
-
-    Ly[0,:] = L[1,:]
-    Ly[1,:] = L[2,:]
-    Ly[2,:] = L[0,:]
-    Ly[3,:] = L[3,:]
-    Ly[4,:] = L[4,:]
-
-    print np.around(Ry*Ly, 14)
-
-    print np.around(R*L, 14) # ignore values near machine precision
+           d*(-u - W2*(V2 - u*u)*(2*K - 1)*(u - Am*lm) + K*Am*lm),
+           [d*(1 + W2*(V2 - u*u)*(2*K - 1)*(1 - Am) - K*Am),
+            d*(W2*v*(2*K - 1)*Am*(u - lm)),
+            d*(W2*w*(2*K - 1)*Am*(u - lm))]],      # L_{+} (positive eigenvalue)
+          [a*(h-W), -a*W, [a*W*u, a*W*v, a*W*w]],  # L_{1}
+          [-b*v, -b*v, [b*u*v, b*(1-u*u), 0]],     # L_{2}
+          [-c*w, -c*w, [c*u*w, 0, c*(1-u*u)]]]     # L_{3}
+
+    order = restore_order[dim-1]
+    RT = [[r[0], r[1]] + [r[2][i] for i in order] for r in RT]
+    LL = [[l[0], l[1]] + [l[2][i] for i in order] for l in LL]
+
+    R = np.swapaxes(stack_matrix(RT), -1, -2)
+    L = stack_matrix(LL)
+    lam = np.stack(np.broadcast_arrays(lm, lp, u, u, u), axis=-1)
+    return L, R, lam
+
+
+def orthonormality_error(L, R):
+    """
+    Return max |L.R - I| for each matrix pair in the stacks L and R.
+    """
+    return abs(np.matmul(L, R) - np.eye(L.shape[-1])).max(axis=(-2, -1))
+
+
+def run_evec(N=1000):
+    """
+    Check L.R = I for N random states along each of the three axes.
+    """
+    P = np.random.rand(N, 5)
+    P[:,vx:] *= 0.5 / np.sqrt(3.0) # keep |v| < 1
+
+    for dim in [1, 2, 3]:
+        L, R, lam = eigensystem(P, dim)
+        print("dim=%d: max |L.R - I| = %e" % (dim, orthonormality_error(L, R).max()))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,334 @@
+#!/usr/bin/env python
+
+# ------------------------------------------------------------------------------
+#
+# Vectorized 1d reference solver for the special relativistic hydrodynamics in
+# src/srhd.cpp, e.g.
+#
+#   python srhd.py -p srhd_case1 -N 4000 -o case1.txt
+#
+# The scheme is that of weno.py: the Lax-Friedrichs split fluxes are projected
+# onto the characteristic fields of the Donat et al. eigenvectors in
+# sreigen.py, reconstructed with WENO5, and projected back. The conserved to
+# primitive inversion is done by the solvers in rmhd_c2p.py with the magnetic
+# field set to zero, in the same order as Srhd::ConsToPrim. Every stage acts
+# on the whole domain at once.
+#
+# ------------------------------------------------------------------------------
+
+import numpy as np
+import weno
+import sreigen
+import rmhd_c2p
+from weno import characteristic_flux
+from reconstruct import windows
+from rungekutta import ShuOsherRk3, ClassicRk4
+
+
+rho, pre, vx, vy, vz = range(5) # Primitive
+ddd, tau, Sx, Sy, Sz = range(5) # Conserved
+Gamma = 5./3
+
+
+class ConsToPrimFailure(RuntimeError):
+    pass
+
+
+def prim_to_cons(P, out=None, gamma=None):
+    P = weno.as_real(P)
+    gamma = Gamma if gamma is None else gamma
+    U = np.empty_like(P) if out is None else out
+    V2 = P[...,vx]**2 + P[...,vy]**2 + P[...,vz]**2
+    W2 = 1.0 / (1.0 - V2)
+    e = P[...,pre] / (P[...,rho] * (gamma - 1.0))
+    h = 1.0 + e + P[...,pre] / P[...,rho]
+    U[...,ddd] = P[...,rho] * np.sqrt(W2)
+    U[...,tau] = P[...,rho] * h * W2 - P[...,pre] - U[...,ddd]
+    U[...,Sx:Sz+1] = (P[...,rho] * h * W2)[...,None] * P[...,vx:vz+1]
+    return U
+
+
+def cons_to_prim(U, P, gamma=None):
+    """
+    Recover the primitive states P (updated in place, and also used as the
+    starting guess) from U, by padding both to the 8 components of rmhd_c2p
+    with a zero magnetic field. Returns the error codes. Here and below, gamma
+    is the adiabatic index, the module's Gamma if None.
+    """
+    U8 = np.zeros(U.shape[:-1] + (8,), dtype=U.dtype)
+    P8 = np.zeros(P.shape[:-1] + (8,), dtype=P.dtype)
+    U8[...,:5] = U
+    P8[...,:5] = P
+    error = rmhd_c2p.cons_to_prim(U8, P8, Gamma if gamma is None else gamma)
+    P[...] = P8[...,:5]
+    return error
+
+
+def flux(P, U, out=None):
+    F = np.empty_like(U) if out is None else out
+    F[...,ddd] = U[...,ddd] * P[...,vx]
+    F[...,tau] = U[...,tau] * P[...,vx] + P[...,pre] * P[...,vx]
+    F[...,Sx]  = U[...,Sx]  * P[...,vx] + P[...,pre]
+    F[...,Sy]  = U[...,Sy]  * P[...,vx]
+    F[...,Sz]  = U[...,Sz]  * P[...,vx]
+    return F
+
+
+def wavespeeds(P, gamma=None):
+    """
+    Return the fastest right and left going wavespeeds ap and am along x, set
+    to +1 and -1 wherever either exceeds the speed of light, as in
+    Srhd::FluxAndEigenvalues.
+    """
+    gamma = Gamma if gamma is None else gamma
+    e = P[...,pre] / (P[...,rho] * (gamma - 1.0))
+    cs2 = gamma * P[...,pre] / (P[...,pre] + P[...,rho] + P[...,rho] * e)
+    vx2 = P[...,vx]**2
+    v2 = vx2 + P[...,vy]**2 + P[...,vz]**2
+    root = np.sqrt(cs2 * (1 - v2) * (1 - v2*cs2 - vx2*(1 - cs2)))
+    ap = (P[...,vx] * (1 - cs2) + root) / (1 - v2*cs2)
+    am = (P[...,vx] * (1 - cs2) - root) / (1 - v2*cs2)
+    causal = (abs(ap) <= 1.0) & (abs(am) <= 1.0)
+    return np.where(causal, ap, 1.0), np.where(causal, am, -1.0)
+
+
+def max_wavespeed(P, gamma=None):
+    ap, am = wavespeeds(P, gamma)
+    return np.maximum(abs(ap), abs(am))
+
+
+def left_right_eigenvectors(P, gamma=None):
+    L, R, lam = sreigen.eigensystem(P, dim=1,
+                                    gamma=Gamma if gamma is None else gamma)
+    return L, R
+
+
+def get_weno_flux(Cons, Prim, Flux, Mlam, gamma=None):
+    F_hat = np.zeros_like(Cons)
+    U = np.moveaxis(windows(Cons, 6), 0, 1)
+    F = np.moveaxis(windows(Flux, 6), 0, 1)
+    ml = windows(Mlam, 6).max(axis=0)[:,None,...,None]
+    F_hat[2:-3] = characteristic_flux(U, F, 0.5*(Prim[2:-3] + Prim[3:-2]), ml,
+                                      lambda P: left_right_eigenvectors(P,
+                                                                        gamma))
+    return F_hat
+
+
+def get_hll_flux(Cons, Prim, Flux, Mlam, gamma=None):
+    U, F = Cons, Flux
+    F_hat = np.zeros_like(Cons)
+    epl, eml = wavespeeds(Prim[2:-3], gamma)
+    epr, emr = wavespeeds(Prim[3:-2], gamma)
+    ap = np.maximum(np.maximum(epl, epr), 0.0)[...,None]
+    am = np.minimum(np.minimum(eml, emr), 0.0)[...,None]
+    F_hat[2:-3] = (ap*F[2:-3] - am*F[3:-2] +
+                   ap*am*(U[3:-2] - U[2:-3])) / (ap - am)
+    return F_hat
+
+
+fluxes = {
+    'weno': get_weno_flux,
+    'hll': get_hll_flux }
+
+get_flux = get_weno_flux
+
+
+def dUdt(Cons, Ng, dx, L=None, work=None, set_bc=None, gamma=None):
+    """
+    Return the time derivative of Cons, writing it into L if given. The work
+    dict holds the primitive states, which are the starting guess of the next
+    inversion, and on return also the zone wavespeeds Mlam. The guard zones are
+    filled by set_bc (weno.set_bc if None). Raises ConsToPrimFailure if the
+    inversion fails anywhere. The stages are timed by the profiler of weno.py,
+    if one is installed.
+    """
+    prof = weno.profiler
+    if prof: prof.enter('ApplyBoundaries')
+    (set_bc or weno.set_bc)(Cons, Ng)
+
+    if prof: prof.enter('ConsToPrim')
+    Prim = work['Prim']
+    error = cons_to_prim(Cons, Prim, gamma)
+    if (error != rmhd_c2p.SUCCESS).any():
+        bad = np.flatnonzero(error != rmhd_c2p.SUCCESS)
+        raise ConsToPrimFailure("cons_to_prim failed in %d zones, first at "
+                                "index %d" % (bad.size, bad[0]))
+
+    if prof: prof.enter('FluxAndEigenvalues')
+    Flux = flux(Prim, Cons, out=work.get('Flux'))
+    Mlam = max_wavespeed(Prim, gamma)
+    work['Flux'], work['Mlam'] = Flux, Mlam
+
+    if L is None:
+        L = np.empty_like(Cons)
+    if prof: prof.enter('intercell_flux_sweep')
+    F_hat = get_flux(Cons, Prim, Flux, Mlam, gamma)
+
+    if prof: prof.enter('drive_sweeps_1d')
+    L[0] = 0.0
+    np.subtract(F_hat[1:], F_hat[:-1], out=L[1:])
+    L[1:] *= -1.0 / dx
+
+    if prof: prof.exit()
+    return L
+
+
+# Initial conditions take either a scalar or an array of x, returning a state
+# of shape x.shape + (5,).
+
+def density_wave(x, t):
+    x = np.asarray(x, dtype=float)
+    P = np.zeros(x.shape + (5,))
+    v = 0.5
+    P[...,rho] = 1.0 + 0.5 * np.sin(2*np.pi*(x - v*t))
+    P[...,pre] = 1.0
+    P[...,vx] = v
+    return P
+
+
+def two_state(Pl, Pr):
+    def initial(x, t):
+        x = np.asarray(x, dtype=float)
+        return np.where((x < 0.5)[...,None], Pl, Pr)
+    return initial
+
+
+# Each problem is an initial condition, a boundary condition, and whether
+# initial(x, t) is the exact solution at time t (the shock tubes of
+# src/tests.lua are not, for lack of an exact SRHD Riemann solver here).
+problems = {
+    'density_wave': (density_wave, weno.set_periodic_bc, True),
+    'srhd_case1': (two_state([10.0, 13.30, 0.0, 0.0, 0.0],
+                             [ 1.0,  1e-6, 0.0, 0.0, 0.0]),
+                   weno.set_outflow_bc, False),
+    'srhd_case2': (two_state([1.0, 1e+3, 0.0, 0.0, 0.0],
+                             [1.0, 1e-2, 0.0, 0.0, 0.0]),
+                   weno.set_outflow_bc, False),
+    'srhd_hard_transverse': (two_state([1.0, 1e+3, 0.0, 0.9, 0.0],
+                                       [1.0, 1e-2, 0.0, 0.9, 0.0]),
+                             weno.set_outflow_bc, False) }
+
+
+def run_1d_problem(problem, Nx, tmax=0.4, CFL=0.5, quiet=True, info=None,
+                   integrator=ClassicRk4, profile=False, gamma=None):
+    """
+    Evolve the named problem on Nx zones until tmax with adiabatic index gamma
+    (the module's Gamma if None), and return the zone coordinates and the final
+    primitive states. If info is a dict, the number of time steps taken and the
+    final time are stored in it, along with the L1 error if the problem has an
+    exact solution. If profile is true, the time spent in each stage of dUdt is
+    reported as by weno.run_1d_problem.
+    """
+    initial, set_bc, exact = problems[problem]
+    gamma = Gamma if gamma is None else gamma
+    Ng = 3
+
+    Prim = np.zeros((Nx + 2*Ng, 5))
+    x, dx = np.linspace(0.0, 1.0, Nx, retstep=True)
+    dx = float(dx)
+
+    Prim[Ng:-Ng] = initial(x, 0.0)
+    set_bc(Prim, Ng)
+    Cons = prim_to_cons(Prim, gamma=gamma)
+
+    if profile:
+        from profiling import StageProfiler
+        prof = weno.profiler = StageProfiler()
+
+    work = { 'Prim': Prim }
+    def rhs(U, L):
+        dUdt(U, Ng, dx, L, work, set_bc, gamma)
+        if profile:
+            prof.substep += 1
+        return work['Mlam'].max()
+
+    rk = integrator(rhs, Cons.shape, Cons.dtype)
+    t = 0.0
+    steps = 0
+
+    try:
+        while t < tmax:
+            if profile:
+                prof.substep = 0
+            t += rk.advance(Cons, CFL, dx, tmax - t)
+            steps += 1
+
+            if not quiet:
+                print("t=%5.4f" % t)
+
+        set_bc(Cons, Ng)
+        cons_to_prim(Cons, Prim, gamma)
+    finally:
+        if profile:
+            weno.profiler = None
+
+    if profile:
+        if isinstance(profile, str):
+            prof.dump(profile)
+        else:
+            prof.print_report()
+        if info is not None:
+            info['profile'] = prof.report()
+
+    if info is not None:
+        info['steps'] = steps
+        info['t'] = t
+        if exact:
+            info['L1'] = abs(Prim[Ng:-Ng] - initial(x, t)).sum() * dx
+
+    return x, Prim[Ng:-Ng]
+
+
+if __name__ == "__main__":
+    import time
+    from optparse import OptionParser
+
+    parser = OptionParser()
+    parser.add_option("-p", "--problem", default="srhd_case1",
+                      help="one of %s [%%default]" % sorted(problems))
+    parser.add_option("-N", "--resolution", type="int", default=400,
+                      help="number of zones [%default]")
+    parser.add_option("-t", "--tmax", type="float", default=0.4,
+                      help="final time [%default]")
+    parser.add_option("--cfl", type="float", default=0.5,
+                      help="Courant number [%default]")
+    parser.add_option("-f", "--flux", default="weno",
+                      help="one of %s [%%default]" % sorted(fluxes))
+    parser.add_option("--gamma", type="float", default=Gamma,
+                      help="adiabatic index [%default]")
+    parser.add_option("--rk3", action="store_true", default=False,
+                      help="use Shu-Osher RK3 rather than RK4")
+    parser.add_option("--profile", default=None,
+                      help="report the time spent in each stage, to this JSON "
+                      "file if given a name, or to the terminal with '-'")
+    parser.add_option("--plot", action="store_true", default=False,
+                      help="plot the final state")
+    parser.add_option("-o", "--output", default=None,
+                      help="write x and the primitives as text to this file")
+    opts, args = parser.parse_args()
+
+    get_flux = fluxes[opts.flux]
+    info = { }
+    start = time.time()
+    x, P = run_1d_problem(opts.problem, opts.resolution, tmax=opts.tmax,
+                          CFL=opts.cfl, quiet=False, info=info,
+                          integrator=ShuOsherRk3 if opts.rk3 else ClassicRk4,
+                          gamma=opts.gamma,
+                          profile=(True if opts.profile == '-' else
+                                   opts.profile or False))
+    wallclock = time.time() - start
+    print("%d steps in %3.2f s (%e zone updates per second)" % (
+        info['steps'], wallclock, opts.resolution * info['steps'] / wallclock))
+    if 'L1' in info:
+        print("L1 = %s" % info['L1'])
+
+    if opts.output:
+        np.savetxt(opts.output, np.column_stack([x, P]),
+                   header="x rho pre vx vy vz")
+
+    if opts.plot:
+        from matplotlib import pyplot as plt
+        for q, name in [(rho, r"$\rho$"), (pre, r"$p$"), (vx, r"$v_x$")]:
+            plt.plot(x, P[:,q], "-", label=name)
+        plt.legend()
+        plt.show()
@@ -0,0 +1,30 @@
+import rmhd_c2p
+import c2p_test
+
+
+def test_run_grid_summary(tmp_path, capsys):
+    dpass, dtime, diter, cols = rmhd_c2p.run_grid(4, 3, 5)
+    assert cols == c2p_test.columns
+    assert dpass.shape == (4, 3, len(cols))
+
+    pass_file = str(tmp_path / "c2p_pass.c2p")
+    time_file = str(tmp_path / "c2p_time.c2p")
+    c2p_test.write_grid(pass_file, dpass, cols)
+    c2p_test.write_grid(time_file, dtime, cols)
+
+    dpass, cols = c2p_test.load_grid(pass_file)
+    dtime, cols = c2p_test.load_grid(time_file)
+    summary = c2p_test.summarize(dpass, dtime, cols)
+    assert sorted(summary) == ['anton2dzw', 'noble1dw']
+    for s in summary.values():
+        assert 0.0 <= s['failure_rate'] <= 1.0
+
+    c2p_test.print_summary(summary)
+    out = capsys.readouterr().out
+    assert 'anton2dzw' in out and 'noble1dw' in out
+    assert 'noble2dzt' not in out
+
+
+def test_print_summary_missing_first_solver(capsys):
+    c2p_test.print_summary({ 'anton2dzw': { 'failure_rate': 0.0 } })
+    assert 'anton2dzw' in capsys.readouterr().out
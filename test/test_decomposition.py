@@ -0,0 +1,29 @@
+import numpy as np
+import pytest
+import weno
+import decomposition
+
+
+@pytest.mark.parametrize("problem", ['density_wave', 'shocktube1'])
+@pytest.mark.parametrize("procs", [1, 2, 3, 7])
+def test_decomposed_matches_serial(problem, procs):
+    weno.use_problem(problem)
+    info, serial = { }, { }
+    decomposition.run_decomposed(40, procs, tmax=0.02, info=info)
+    weno.run_1d_problem(40, tmax=0.02, plot=False, quiet=True, info=serial)
+    assert info['steps'] == serial['steps']
+    assert np.array_equal(info['prim'], serial['prim'])
+
+
+def test_published_zones_periodic():
+    weno.use_problem('density_wave')
+    sources = decomposition.guard_sources(20, weno.set_bc)
+    published = decomposition.published_zones(20, 4, sources)
+    guards = np.r_[:3, 23:26]
+    assert published[sources[guards]].all()
+
+
+def test_too_many_workers():
+    weno.use_problem('shocktube1')
+    with pytest.raises(ValueError):
+        decomposition.run_decomposed(3, 4)
@@ -0,0 +1,84 @@
+import json
+from fractions import Fraction
+import numpy as np
+import pytest
+import weno_coefficients as wc
+
+
+pairs = [(order, op) for order in (3, 5, 7, 9) for op in sorted(wc.operators)]
+
+
+@pytest.fixture(autouse=True)
+def private_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(wc, 'cache_file', str(tmp_path / "weno.json"))
+    monkeypatch.setattr(wc, '_cache', { })
+
+
+def expected_order(order, op):
+    r = (order + 1) // 2
+    return order - 1 if op in ('C2A', 'A2C') and r % 2 == 0 else order
+
+
+@pytest.mark.parametrize("order,op", pairs)
+def test_linear_weights_are_exact(order, op):
+    c, d, Q = wc.coefficients(order, op)
+    data, functional, x = wc.operators[op]
+    r = (order + 1) // 2
+    p = wc.linear_order(order, op)
+    assert p == expected_order(order, op)
+    assert sum(d) == 1
+
+    # The combined stencil reproduces the operator on polynomials of degree
+    # below p
+    for j in range(p):
+        combined = sum(d[k] * c[k][s] * wc.moment(data, s - k, j)
+                       for k in range(r) for s in range(r))
+        assert combined == wc.target(functional, x, j)
+
+
+@pytest.mark.parametrize("order,op", pairs)
+def test_reconstruct_converges(order, op):
+    data, functional, x = wc.operators[op]
+    errors = [ ]
+    for N in (16, 32):
+        dx = 1.0 / N
+        xc = (np.arange(N) + 0.5) * dx
+        if data == 'point':
+            A = np.sin(2*np.pi*xc)
+        else:
+            A = (np.cos(2*np.pi*(xc - dx/2)) -
+                 np.cos(2*np.pi*(xc + dx/2))) / (2*np.pi*dx)
+        xt = xc + float(x) * dx
+        if functional == 'value':
+            exact = np.sin(2*np.pi*xt)
+        elif functional == 'average':
+            exact = (np.cos(2*np.pi*(xt - dx/2)) -
+                     np.cos(2*np.pi*(xt + dx/2))) / (2*np.pi*dx)
+        else:
+            exact = 2*np.pi*np.cos(2*np.pi*xt) * dx
+        r = (order + 1) // 2
+        res = wc.reconstruct(A, order, op)
+        errors.append(abs(res - exact[r-1:N-r+1]).max())
+    assert np.log2(errors[0] / errors[1]) > wc.linear_order(order, op) - 1.5
+
+
+def test_cache_roundtrip():
+    c, d, Q = wc.derive(7, 'C2A')
+    wc.coefficients(7, 'C2A')
+    wc._cache.clear()
+    assert wc.coefficients(7, 'C2A') == (c, d, Q)
+    assert all(isinstance(v, Fraction) for v in d)
+
+
+def test_cache_version_mismatch_is_ignored():
+    c, d, Q = wc.derive(5, 'C2R')
+    stale = [[["0"] * 3] * 3, ["0"] * 3, [[["0"] * 3] * 3] * 3]
+    for contents in [{ '5-C2R': stale },
+                     { 'version': wc.cache_version - 1,
+                       'coefficients': { '5-C2R': stale } }]:
+        with open(wc.cache_file, "w") as f:
+            json.dump(contents, f)
+        wc._cache.clear()
+        assert wc.coefficients(5, 'C2R') == (c, d, Q)
+    with open(wc.cache_file, "r") as f:
+        assert json.load(f)['version'] == wc.cache_version
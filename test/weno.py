@@ -1,64 +1,146 @@
 #!/usr/bin/env python
 
 import numpy as np
+from reconstruct import reconstruct, windows, WenoCoefficients, \
+    WENO5_FD_C2L, WENO5_FD_C2R, PLM_C2L, PLM_C2R, WENO5_FV_C2L, WENO5_FV_C2R
+from rungekutta import ShuOsherRk3, ClassicRk4
 
 
 rho, pre, vx, vy, vz = range(5)
 rho, nrg, px, py, pz = range(5)
 Gamma = 1.4
 
+# Working precision of the arrays allocated by the solver, see as_real
+precisions = {
+    'float32': np.float32,
+    'float64': np.float64 }
+precision = np.float64
 
-def sound_speed(P):
-    return (Gamma * P[pre]/P[rho])**0.5
+# Time integrators by name, see rungekutta.py
+integrators = {
+    'rk3': ShuOsherRk3,
+    'rk4': ClassicRk4 }
 
-def flux(P):
-    F = np.zeros(5)
-    U = prim_to_cons(P)
-    F[rho]  =  U[rho] * P[vx];
-    F[nrg]  = (U[nrg] + P[pre])*P[vx]
-    F[px]   =  U[px]  * P[vx] + P[pre]
-    F[py]   =  U[py]  * P[vx]
-    F[pz]   =  U[pz]  * P[vx]
+
+def as_real(A):
+    """
+    Return A as an array of floats, keeping its precision if it is already
+    float32 or float64, and otherwise converting it to the current precision.
+    """
+    A = np.asarray(A)
+    if A.dtype in (np.float32, np.float64):
+        return A
+    return A.astype(precision)
+
+
+def sound_speed(P):
+    return (Gamma * P[...,pre]/P[...,rho])**0.5
+
+# ------------------------------------------------------------------------------
+# The functions below operate on the last axis of their argument, so they accept
+# either a single 5-component state or a whole (Nx, 5) array of them. If out is
+# given, the result is written into it rather than a newly allocated array.
+# ------------------------------------------------------------------------------
+def flux(P, U=None, out=None):
+    P = as_real(P)
+    if U is None:
+        U = prim_to_cons(P)
+    F = np.empty_like(U) if out is None else out
+    F[...,rho]  =  U[...,rho] * P[...,vx]
+    F[...,nrg]  = (U[...,nrg] + P[...,pre])*P[...,vx]
+    F[...,px]   =  U[...,px]  * P[...,vx] + P[...,pre]
+    F[...,py]   =  U[...,py]  * P[...,vx]
+    F[...,pz]   =  U[...,pz]  * P[...,vx]
     return F
 
-def cons_to_prim(U):
-    P = np.zeros(5)
+def cons_to_prim(U, out=None):
+    U = as_real(U)
+    P = np.empty_like(U) if out is None else out
     gm1 = Gamma - 1.0
-    P[rho] = U[rho]
-    P[pre] =(U[nrg] - 0.5*(U[px]*U[px] + U[py]*U[py] + U[pz]*U[pz])/U[rho])*gm1
-    P[vx ] = U[px ] / U[rho]
-    P[vy ] = U[py ] / U[rho]
-    P[vz ] = U[pz ] / U[rho]
+    P[...,rho] = U[...,rho]
+    P[...,pre] =(U[...,nrg] - 0.5*(U[...,px]*U[...,px] +
+                                   U[...,py]*U[...,py] +
+                                   U[...,pz]*U[...,pz])/U[...,rho])*gm1
+    P[...,vx ] = U[...,px ] / U[...,rho]
+    P[...,vy ] = U[...,py ] / U[...,rho]
+    P[...,vz ] = U[...,pz ] / U[...,rho]
     return P
 
-def prim_to_cons(P):
-    U = np.zeros(5)
+def prim_to_cons(P, out=None):
+    P = as_real(P)
+    U = np.empty_like(P) if out is None else out
     gm1 = Gamma - 1.0
-    U[rho] = P[rho]
-    U[px]  = P[rho] * P[vx]
-    U[py]  = P[rho] * P[vy]
-    U[pz]  = P[rho] * P[vz]
-    U[nrg] = P[rho] * 0.5*(P[vx]*P[vx] + P[vy]*P[vy] + P[vz]*P[vz]) + P[pre]/gm1
+    U[...,rho] = P[...,rho]
+    U[...,px]  = P[...,rho] * P[...,vx]
+    U[...,py]  = P[...,rho] * P[...,vy]
+    U[...,pz]  = P[...,rho] * P[...,vz]
+    U[...,nrg] = P[...,rho] * 0.5*(P[...,vx]*P[...,vx] +
+                                   P[...,vy]*P[...,vy] +
+                                   P[...,vz]*P[...,vz]) + P[...,pre]/gm1
     return U
 
 def max_wavespeed(P, take_abs=True):
     cs = sound_speed(P)
-    ap, am = P[vx] + cs, P[vx] - cs
+    ap, am = P[...,vx] + cs, P[...,vx] - cs
     if take_abs:
-        return max(abs(ap), abs(am))
+        return np.maximum(abs(ap), abs(am))
     else:
         return ap, am
 
+def stack_matrix(M):
+    """
+    Build an array of shape S + (n, m) from an n x m nested list whose entries
+    are scalars or arrays broadcastable to the common shape S. Scalar entries do
+    not promote the precision of the array entries.
+    """
+    entries = [x for row in M for x in row]
+    t = np.result_type(*entries)
+    shape = np.broadcast(*entries).shape
+
+    # Filling contiguous planes and transposing once is several times faster
+    # than stacking along the trailing axes, and broadcasting the entries on
+    # assignment avoids most of the overhead on small stacks
+    A = np.empty((len(entries),) + shape, dtype=t)
+    for k, x in enumerate(entries):
+        A[k] = x
+    return np.moveaxis(A, 0, -1).reshape(shape + (len(M), len(M[0])))
+
+
+def project(M, v):
+    """
+    Matrix-vector product over the trailing axes of a stack: M has shape
+    (..., n, m) and v has shape (..., m), with the leading axes broadcast.
+    """
+    return np.matmul(M, v[...,None])[...,0]
+
+
+def project_stencils(M, v):
+    """
+    Equivalent to project(M[:,None], v) for stencils v of shape (n, k, ..., m)
+    and matrices M of shape (n, ..., n', m), but done as a single product of
+    the k row vectors of each stencil with the transpose of its matrix, which
+    is several times faster than k separate matrix-vector products.
+    """
+    vk = np.moveaxis(v, 1, -2)
+    return np.moveaxis(np.matmul(vk, np.swapaxes(M, -1, -2)), -2, 1)
+
+
 def left_right_eigenvectors(P):
+    """
+    Return the left and right eigenvector matrices LL and RR for the state P,
+    which may be a single state or an (..., 5) array of them. The results have
+    shape (..., 5, 5).
+    """
+    P = as_real(P)
     U = prim_to_cons(P)
     gm = Gamma
     gm1 = gm - 1.0
-    u = P[vx]
-    v = P[vy]
-    w = P[vz]
+    u = P[...,vx]
+    v = P[...,vy]
+    w = P[...,vz]
     V2 = u*u + v*v + w*w
-    a = (gm * P[pre] / P[rho])**0.5
-    H = (U[nrg] + P[pre]) / P[rho]
+    a = (gm * P[...,pre] / P[...,rho])**0.5
+    H = (U[...,nrg] + P[...,pre]) / P[...,rho]
 
     # --------------------------------------------------------------------------
     # Toro Equation 3.82 (rows are permuted to deal with Mara's convention on
@@ -82,81 +164,173 @@ def left_right_eigenvectors(P):
     # --------------------------------------------------------------------------
 
     norm = gm1 / (2*a*a)
-    return np.matrix(LL)*norm, np.matrix(RR)
-
-
-def weno5(v, c, d):
-    eps = 1e-16
-    B = [(13./12.)*(  v[2] - 2*v[3] +   v[4])**2 +
-         ( 1./ 4.)*(3*v[2] - 4*v[3] +   v[4])**2,
-
-         (13./12.)*(  v[1] - 2*v[2] +   v[3])**2 +
-         ( 1./ 4.)*(  v[1] - 0*v[2] -   v[3])**2,
-         
-         (13./12.)*(  v[0] - 2*v[1] +   v[2])**2 +
-         ( 1./ 4.)*(  v[0] - 4*v[1] + 3*v[2])**2]
-
-    vs = [c[0][0]*v[2] + c[0][1]*v[3] + c[0][2]*v[4],
-          c[1][0]*v[1] + c[1][1]*v[2] + c[1][2]*v[3],
-          c[2][0]*v[0] + c[2][1]*v[1] + c[2][2]*v[2]]
-
-    w = [d[0] / (eps + B[0])**2,
-         d[1] / (eps + B[1])**2,
-         d[2] / (eps + B[2])**2]
-    
-    wtot = w[0] + w[1] + w[2]
-    return (w[0]*vs[0] + w[1]*vs[1] + w[2]*vs[2])/wtot
-
-
-
-CeesC2L = [ [11./6., -7./6.,  1./3. ],
-            [ 1./3.,  5./6., -1./6. ],
-            [-1./6.,  5./6.,  1./3. ] ]
-CeesC2R = [ [ 1./3.,  5./6., -1./6. ],
-            [-1./6.,  5./6.,  1./3. ],
-            [ 1./3., -7./6., 11./6. ] ]
-DeesC2L = [ 0.1, 0.6, 0.3 ]
-DeesC2R = [ 0.3, 0.6, 0.1 ]
-
-
-
-# A 4-letter variable means a domain-global array. 1-letter variables are
-# 6-components lists of vectors. 2 letter variables, like LL and RR are
-# matrices. The indices 0 ... 5 inclusively label the 6 zones surrounding the
-# i+1/2 interface.
-
-def get_weno_flux(Cons, Prim, Flux, Mlam, i):
-    LL, RR = left_right_eigenvectors(0.5*(Prim[i] + Prim[i+1]))
-
-    P = [Prim[i-2+j] for j in range(6)]
-    U = [Cons[i-2+j] for j in range(6)]
-    F = [Flux[i-2+j] for j in range(6)]
-    A = [Mlam[i-2+j] for j in range(6)]
-
-    ml = max(A)
-
-    Fp = [np.matrix(0.5*(F[j] + ml*U[j])).T for j in range(6)]
-    Fm = [np.matrix(0.5*(F[j] - ml*U[j])).T for j in range(6)]
-
-    fp = [np.array(LL*Fp[j])[:,0] for j in range(6)]
-    fm = [np.array(LL*Fm[j])[:,0] for j in range(6)]
-
-    f = np.matrix(weno5(fp[0:5], CeesC2R, DeesC2R) +
-                  weno5(fm[1:6], CeesC2L, DeesC2L)).T
-
-    return np.array(RR*f)[:,0]
-
-
-
-def get_hll_flux(Cons, Prim, Flux, Mlam, i):
-    U, P, F = Cons, Prim, Flux
+    return stack_matrix(LL) * norm[...,None,None], stack_matrix(RR)
+
+
+# A 4-letter variable means a domain-global array. The flux functions below
+# return F_hat, whose entry i is the flux through the i+1/2 interface, filled
+# for 2 <= i < Nx_tot-3. Stencil arrays have shape (interface, zone, component)
+# where the zone indices 0 ... 5 inclusively label the 6 zones surrounding the
+# i+1/2 interface; they are zero-copy views made from reconstruct.windows, with
+# the zone axis moved second. LL and RR are stacks of matrices, one per
+# interface. Any axes between the first (zone) and last (component) axes index
+# independent pencils, which are all swept at once.
+
+def characteristic_flux(U, F, P, ml, eigenvectors=None):
+    """
+    Characteristic-wise WENO flux through the interfaces whose stencils of
+    conserved states and fluxes are U and F, and whose averaged primitive state
+    and maximum wavespeed over the stencil are P and ml. The left and right
+    eigenvectors are eigenvectors(P), by default left_right_eigenvectors.
+    """
+    prof = profiler
+    if prof: prof.enter('Eigensystem')
+    LL, RR = (eigenvectors or left_right_eigenvectors)(P)
+
+    if prof: prof.enter('intercell_flux_sweep')
+    fp = project_stencils(LL, 0.5*(F + ml*U))
+    fm = project_stencils(LL, 0.5*(F - ml*U))
+
+    if prof: prof.enter('reconstruct')
+    f = (reconstruct(fp[:,0:5], WENO5_FD_C2R, axis=1)[:,0] +
+         reconstruct(fm[:,1:6], WENO5_FD_C2L, axis=1)[:,0])
+
+    if prof: prof.enter('intercell_flux_sweep')
+    return project(RR, f)
+
+
+def get_weno_flux(Cons, Prim, Flux, Mlam):
+    F_hat = np.zeros_like(Cons)
+    U = np.moveaxis(windows(Cons, 6), 0, 1)
+    F = np.moveaxis(windows(Flux, 6), 0, 1)
+    ml = windows(Mlam, 6).max(axis=0)[:,None,...,None]
+    F_hat[2:-3] = characteristic_flux(U, F, 0.5*(Prim[2:-3] + Prim[3:-2]), ml)
+    return F_hat
+
+
+# ------------------------------------------------------------------------------
+# Hybrid scheme: away from shocks the Lax-Friedrichs split fluxes are
+# reconstructed with the linear (optimal) weights of WENO5, which needs neither
+# eigenvectors nor smoothness indicators, and the characteristic flux of
+# get_weno_flux is substituted on the interfaces flagged by a shock sensor. The
+# flagged interfaces are gathered into one compact batch. The sensor is
+# Jameson's normalized second difference of the pressure and density, and an
+# interface is flagged if it exceeds hybrid_threshold anywhere on its stencil.
+# ------------------------------------------------------------------------------
+
+hybrid_threshold = 1e-2
+
+
+def shock_sensor(Prim):
+    """
+    Return the largest of the normalized second differences of the pressure and
+    density in each zone (zero in the first and last zone).
+    """
+    S = np.zeros(Prim.shape[:-1])
+    for q in [pre, rho]:
+        a = Prim[...,q]
+        d2 = abs(a[2:] - 2*a[1:-1] + a[:-2])
+        S[1:-1] = np.maximum(S[1:-1], d2 / (abs(a[2:]) + 2*abs(a[1:-1]) +
+                                            abs(a[:-2])))
+    return S
+
+
+def linear_split_stencil():
+    """
+    Return the weights alpha and beta on the 6-zone stencil of an interface,
+    such that WENO5 with its linear weights, applied to the Lax-Friedrichs
+    split fluxes 0.5*(F +/- a*U), gives sum(alpha[k]*F[k] + a*beta[k]*U[k]).
+    """
+    wp, wm = np.zeros(6), np.zeros(6)
+    for w, op, offset in [(wp, WENO5_FD_C2R, 0), (wm, WENO5_FD_C2L, 1)]:
+        c, d = WenoCoefficients[op]
+        for k in range(3):
+            w[offset + 2 - k:offset + 5 - k] += d[k] * np.array(c[k])
+    return 0.5*(wp + wm), 0.5*(wp - wm)
+
+
+SmoothAlpha, SmoothBeta = linear_split_stencil()
+
+
+def get_hybrid_flux(Cons, Prim, Flux, Mlam):
+    prof = profiler
+    if prof: prof.enter('intercell_flux_sweep')
+    F_hat = np.zeros_like(Cons)
+    U = windows(Cons, 6)
+    F = windows(Flux, 6)
+    am = windows(Mlam, 6).max(axis=0)
+    flagged = windows(shock_sensor(Prim), 6).max(axis=0) > hybrid_threshold
+
+    # The linear flux is accumulated one shifted zone array at a time from the
+    # strided windows, so the smooth path works on contiguous arrays and never
+    # copies the 6-zone stencils
+    if prof: prof.enter('reconstruct')
+    Fs = SmoothAlpha[0]*F[0]
+    Us = SmoothBeta[0]*U[0]
+    for k in range(1, 6):
+        Fs += SmoothAlpha[k]*F[k]
+        Us += SmoothBeta[k]*U[k]
+    F_hat[2:-3] = Fs + am[...,None]*Us
+
+    if flagged.any():
+        if prof: prof.enter('intercell_flux_sweep')
+        i = np.nonzero(flagged)
+        Ub = np.moveaxis(U[(slice(None),) + i], 0, 1)
+        Fb = np.moveaxis(F[(slice(None),) + i], 0, 1)
+        Pb = 0.5*(Prim[(i[0] + 2,) + i[1:]] + Prim[(i[0] + 3,) + i[1:]])
+        F_hat[2:-3][i] = characteristic_flux(Ub, Fb, Pb, am[i][:,None,None])
+    return F_hat
+
+
+def get_hll_flux(Cons, Prim, Flux, Mlam):
+    if profiler: profiler.enter('intercell_flux_sweep')
+    U, F = Cons, Flux
+    F_hat = np.zeros_like(Cons)
 
-    epl, eml = max_wavespeed(Prim[i  ], take_abs=False)
-    epr, emr = max_wavespeed(Prim[i+1], take_abs=False)
+    epl, eml = max_wavespeed(Prim[2:-3], take_abs=False)
+    epr, emr = max_wavespeed(Prim[3:-2], take_abs=False)
+
+    ap = np.maximum(np.maximum(epl, epr), 0.0)[...,None]
+    am = np.minimum(np.minimum(eml, emr), 0.0)[...,None]
+    F_hat[2:-3] = (ap*F[2:-3] - am*F[3:-2] +
+                   ap*am*(U[3:-2] - U[2:-3])) / (ap - am)
+    return F_hat
+
+
+# Reconstruction of the primitive states on either side of each interface, as
+# GodunovOperator::reconstruct_method
+face_reconstruction = {
+    'pcm': None,
+    'plm': (PLM_C2R, PLM_C2L),
+    'weno5': (WENO5_FV_C2R, WENO5_FV_C2L) }
+
+
+def face_states(Prim, method='plm'):
+    """
+    Return the primitive states Pl and Pr on the left and right of the i+1/2
+    interfaces for i = 2 ... Nx-4, i.e. those filled by the flux functions.
+    """
+    ops = face_reconstruction[method]
+    if ops is None:
+        return Prim[2:-3], Prim[3:-2]
+    R, L = reconstruct(Prim, ops)
+    return R[:-1], L[1:]
+
+
+def get_riemann_flux(Cons, Prim, Flux, Mlam):
+    """
+    Godunov flux in the manner of MethodOfLinesSplit (src/plm-split.cpp): the
+    primitives are reconstructed to the interfaces with reconstruct_method, and
+    passed to riemann_solver (one of riemann.riemann_solvers).
+    """
+    prof = profiler
+    if prof: prof.enter('reconstruct')
+    F_hat = np.zeros_like(Cons)
+    Pl, Pr = face_states(Prim, reconstruct_method)
 
-    ap = max(epl, epr, 0.0)
-    am = min(eml, emr, 0.0)
-    return (ap*F[i] - am*F[i+1] + ap*am*(U[i+1] - U[i])) / (ap - am)
+    if prof: prof.enter('intercell_flux_sweep')
+    F_hat[2:-3] = riemann_solver(Pl, Pr)
+    return F_hat
 
 
 def set_periodic_bc(A, Ng):
@@ -171,49 +345,83 @@ def set_outflow_bc(A, Ng):
     A[-Ng:] = A[-(Ng+1)]
 
 
-def dUdt(Cons, Ng, dx):
+def dUdt(Cons, Ng, dx, L=None, work=None):
+    """
+    Return the time derivative of Cons, writing it into L if given. If work is
+    a dict, the Prim and Flux arrays it holds from a previous call are reused,
+    and on return it also holds the zone wavespeeds Mlam. The stages are timed
+    if a profiler has been installed (see profiling.py).
+    """
+    prof = profiler
+    if prof: prof.enter('ApplyBoundaries')
     set_bc(Cons, Ng)
 
-    Prim = np.array([cons_to_prim(U) for U in Cons])
-    Flux = np.array([flux(P) for P in Prim])
-    Mlam = np.array([max_wavespeed(P) for P in Prim])
+    if prof: prof.enter('ConsToPrim')
+    if work is None:
+        work = { }
+    Prim = cons_to_prim(Cons, out=work.get('Prim'))
 
-    Nx_tot = Cons.shape[0]
-    L = np.zeros_like(Cons)
-    F_hat = np.zeros_like(Cons)
+    if prof: prof.enter('FluxAndEigenvalues')
+    Flux = flux(Prim, Cons, out=work.get('Flux'))
+    Mlam = max_wavespeed(Prim)
+    work['Prim'], work['Flux'], work['Mlam'] = Prim, Flux, Mlam
 
-    for i in range(2,Nx_tot-3):
-        F_hat[i] = get_flux(Cons, Prim, Flux, Mlam, i)
-    for i in range(1,Nx_tot):
-        L[i] = -(F_hat[i] - F_hat[i-1]) / dx
+    if L is None:
+        L = np.empty_like(Cons)
+    F_hat = get_flux(Cons, Prim, Flux, Mlam)
+
+    if prof: prof.enter('drive_sweeps_1d')
+    L[0] = 0.0
+    np.subtract(F_hat[1:], F_hat[:-1], out=L[1:])
+    L[1:] *= -1.0 / dx
+
+    if prof: prof.exit()
     return L
 
 
 def test_c2p():
     P = [1.0, 5.0, 0.2, 0.5, 0.4]
-    print "%s ?= %s" % (P, cons_to_prim(prim_to_cons(P)))
+    print("%s ?= %s" % (P, cons_to_prim(prim_to_cons(P))))
 
 
 def test_eigenvectors():
     P = [1.0, 5.0, 0.4, 0.2, 0.8]
     LL, RR = left_right_eigenvectors(P)
-    print "0 ?= ", LL - np.linalg.inv(RR)
+    print("0 ?= %s" % (LL - np.linalg.inv(RR)))
+
 
+# Initial conditions take either a scalar or an array of x, returning a state
+# of shape x.shape + (5,). Their keyword arguments are the problem parameters
+# varied by run_ensemble.
 
-def density_wave(x, t):
-    P = np.zeros(5)
-    c = 1.0
-    P[rho] = 1.0 + 3.2e-1 * np.sin(2*np.pi*(x - c*t))
-    P[pre] = 1.0
-    P[vx] = c
+def density_wave(x, t, amplitude=0.32, speed=1.0):
+    x = np.asarray(x, dtype=float)
+    P = np.zeros(x.shape + (5,))
+    c = speed
+    P[...,rho] = 1.0 + amplitude * np.sin(2*np.pi*(x - c*t))
+    P[...,pre] = 1.0
+    P[...,vx] = c
     return P
 
 
-def shocktube1(x, t):
-    P = np.zeros(5)
-    P[rho] = 1.0 if x < 0.5 else 0.1
-    P[pre] = 1.0 if x < 0.5 else 0.125
-    return P
+def shocktube1(x, t, Pl=(1.0, 1.0, 0.0, 0.0, 0.0),
+               Pr=(0.1, 0.125, 0.0, 0.0, 0.0)):
+    x = np.asarray(x, dtype=float)
+    if t > 0.0:
+        from riemann import wave_pattern
+        return wave_pattern(Pl, Pr).sample((x - 0.5) / t)
+    return np.where((x < 0.5)[...,None], Pl, Pr)
+
+
+# Each problem is an initial condition together with its boundary condition
+problems = {
+    'density_wave': (density_wave, set_periodic_bc),
+    'shocktube1': (shocktube1, set_outflow_bc) }
+
+
+def use_problem(name):
+    global initial, set_bc
+    initial, set_bc = problems[name]
 
 
 initial = shocktube1
@@ -222,45 +430,129 @@ set_bc = set_outflow_bc
 #set_bc = set_periodic_bc
 get_flux = get_weno_flux
 
-
-def run_1d_problem(Nx):
+riemann_solver = None
+reconstruct_method = 'plm'
+
+profiler = None
+
+
+def run_1d_problem(Nx, tmax=0.1, plot=True, quiet=False, info=None,
+                   integrator=ClassicRk4, profile=False, riemann=None,
+                   reconstruction='plm', hybrid=None, dtype=None,
+                   snapshots=None):
+    """
+    Evolve the current problem on Nx zones until tmax and return the L1 error
+    against initial(x, t). The time step is re-evaluated on every step from the
+    wavespeeds of the first Runge-Kutta stage. If info is a dict, the number of
+    time steps taken, the final time and the final primitive states (without
+    guard zones) are stored in it. If profile is true, the time spent in each
+    stage of dUdt is reported at the end, or written as JSON if profile is a
+    file name, and also stored in info as 'profile'. If riemann is 'exact',
+    'hll' or 'hllc', the intercell fluxes are obtained from that Riemann solver
+    applied to the states given by reconstruction ('pcm', 'plm' or 'weno5'),
+    rather than from get_flux. If hybrid is given, get_hybrid_flux is used
+    instead with hybrid as the shock sensor threshold; giving both riemann and
+    hybrid raises ValueError. The solution is evolved in the precision dtype
+    ('float32', 'float64' or a numpy type), by default the current precision.
+    For shocktube1, initial(x, t) is the exact solution of the Riemann problem
+    (see riemann.EulersWavePattern). If snapshots is a SnapshotWriter (see
+    snapshots.py), the primitive states (without guard zones) are passed to it
+    whenever it says a snapshot is due, which includes the final state;
+    closing it is left to the caller.
+    """
+    global profiler, get_flux, riemann_solver, reconstruct_method
+    global hybrid_threshold
     Ng = 3
     CFL = 0.6
 
-    Prim = np.zeros((Nx + 2*Ng, 5))
+    if hybrid is not None and riemann is not None:
+        raise ValueError("hybrid and riemann select different flux functions, "
+                         "give at most one of them")
+
+    if dtype is None:
+        dtype = precision
+    dtype = precisions.get(dtype, dtype)
+    Prim = np.zeros((Nx + 2*Ng, 5), dtype=dtype)
     x, dx = np.linspace(0.0, 1.0, Nx, retstep=True)
+    dx = float(dx)
 
-    Prim[Ng:-Ng] = [initial(xi, 0.0) for xi in x]
+    Prim[Ng:-Ng] = initial(x, 0.0)
     set_bc(Prim, Ng)
-    Cons = np.array([prim_to_cons(P) for P in Prim])
-
-    dt = CFL * dx / np.array([max_wavespeed(P) for P in Prim]).max()
+    Cons = prim_to_cons(Prim)
+
+    if profile:
+        from profiling import StageProfiler
+        prof = profiler = StageProfiler()
+
+    saved_flux = (get_flux, riemann_solver, reconstruct_method,
+                  hybrid_threshold)
+    if hybrid is not None:
+        get_flux = get_hybrid_flux
+        hybrid_threshold = hybrid
+    if riemann is not None:
+        from riemann import riemann_solvers
+        get_flux = get_riemann_flux
+        riemann_solver = riemann_solvers[riemann]
+        reconstruct_method = reconstruction
+
+    work = { }
+    def rhs(U, L):
+        dUdt(U, Ng, dx, L, work)
+        if profile:
+            prof.substep += 1
+        return work['Mlam'].max()
+
+    rk = integrator(rhs, Cons.shape, Cons.dtype)
     t = 0.0
-    tmax = 0.1
-
-    while t < tmax:
-        L1 = dt * dUdt(Cons, Ng, dx)
-        L2 = dt * dUdt(Cons + 0.5*L1, Ng, dx)
-        L3 = dt * dUdt(Cons + 0.5*L2, Ng, dx)
-        L4 = dt * dUdt(Cons + 1.0*L3, Ng, dx)
-
-        Cons += (1.0/6.0) * (L1 + 2.0*L2 + 2.0*L3 + L4)
-        t += dt
-
-        print "t=%3.2f" % t
+    steps = 0
+
+    def snapshot(final=False):
+        if snapshots is not None and snapshots.due(t, steps, final):
+            snapshots.write(t, steps, cons_to_prim(Cons)[Ng:-Ng])
+
+    try:
+        snapshot()
+        while t < tmax:
+            if profile:
+                prof.substep = 0
+            t += rk.advance(Cons, CFL, dx, tmax - t)
+            steps += 1
+            snapshot()
+
+            if not quiet:
+                print("t=%3.2f" % t)
+        snapshot(final=True)
+    finally:
+        if profile:
+            profiler = None
+        (get_flux, riemann_solver, reconstruct_method,
+         hybrid_threshold) = saved_flux
+
+    if profile:
+        if isinstance(profile, str):
+            prof.dump(profile)
+        else:
+            prof.print_report()
+        if info is not None:
+            info['profile'] = prof.report()
+
+    Prim = cons_to_prim(Cons)
+    Prim_true = initial(x, t)
+    L1 = abs(Prim[Ng:-Ng] - Prim_true).sum() * dx
 
+    if info is not None:
+        info['steps'] = steps
+        info['t'] = t
+        info['prim'] = Prim[Ng:-Ng]
 
-    Prim = np.array([cons_to_prim(U) for U in Cons])
-    Prim_true = np.array([initial(xi, t) for xi in x])
-    L1 = abs(Prim[Ng:-Ng] - Prim_true).sum() * dx
+    if not quiet:
+        print("L1 = %s" % L1)
 
-    print "L1 =", L1
+    if not plot:
+        return L1
 
     from matplotlib import pyplot as plt
 
-    Prim = np.array([cons_to_prim(U) for U in Cons])
-    Prim_true = np.array([initial(xi, t) for xi in x])
-
     plt.plot(Prim_true[:,rho], "x", label=r"$\rho_{\rm{true}}$")
     plt.plot(Prim[Ng:-Ng,rho], "--", label=r"$\rho$")
     plt.plot(Prim[Ng:-Ng,pre], "-x", label=r"$p$")
@@ -274,6 +566,65 @@ def run_1d_problem(Nx):
     return L1
 
 
+def run_ensemble(Nx, params, tmax=0.1, shared_dt=False, info=None,
+                 integrator=ClassicRk4, dtype=None):
+    """
+    Evolve an ensemble of variants of the current problem on Nx zones until
+    tmax, all in the same batched pass. Member n starts from initial(x, 0,
+    **params[n]), and the L1 error of each member against its own initial(x,
+    t, **params[n]) is returned as an array. The ensemble state has shape
+    (Nens, Nx, 5), and is handed to dUdt as a view with the ensemble as its
+    second axis, which all of the kernels and boundary conditions treat like
+    the pencils of weno_split.py. Each member takes its own time steps unless
+    shared_dt is true, in which case all of them use the smallest. If info is
+    a dict, the number of steps, the final time of each member and the final
+    primitive states (Nens, Nx, 5) are stored in it.
+    """
+    Ng = 3
+    CFL = 0.6
+    Nens = len(params)
+
+    if dtype is None:
+        dtype = precision
+    dtype = precisions.get(dtype, dtype)
+    x, dx = np.linspace(0.0, 1.0, Nx, retstep=True)
+    dx = float(dx)
+
+    Prim_ens = np.zeros((Nens, Nx + 2*Ng, 5), dtype=dtype)
+    for n, p in enumerate(params):
+        Prim_ens[n,Ng:-Ng] = initial(x, 0.0, **p)
+    Prim = np.moveaxis(Prim_ens, 0, 1)
+    set_bc(Prim, Ng)
+    Cons = prim_to_cons(Prim)
+
+    work = { }
+    def rhs(U, L):
+        dUdt(U, Ng, dx, L, work)
+        if shared_dt:
+            return work['Mlam'].max()
+        return work['Mlam'].max(axis=0)[:,None]
+
+    rk = integrator(rhs, Cons.shape, Cons.dtype)
+    t = np.zeros((Nens, 1))
+    steps = 0
+
+    while (t < tmax).any():
+        dt = rk.advance(Cons, CFL, dx, tmax - (t.min() if shared_dt else t))
+        t += dt
+        steps += 1
+
+    Prim = np.moveaxis(cons_to_prim(Cons), 1, 0)[:,Ng:-Ng]
+    L1 = np.array([abs(Prim[n] - initial(x, t[n,0], **p)).sum() * dx
+                   for n, p in enumerate(params)])
+
+    if info is not None:
+        info['steps'] = steps
+        info['t'] = t[:,0]
+        info['prim'] = Prim
+
+    return L1
+
+
 def get_log_slope(x, y):
     from scipy.optimize import leastsq
     def errfunc(v):
@@ -284,10 +635,9 @@ def get_log_slope(x, y):
 
 
 def plot_it():
-    Ns = [64]#[8, 16, 32, 64]#, 128, 256, 512]
-    Ls = [run_1d_problem(N) for N in Ns]
+    Ns = [8, 16, 32, 64]#, 128, 256, 512]
+    Ls = [run_1d_problem(N, plot=False) for N in Ns]
 
-    exit()
     order = get_log_slope(Ns, Ls)
 
     from matplotlib import pyplot as plt
@@ -1,39 +1,71 @@
 #!/usr/bin/env python
 
+# ------------------------------------------------------------------------------
+#
+# Accuracy suite for the interpolation operators of src/weno.c. Every operator
+# is applied to samples of sin(8 pi x) over a ladder of resolutions up to 2^20
+# zones, and the L1 error is compared with the exact result of the operator
+# (face values, point values, cell averages or the derivative). Each operator
+# is evaluated on the whole array at once, using either the NumPy version in
+# reconstruct.py or, with --libmara, the compiled one through libmara.py. The
+# fitted convergence order is checked against the design order, so that
+# changes to the coefficients in src/weno.c are caught by
+#
+#   python weno5interp.py --libmara
+#
+# which exits with a non-zero status if any operator has lost accuracy.
+#
+# ------------------------------------------------------------------------------
+
+import sys
 import numpy as np
 from scipy.optimize import leastsq
-from matplotlib import pyplot as plt
+import reconstruct as rec
 
 
+wavenumber = 8*np.pi
 
-CeesA2C = [ [23./24.,  1./12.,  -1./24.],
-            [-1./24., 13./12.,  -1./24.],
-            [-1./24.,  1./12.,  23./24.] ]
-CeesC2A = [ [25./24., -1./12.,   1./24.],
-            [ 1./24., 11./12.,   1./24.],
-            [ 1./24., -1./12.,  25./24.] ]
-CeesC2L = [ [15./8., -5./4.,  3./8.],
-            [ 3./8.,  3./4., -1./8.],
-            [-1./8.,  3./4.,  3./8.] ]
-CeesC2R = [ [ 3./8., 3./4.,  -1./8.],
-            [-1./8., 3./4.,   3./8.],
-            [ 3./8.,-5./4.,  15./8.] ]
+def thefunc(x):
+    return np.sin(wavenumber*x)
 
-CeesC2L_A = [ [11./6., -7./6.,  1./3. ],
-              [ 1./3.,  5./6., -1./6. ],
-              [-1./6.,  5./6.,  1./3. ] ]
+def thefunc_deriv(x):
+    return np.cos(wavenumber*x)*wavenumber
 
-CeesC2R_A = [ [ 1./3.,  5./6., -1./6. ],
-              [-1./6.,  5./6.,  1./3. ],
-              [ 1./3., -7./6., 11./6. ] ]
+def thefunc_avg(x0, x1):
+    return (np.cos(wavenumber*x0) - np.cos(wavenumber*x1)) / ((x1 - x0) *
+                                                              wavenumber)
 
-DeesC2L = [   1./ 16.,   5./  8.,   5./ 16. ]
-DeesC2R = [   5./ 16.,   5./  8.,   1./ 16. ]
-DeesA2C = [  -9./ 80.,  49./ 40.,  -9./ 80. ]
-DeesC2A = [ -17./240., 137./120., -17./240. ]
 
-DeesC2L_A = [ 0.1, 0.6, 0.3 ]
-DeesC2R_A = [ 0.3, 0.6, 0.1 ]
+def sample(kind, x, dx):
+    """
+    Sample the test function on the zones centered at x with width dx, as the
+    given kind of data.
+    """
+    if kind == 'center':
+        return thefunc(x)
+    elif kind == 'left':
+        return thefunc(x - 0.5*dx)
+    elif kind == 'right':
+        return thefunc(x + 0.5*dx)
+    elif kind == 'average':
+        return thefunc_avg(x - 0.5*dx, x + 0.5*dx)
+    elif kind == 'derivative':
+        return thefunc_deriv(x)
+
+
+# Operator name: (operator, kind of input data, kind of output data, design
+# order). For the derivative, the operator gives the right face values whose
+# differences over dx are compared with the exact derivative.
+operators = {
+    'PLM_C2L':      (rec.PLM_C2L,      'center',  'left',       2),
+    'PLM_C2R':      (rec.PLM_C2R,      'center',  'right',      2),
+    'WENO5_FD_C2L': (rec.WENO5_FD_C2L, 'average', 'left',       5),
+    'WENO5_FD_C2R': (rec.WENO5_FD_C2R, 'average', 'right',      5),
+    'WENO5_FV_C2L': (rec.WENO5_FV_C2L, 'center',  'left',       5),
+    'WENO5_FV_C2R': (rec.WENO5_FV_C2R, 'center',  'right',      5),
+    'WENO5_FV_C2A': (rec.WENO5_FV_C2A, 'center',  'average',    5),
+    'WENO5_FV_A2C': (rec.WENO5_FV_A2C, 'average', 'center',     5),
+    'WENO5_FD_deriv': (rec.WENO5_FD_C2R, 'center', 'derivative', 5) }
 
 
 def get_log_slope(x, y):
@@ -43,146 +75,122 @@ def get_log_slope(x, y):
     v, success = leastsq(errfunc, v0)
     return v[1]
 
-def SQU(x):
-    return x**2
-
-def weno5(v, c, d):
-    eps = 1e-16
-    B = [(13.0/12.0)*np.power(  v[ 2] - 2*v[ 3] +   v[ 4], 2.0) +
-         ( 1.0/ 4.0)*np.power(3*v[ 2] - 4*v[ 3] +   v[ 4], 2.0),
-
-         (13.0/12.0)*np.power(  v[ 1] - 2*v[ 2] +   v[ 3], 2.0) +
-         ( 1.0/ 4.0)*np.power(3*v[ 1] - 0*v[ 2] -   v[ 3], 2.0),
-
-         (13.0/12.0)*np.power(  v[ 0] - 2*v[ 1] +   v[ 2], 2.0) +
-         ( 1.0/ 4.0)*np.power(  v[ 0] - 4*v[ 1] + 3*v[ 2], 2.0)]
-
-    vs = [c[0][0]*v[ 2] + c[0][1]*v[ 3] + c[0][2]*v[4],
-          c[1][0]*v[ 1] + c[1][1]*v[ 2] + c[1][2]*v[3],
-          c[2][0]*v[ 0] + c[2][1]*v[ 1] + c[2][2]*v[2]]
-
-    w = [d[0] / SQU(eps + B[0]),
-         d[1] / SQU(eps + B[1]),
-         d[2] / SQU(eps + B[2])]
-
-    wtot = w[0] + w[1] + w[2]
-    return (w[0]*vs[0] + w[1]*vs[1] + w[2]*vs[2])/wtot
-
-
-
-def run_weno_C2L(N):
-    def thefunc(x):
-        return np.sin(8*np.pi*np.array(x))
-    x = np.linspace(0.0, 1.0, N)
-    y = thefunc(x)
-
-    # interpolate to the point x[i+1/2]
-    # choose i = N/2 for fun
-    x_bar = [ ]
-    y_bar = [ ]
-    for i in range(N/8, 7*N/8):
-        x_bar.append(0.5*(x[i-1] + x[i]))
-        y_bar.append(weno5(y[i-2:i+3], CeesC2L, DeesC2L))
-    return sum(abs(y_bar - thefunc(x_bar))) / N
-
-
-def run_weno_deriv(N):
-    def thefunc(x):
-        return np.sin(8*np.pi*np.array(x))
-    def thefunc_deriv(x):
-        return np.cos(8*np.pi*np.array(x))*8*np.pi
-
-    x, dx = np.linspace(0.0, 1.0, N, retstep=True)
-    f = thefunc(x)
-
-    # interpolate to the point x[i+1/2]
-    # choose i = N/2 for fun
-    x_bar = [ ]
-    y_bar = [ ] # is f'(x)
-    for i in range(N/8, 7*N/8):
 
-        fiph = weno5(f[i-2:i+3], CeesC2R_A, DeesC2R_A)
-        fimh = weno5(f[i-2:i+3], CeesC2L_A, DeesC2L_A)
-
-        dfdx = (fiph - fimh) / dx
-
-        x_bar.append(x[i])
-        y_bar.append(dfdx)
-
-    return sum(abs(y_bar - thefunc_deriv(x_bar))) * dx
-
-
-def run_weno_C2R(N):
-    def thefunc(x):
-        return np.sin(8*np.pi*np.array(x))
-    x = np.linspace(0.0, 1.0, N)
-    y = thefunc(x)
-
-    # interpolate to the point x[i+1/2]
-    # choose i = N/2 for fun
-    x_bar = [ ]
-    y_bar = [ ]
-    for i in range(N/8, 7*N/8):
-        x_bar.append(0.5*(x[i+1] + x[i]))
-        y_bar.append(weno5(y[i-2:i+3], CeesC2R_A, DeesC2R_A))
-    return sum(abs(y_bar - thefunc(x_bar))) / N
+def run_operator(name, N, kernel=rec.reconstruct):
+    """
+    Return the L1 error of the named operator on N zones covering [0, 1]. Only
+    the zones with full stencils are measured, so no guard zones are needed.
+    """
+    op, data, target, order = operators[name]
+    dx = 1.0 / N
+    x = (np.arange(N) + 0.5) * dx
+    v = sample(data, x, dx)
 
+    y = kernel(v, op)
+    x = x[2:-2]
 
+    if target == 'derivative':
+        y = (y[1:] - y[:-1]) / dx
+        x = x[1:]
 
-def run_weno_C2A(N):
-    def thefunc(x):
-        return np.sin(8*np.pi*np.array(x))
-    def thefunc_avg(x0, x1):
-        return (np.cos(8*np.pi*x0) - np.cos(8*np.pi*x1)) / ((x1 - x0) * (8*np.pi))
-    x = np.linspace(0.0, 1.0, N)
-    y = thefunc(x)
+    return abs(y - sample(target, x, dx)).sum() * dx
 
-    # interpolate to the point x[i+1/2]
-    # choose i = N/2 for fun
-    x_bar = [ ]
-    y_bar = [ ]
-    y_avg = [ ]
-    for i in range(N/8, 7*N/8):
-        x_bar.append(x[i])
-        y_bar.append(weno5(y[i-2:i+3], CeesC2A, DeesC2A))
-        y_avg.append(thefunc_avg(0.5*(x[i] + x[i-1]), 0.5*(x[i] + x[i+1])))
-    return sum(abs(np.array(y_bar) - np.array(y_avg))) / N
 
+def fitted_order(Ns, res, floor=1e-12):
+    """
+    Fit the convergence order over the part of the ladder where the error is
+    still limited by truncation: up to the smallest error, and above floor.
+    """
+    Ns, res = np.asarray(Ns, dtype=float), np.asarray(res)
+    use = (np.arange(len(res)) <= np.argmin(res)) & (res > floor)
+    if use.sum() < 2:
+        return np.nan
+    return get_log_slope(Ns[use], res[use])
 
 
-def run_weno_A2C(N):
+def run_suite(names=None, Ns=None, kernel=rec.reconstruct, tol=0.5,
+              quiet=False):
     """
-    NOT ACTUALLY MADE!
+    Run the named operators (by default all of them) over the resolution
+    ladder Ns and return a dict, keyed by operator, of the errors, the fitted
+    order and whether it is within tol of the design order.
     """
-    def thefunc(x):
-        return np.sin(8*np.pi*np.array(x))
-    def thefunc_avg(x0, x1):
-        return (np.cos(8*np.pi*x0) - np.cos(8*np.pi*x1)) / ((x1 - x0) * (8*np.pi))
-    x = np.linspace(0.0, 1.0, N)
-    y_avg = thefunc_avg(0.5*(x[i]+x[i-1]),0.5*(x[i]+x[i+1]))
-
-    # interpolate to the point x[i+1/2]
-    # choose i = N/2 for fun
-    x_bar = [ ]
-    y_bar = [ ]
-    y = [ ]
-    for i in range(N/8, 7*N/8):
-        x_bar.append(x[i])
-        y_bar.append(weno5(y_avg[i-2:i+3], CeesA2C, DeesA2C))
-        y.append(thefunc(0.5*x))
-    return sum(abs(np.array(y_bar) - np.array(y))) / N
-
+    if names is None:
+        names = sorted(operators)
+    if Ns is None:
+        Ns = [2**n for n in range(5, 21)]
+
+    results = { }
+    for name in names:
+        res = [run_operator(name, N, kernel) for N in Ns]
+        order = fitted_order(Ns, res)
+        design = operators[name][3]
+        results[name] = { 'N': list(Ns), 'L1': res, 'order': order,
+                          'design_order': design,
+                          'passed': bool(order > design - tol) }
+        if not quiet:
+            print(name)
+            for n, (N, L1) in enumerate(zip(Ns, res)):
+                local = (np.log(res[n-1] / L1) / np.log(float(N) / Ns[n-1])
+                         if n > 0 else np.nan)
+                print("  %8d %12.4e %8.2f" % (N, L1, local))
+    return results
+
+
+def print_results(results):
+    print("%16s %8s %8s %8s" % ("operator", "design", "fitted", "status"))
+    for name in sorted(results):
+        r = results[name]
+        print("%16s %8d %8.2f %8s" % (name, r['design_order'], r['order'],
+                                      "ok" if r['passed'] else "FAIL"))
+
+
+def plot_results(results):
+    from matplotlib import pyplot as plt
+    for name in sorted(results):
+        r = results[name]
+        plt.loglog(r['N'], r['L1'], '-o',
+                   label=r"%s order=$%3.2f$" % (name.replace('_', ' '),
+                                                 r['order']))
+    plt.xlabel(r"$N$")
+    plt.ylabel(r"$L_1$ error")
+    plt.legend(loc='best')
+    plt.show()
 
 
 if __name__ == "__main__":
-    Ns = [2**n for n in range(4, 10)]
-    res = [ ]
-    for N in Ns:
-        res.append(run_weno_deriv(N))
-
-    order = get_log_slope(Ns, res)
-
-    plt.loglog(Ns, res, '-o', label=r"order=$%3.2f$" % order)
-    plt.legend()
-    plt.show()
-
+    from optparse import OptionParser
+
+    parser = OptionParser()
+    parser.add_option("-o", "--operators", default=None,
+                      help="comma separated subset of %s" % sorted(operators))
+    parser.add_option("--nmin", type="int", default=2**5,
+                      help="coarsest resolution [%default]")
+    parser.add_option("--nmax", type="int", default=2**20,
+                      help="finest resolution [%default]")
+    parser.add_option("--libmara", action="store_true", default=False,
+                      help="test the compiled kernels in lib/libmara_kernels.so")
+    parser.add_option("--tol", type="float", default=0.5,
+                      help="allowed shortfall of the fitted order [%default]")
+    parser.add_option("-q", "--quiet", action="store_true", default=False,
+                      help="only print the summary")
+    parser.add_option("--plot", action="store_true", default=False)
+    opts, args = parser.parse_args()
+
+    if opts.libmara:
+        import libmara
+        kernel = libmara.reconstruct
+    else:
+        kernel = rec.reconstruct
+
+    names = opts.operators.split(",") if opts.operators else None
+    Ns = [2**n for n in range(int(np.log2(opts.nmin)),
+                              int(np.log2(opts.nmax)) + 1)]
+
+    results = run_suite(names, Ns, kernel, opts.tol, opts.quiet)
+    print_results(results)
+
+    if opts.plot:
+        plot_results(results)
+
+    sys.exit(0 if all(r['passed'] for r in results.values()) else 1)
@@ -0,0 +1,352 @@
+#!/usr/bin/env python
+
+# ------------------------------------------------------------------------------
+#
+# Generator of WENO coefficients of any odd order 2r-1, for the operators
+#
+#   C2L, C2R .... point values to the left/right cell face (WENO5_FV_C2L/C2R)
+#   A2L, A2R .... cell averages to the left/right cell face (WENO5_FD_C2L/C2R)
+#   C2A ......... point values to the cell average (WENO5_FV_C2A)
+#   A2C ......... cell averages to the point value (WENO5_FV_A2C)
+#   D ........... point values to the first derivative at the cell center
+#
+# The candidate stencil coefficients, the linear weights and the quadratic
+# forms of the Jiang & Shu smoothness indicators are all derived in exact
+# rational arithmetic, and are cached in memory and on disk. For order 5 they
+# reproduce the tables in src/weno.c. The disk cache is stamped with
+# cache_version, which must be incremented whenever the derivation or the
+# layout of the stored entries changes, so that stale files are ignored.
+#
+# Stencil k (0 <= k < r) covers the zones i-k ... i+r-1-k, so that for r=3
+# stencil 0 is v[0], v[1], v[2] in the notation of reconstruct.weno5.
+#
+# For C2A and A2C with r even (orders 3, 7, 11, ...) the central candidates
+# lose their highest degree by symmetry, and no linear weights reproduce the
+# operator on the big stencil. The weights are then made exact for the highest
+# polynomial degree that they can be, which is 2r-3 (order 2r-2), and among
+# those the weights of minimum norm are taken, which are symmetric and
+# positive. linear_order gives the order of the linear weights.
+#
+# ------------------------------------------------------------------------------
+
+import os
+import json
+from fractions import Fraction
+import numpy as np
+from reconstruct import windows
+
+
+half = Fraction(1, 2)
+
+# Operator name: (kind of input data, target functional, location)
+operators = {
+    'C2L': ('point', 'value', -half),
+    'C2R': ('point', 'value', +half),
+    'A2L': ('average', 'value', -half),
+    'A2R': ('average', 'value', +half),
+    'C2A': ('point', 'average', 0),
+    'A2C': ('average', 'value', 0),
+    'D':   ('point', 'derivative', 0) }
+
+cache_file = os.environ.get("MARA_WENO_CACHE",
+                            os.path.join(os.path.expanduser("~"), ".cache",
+                                         "mara", "weno_coefficients.json"))
+cache_version = 1
+_cache = { }
+
+
+def moment(data, offset, j):
+    """
+    The data functional of kind data ('point' or 'average') of the monomial x^j
+    in the zone at offset.
+    """
+    if data == 'point':
+        return Fraction(offset)**j
+    else:
+        a, b = offset - half, offset + half
+        return (b**(j+1) - a**(j+1)) / (j+1)
+
+
+def target(functional, x, j):
+    """
+    The target functional of the monomial x^j.
+    """
+    if functional == 'value':
+        return Fraction(x)**j
+    elif functional == 'average':
+        return moment('average', x, j)
+    elif functional == 'derivative':
+        return j * Fraction(x)**(j-1) if j > 0 else Fraction(0)
+
+
+def solve(A, b):
+    """
+    Solve A x = b exactly by Gaussian elimination, where A is a list of rows of
+    Fractions with at least as many rows as columns. Raises ValueError if the
+    system is singular or inconsistent.
+    """
+    m, n = len(A), len(A[0])
+    M = [list(row) + [bi] for row, bi in zip(A, b)]
+    for col in range(n):
+        pivot = next((r for r in range(col, m) if M[r][col] != 0), None)
+        if pivot is None:
+            raise ValueError("singular system")
+        M[col], M[pivot] = M[pivot], M[col]
+        for r in range(m):
+            if r != col and M[r][col] != 0:
+                f = M[r][col] / M[col][col]
+                M[r] = [x - f*y for x, y in zip(M[r], M[col])]
+    if any(M[r][n] != 0 for r in range(n, m)):
+        raise ValueError("inconsistent system")
+    return [M[r][n] / M[r][r] for r in range(n)]
+
+
+def minimum_norm_solve(A, b):
+    """
+    Return the solution of A x = b of minimum Euclidean norm, exactly, where A
+    is a list of rows of Fractions of any shape and rank. Raises ValueError if
+    the system is inconsistent.
+    """
+    m, n = len(A), len(A[0])
+    M = [list(row) + [bi] for row, bi in zip(A, b)]
+    pivots = [ ]
+    for col in range(n):
+        row = len(pivots)
+        pivot = next((r for r in range(row, m) if M[r][col] != 0), None)
+        if pivot is None:
+            continue
+        M[row], M[pivot] = M[pivot], M[row]
+        M[row] = [x / M[row][col] for x in M[row]]
+        for r in range(m):
+            if r != row and M[r][col] != 0:
+                f = M[r][col]
+                M[r] = [x - f*y for x, y in zip(M[r], M[row])]
+        pivots.append(col)
+    if any(M[r][n] != 0 for r in range(len(pivots), m)):
+        raise ValueError("inconsistent system")
+
+    # Particular solution with the free variables zero, and a basis N of the
+    # null space; the minimum norm solution is p + N t with N^T N t = -N^T p.
+    p = [Fraction(0)] * n
+    for row, col in enumerate(pivots):
+        p[col] = M[row][n]
+    free = [col for col in range(n) if col not in pivots]
+    if not free:
+        return p
+    N = [ ]
+    for f in free:
+        v = [Fraction(0)] * n
+        v[f] = Fraction(1)
+        for row, col in enumerate(pivots):
+            v[col] = -M[row][f]
+        N.append(v)
+    NtN = [[sum(a*b for a, b in zip(u, v)) for v in N] for u in N]
+    t = solve(NtN, [-sum(a*b for a, b in zip(u, p)) for u in N])
+    return [pi + sum(tj * v[i] for tj, v in zip(t, N))
+            for i, pi in enumerate(p)]
+
+
+def stencil_coefficients(offsets, data, functional, x):
+    """
+    Coefficients c such that sum(c[s] * data[s]) applies the target functional
+    to the polynomial of degree len(offsets)-1 that matches the data.
+    """
+    n = len(offsets)
+    MT = [[moment(data, o, j) for o in offsets] for j in range(n)]
+    return solve(MT, [target(functional, x, j) for j in range(n)])
+
+
+def polynomial_basis(offsets):
+    """
+    Monomial coefficients of the polynomials phi_s of degree len(offsets)-1
+    whose cell averages are 1 in zone s and 0 in the others.
+    """
+    n = len(offsets)
+    M = [[moment('average', o, j) for j in range(n)] for o in offsets]
+    basis = [ ]
+    for s in range(n):
+        e = [Fraction(int(s == t)) for t in range(n)]
+        basis.append(solve(M, e))
+    return basis
+
+
+def derivative(p):
+    return [j * p[j] for j in range(1, len(p))]
+
+
+def integrate_product(p, q, a=-half, b=half):
+    total = Fraction(0)
+    for i, pi in enumerate(p):
+        for j, qj in enumerate(q):
+            total += pi * qj * (b**(i+j+1) - a**(i+j+1)) / (i+j+1)
+    return total
+
+
+def smoothness_form(offsets):
+    """
+    The quadratic form Q such that the Jiang & Shu smoothness indicator of the
+    stencil is sum(Q[a][b] v[a] v[b]), i.e. the sum over l of the integral over
+    the central zone of the squared l-th derivative of the polynomial matching
+    the cell averages v.
+    """
+    n = len(offsets)
+    basis = polynomial_basis(offsets)
+    Q = [[Fraction(0)] * n for a in range(n)]
+    for l in range(1, n):
+        basis = [derivative(p) for p in basis]
+        for a in range(n):
+            for b in range(n):
+                Q[a][b] += integrate_product(basis[a], basis[b])
+    return Q
+
+
+def linear_weights(order, op):
+    """
+    Return the linear weights d of the candidate stencils for the given order
+    and operator, and the order of accuracy of sum_k d[k] c[k]. That is 2r-1
+    when it reproduces the operator on the big stencil, and otherwise the
+    highest order which some weights reach, with the minimum norm weights.
+    """
+    data, functional, x = operators[op]
+    r = (order + 1) // 2
+    stencils = [list(range(-k, r-k)) for k in range(r)]
+    c = [stencil_coefficients(s, data, functional, x) for s in stencils]
+
+    # Row j requires the combined stencil to be exact for the monomial x^j
+    rows = [[sum(ck[s] * moment(data, o, j) for s, o in enumerate(st))
+             for ck, st in zip(c, stencils)] for j in range(2*r - 1)]
+    rhs = [target(functional, x, j) for j in range(2*r - 1)]
+    for degree in range(2*r - 2, -1, -1):
+        try:
+            return (minimum_norm_solve(rows[:degree+1], rhs[:degree+1]),
+                    degree + 1)
+        except ValueError:
+            pass
+
+
+def linear_order(order, op):
+    """
+    The order of accuracy of the linear weights for the given order and
+    operator; it is below order only for C2A and A2C with (order+1)/2 even.
+    """
+    return linear_weights(order, op)[1]
+
+
+def derive(order, op):
+    """
+    Derive the candidate stencil coefficients c, the linear weights d and the
+    smoothness indicator forms Q for the given order and operator.
+    """
+    if order % 2 != 1 or order < 3:
+        raise ValueError("order must be an odd number >= 3")
+    data, functional, x = operators[op]
+    r = (order + 1) // 2
+
+    stencils = [list(range(-k, r-k)) for k in range(r)]
+    c = [stencil_coefficients(s, data, functional, x) for s in stencils]
+    d = linear_weights(order, op)[0]
+    Q = [smoothness_form(s) for s in stencils]
+    return c, d, Q
+
+
+def coefficients(order, op):
+    """
+    Return (c, d, Q) as nested lists of Fractions, from the in-memory cache,
+    then the disk cache, and otherwise by deriving and caching them. A disk
+    cache written with another cache_version is ignored, and replaced on the
+    next write.
+    """
+    key = "%d-%s" % (order, op)
+    if key in _cache:
+        return _cache[key]
+
+    stored = { }
+    if os.path.isfile(cache_file):
+        with open(cache_file, "r") as f:
+            contents = json.load(f)
+        if contents.get('version') == cache_version:
+            stored = contents['coefficients']
+
+    if key in stored:
+        c, d, Q = [np.vectorize(Fraction, otypes=[object])(np.array(t)).tolist()
+                   for t in stored[key]]
+    else:
+        c, d, Q = derive(order, op)
+        stored[key] = [np.vectorize(str, otypes=[object])(
+            np.array(t, dtype=object)).tolist() for t in (c, d, Q)]
+        cache_dir = os.path.dirname(cache_file)
+        if cache_dir and not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        tmp = cache_file + ".%d" % os.getpid()
+        with open(tmp, "w") as f:
+            json.dump({ 'version': cache_version,
+                        'coefficients': stored }, f)
+        os.rename(tmp, cache_file)
+
+    _cache[key] = c, d, Q
+    return c, d, Q
+
+
+def coefficient_arrays(order, op):
+    """
+    Same as coefficients, but converted to float arrays of shape (r, r), (r,)
+    and (r, r, r).
+    """
+    return [np.array(t, dtype=float) for t in coefficients(order, op)]
+
+
+def smoothness_indicators(v, Q):
+    """
+    Smoothness indicators of the r candidate stencils, given the 2r-1 shifted
+    arrays v centered on v[r-1].
+    """
+    r = len(Q)
+    B = [ ]
+    for k in range(r):
+        s = v[r-1-k:2*r-1-k]
+        Bk = 0.0
+        for a in range(r):
+            Bk = Bk + Q[k][a][a] * s[a] * s[a]
+            for b in range(a+1, r):
+                Bk = Bk + 2 * Q[k][a][b] * s[a] * s[b]
+        B.append(Bk)
+    return B
+
+
+def weno(v, c, d, B, eps=1e-6):
+    """
+    WENO reconstruction of order 2r-1 with Jiang & Shu weights, given the 2r-1
+    shifted arrays v centered on v[r-1] and the smoothness indicators B.
+    """
+    r = len(d)
+    num = 0.0
+    wtot = 0.0
+    for k in range(r):
+        s = v[r-1-k:2*r-1-k]
+        vs = sum(c[k][j] * s[j] for j in range(r))
+        w = d[k] / (eps + B[k])**2
+        num = num + w*vs
+        wtot = wtot + w
+    return num / wtot
+
+
+def reconstruct(A, order, ops, axis=0, eps=1e-6):
+    """
+    Apply the WENO operators ops (names in `operators`, or a sequence of them)
+    of the given order to every zone of A along axis. The zones r-1 ... N-r
+    have full stencils, so each result has N-2r+2 entries along axis. The
+    smoothness indicators are computed once and shared by all operators.
+    """
+    single = isinstance(ops, str)
+    if single:
+        ops = [ops]
+    r = (order + 1) // 2
+    v = windows(A, 2*r - 1, axis)
+    B = None
+    res = [ ]
+    for op in ops:
+        c, d, Q = coefficient_arrays(order, op)
+        if B is None:
+            B = smoothness_indicators(v, Q)
+        res.append(weno(v, c, d, B, eps))
+    return res[0] if single else res
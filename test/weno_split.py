@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+
+# ------------------------------------------------------------------------------
+#
+# Dimensionally split 2d and 3d version of the reference solver in weno.py, to
+# be checked against src/weno-split.cpp and src/plm-split.cpp. The state has
+# shape (Nx, Ny, [Nz,] 5) including guard zones. For the sweep along a given
+# axis, that axis is moved to the front and the components are permuted so the
+# velocity along it sits in the vx (px) slot, after which all of the pencils
+# are handed to the 1d kernels in weno.py as a single batch.
+#
+# ------------------------------------------------------------------------------
+
+import numpy as np
+import weno
+from weno import rho, pre, vx, vy, vz
+from rungekutta import ShuOsherRk3, ClassicRk4
+
+
+# Component orderings which bring the x, y and z velocities into the vx slot,
+# and their inverses
+permutations = [[rho, pre, vx, vy, vz],
+                [rho, pre, vy, vz, vx],
+                [rho, pre, vz, vx, vy]]
+inverse_permutations = [list(np.argsort(p)) for p in permutations]
+
+
+def set_bc(A, Ng):
+    """
+    Apply the 1d boundary condition weno.set_bc along each spatial axis of A.
+    """
+    for d in range(A.ndim - 1):
+        weno.set_bc(np.moveaxis(A, d, 0), Ng)
+
+
+def dUdt(Cons, Ng, dx, L=None, work=None):
+    """
+    Return the time derivative of Cons, where dx is the list of zone sizes along
+    each axis, writing it into L if given. If work is a dict, on return it holds
+    the sum over axes of the maximum wavespeed divided by the zone size.
+    """
+    ndim = Cons.ndim - 1
+    set_bc(Cons, Ng)
+
+    if work is None:
+        work = { }
+    if L is None:
+        L = np.empty_like(Cons)
+
+    Prim = weno.cons_to_prim(Cons, out=work.get('Prim'))
+    work['Prim'] = Prim
+    work['amax'] = 0.0
+    L[...] = 0.0
+
+    for d in range(ndim):
+        perm = permutations[d]
+        U = np.moveaxis(Cons, d, 0)[...,perm]
+        P = np.moveaxis(Prim, d, 0)[...,perm]
+        F = weno.flux(P, U)
+        A = weno.max_wavespeed(P)
+        F_hat = weno.get_flux(U, P, F, A)
+
+        Ld = np.moveaxis(L, d, 0)
+        Ld[1:] -= ((F_hat[1:] - F_hat[:-1]) / dx[d])[...,inverse_permutations[d]]
+        work['amax'] += A.max() / dx[d]
+
+    return L
+
+
+# Initial conditions take a list X of coordinate arrays, one for each axis,
+# returning a state of shape X[0].shape + (5,).
+
+def density_wave(X, t):
+    P = np.zeros(X[0].shape + (5,), dtype=weno.precision)
+    c = 1.0
+    phase = sum(X) - len(X)*c*t
+    P[...,rho] = 1.0 + 3.2e-1 * np.sin(2*np.pi*phase)
+    P[...,pre] = 1.0
+    for d in range(len(X)):
+        P[...,permutations[d][vx]] = c
+    return P
+
+
+def explosion(X, t):
+    P = np.zeros(X[0].shape + (5,), dtype=weno.precision)
+    r2 = sum((x - 0.5)**2 for x in X)
+    P[...,rho] = np.where(r2 < 0.25**2, 1.0, 0.125)
+    P[...,pre] = np.where(r2 < 0.25**2, 1.0, 0.1)
+    return P
+
+
+problems = {
+    'density_wave': (density_wave, weno.set_periodic_bc),
+    'explosion': (explosion, weno.set_outflow_bc) }
+
+
+def use_problem(name):
+    global initial
+    initial, weno.set_bc = problems[name]
+
+
+initial = density_wave
+
+
+def run_nd_problem(shape, tmax=0.1, quiet=False, info=None,
+                   integrator=ClassicRk4, dtype=None):
+    """
+    Evolve the current problem on a grid of the given shape (2 or 3 axes) until
+    tmax and return the L1 error against initial(X, t). If info is a dict, the
+    number of time steps taken, the final time and the final primitive state
+    (without guard zones) are stored in it. The solution is evolved in the
+    precision dtype, as in weno.run_1d_problem.
+    """
+    Ng = 3
+    CFL = 0.4
+
+    if dtype is None:
+        dtype = weno.precision
+    dtype = weno.precisions.get(dtype, dtype)
+
+    ndim = len(shape)
+    xs, dx = zip(*[np.linspace(0.0, 1.0, N, retstep=True) for N in shape])
+    X = np.meshgrid(*xs, indexing='ij')
+    interior = (slice(Ng, -Ng),) * ndim
+
+    Prim = np.zeros(tuple(N + 2*Ng for N in shape) + (5,), dtype=dtype)
+    Prim[interior] = initial(X, 0.0)
+    set_bc(Prim, Ng)
+    Cons = weno.prim_to_cons(Prim)
+
+    work = { }
+    def rhs(U, L):
+        dUdt(U, Ng, dx, L, work)
+        return work['amax']
+
+    rk = integrator(rhs, Cons.shape, Cons.dtype)
+    t = 0.0
+    steps = 0
+
+    while t < tmax:
+        t += rk.advance(Cons, CFL, 1.0, tmax - t)
+        steps += 1
+
+        if not quiet:
+            print("t=%3.2f" % t)
+
+    Prim = weno.cons_to_prim(Cons)[interior]
+    L1 = abs(Prim - initial(X, t)).sum() * np.prod(dx)
+
+    if info is not None:
+        info['steps'] = steps
+        info['t'] = t
+        info['Prim'] = Prim
+
+    if not quiet:
+        print("L1 = %s" % L1)
+
+    return L1
+
+
+if __name__ == "__main__":
+    from optparse import OptionParser
+
+    parser = OptionParser()
+    parser.add_option("-p", "--problem", default="density_wave",
+                      help="one of %s [%%default]" % sorted(problems))
+    parser.add_option("-N", "--shape", default="64,64",
+                      help="comma separated grid shape [%default]")
+    parser.add_option("-t", "--tmax", type="float", default=0.1,
+                      help="final time [%default]")
+    parser.add_option("--rk3", action="store_true", default=False,
+                      help="use Shu-Osher RK3 rather than RK4")
+    parser.add_option("--precision", default="float64",
+                      help="float32 or float64 [%default]")
+    opts, args = parser.parse_args()
+
+    use_problem(opts.problem)
+    shape = [int(N) for N in opts.shape.split(",")]
+    run_nd_problem(shape, tmax=opts.tmax,
+                   integrator=ShuOsherRk3 if opts.rk3 else ClassicRk4,
+                   dtype=opts.precision)